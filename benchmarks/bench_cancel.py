@@ -0,0 +1,33 @@
+"""
+Cancel (D-) and priority-losing modify (M- with a higher quantity) on the 100x2000 book.
+Both used to scan the whole price level queue to find the order.
+"""
+import random
+
+from benchmarks.stress_book import build_stress_book, timed
+from message import DeleteMessage, ModifyMessage
+
+SAMPLE = 20000
+
+
+def main():
+    lob = build_stress_book()
+    rng = random.Random(1)
+    order_ids = rng.sample(list(lob._order_by_ids), 2 * SAMPLE)
+    modified_ids, deleted_ids = order_ids[:SAMPLE], order_ids[SAMPLE:]
+
+    modify_msgs = [ModifyMessage.from_fields(id_, 1000) for id_ in modified_ids]
+    delete_msgs = [DeleteMessage.from_fields(id_) for id_ in deleted_ids]
+
+    def run(msgs):
+        for msg in msgs:
+            lob.process(msg)
+
+    elapsed = timed(run, modify_msgs)
+    print(f'Modify up: {SAMPLE} msgs in {elapsed:.3f}s -> {1e6 * elapsed / SAMPLE:.2f} us/msg')
+    elapsed = timed(run, delete_msgs)
+    print(f'Delete:    {SAMPLE} msgs in {elapsed:.3f}s -> {1e6 * elapsed / SAMPLE:.2f} us/msg')
+
+
+if __name__ == '__main__':
+    main()
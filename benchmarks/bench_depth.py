@@ -0,0 +1,75 @@
+"""
+Top 10 levels of the bid side read with to_str, a full snapshot with level_arrays, depth after each change of the LOB,
+and depth queried again without any change, on:
+* the stress book, 100 contiguous levels
+* a sparse book, 100 levels 1000 ticks apart, on the SortedDict and on the PriceLadder of a bounded book, its default
+  backend
+"""
+import random
+
+from benchmarks.stress_book import LEVELS, build_stress_book, timed
+from limit_order_book import LimitOrderBook
+from message import AddMessage, ModifyMessage
+from order_side import OrderSide
+
+N_QUERIES = 10000
+N_LEVELS = 10
+SPARSE_TICKS = 1000
+
+
+def build_sparse_book(seed: int = 0, **lob_kwargs) -> LimitOrderBook:
+    rng = random.Random(seed)
+    lob = LimitOrderBook(order_id_count=1, **lob_kwargs)
+    mid = LEVELS * SPARSE_TICKS
+    for idx in range(1, LEVELS + 1):
+        for _ in range(20):
+            lob.process(AddMessage.from_fields(OrderSide.BUY, rng.randint(1, 60), mid - idx * SPARSE_TICKS))
+            lob.process(AddMessage.from_fields(OrderSide.SELL, rng.randint(1, 60), mid + idx * SPARSE_TICKS))
+    return lob
+
+
+def bench(name: str, lob: LimitOrderBook):
+    rng = random.Random(0)
+    order_ids = rng.choices(list(lob._order_by_ids), k=N_QUERIES)
+    # Each message changes the quantity of a standing order, in place
+    msgs = [ModifyMessage.from_fields(order_id, lob.get_order(order_id).quantity) for order_id in order_ids]
+
+    def to_str():
+        for _ in range(N_QUERIES):
+            lob.to_str()
+
+    def level_arrays():
+        for _ in range(N_QUERIES):
+            lob.level_arrays(OrderSide.BUY)
+
+    def depth_after_change():
+        for msg in msgs:
+            lob.process(msg)
+            lob.depth(OrderSide.BUY, N_LEVELS)
+
+    def changes_only():
+        for msg in msgs:
+            lob.process(msg)
+
+    def depth_cached():
+        for _ in range(N_QUERIES):
+            lob.depth(OrderSide.BUY, N_LEVELS)
+
+    depth_elapsed = timed(depth_after_change) - timed(changes_only)
+    for query, elapsed in (
+            ('to_str', timed(to_str)),
+            ('level_arrays', timed(level_arrays)),
+            ('depth', depth_elapsed),
+            ('depth cached', timed(depth_cached)),
+    ):
+        print(f'{name:<14} {query:<14}: {1e6 * elapsed / N_QUERIES:.2f} us/query')
+
+
+def main():
+    bench('stress', build_stress_book(levels=LEVELS, orders_per_level=200))
+    bench('sparse', build_sparse_book(dense_ladder=False))
+    bench('sparse ladder', build_sparse_book(max_price=2 * LEVELS * SPARSE_TICKS))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""
+EP published after every message on the 100x2000 book:
+cached cumulative decaying quantities versus their computation from scratch,
+either with the reference Python loop or vectorized over NumPy snapshots of the levels.
+"""
+import random
+
+from benchmarks.stress_book import LEVELS, MID, build_stress_book, timed
+from equilibrium import solve_equilibrium_mid
+from message import AddMessage, DeleteMessage
+
+N_MESSAGES = 5000
+HALF_TIME_TICKS = 0.2
+
+
+def flow(lob, seed: int = 2) -> list:
+    """
+    Cancels of random orders and adds spread over the whole book.
+    """
+    rng = random.Random(seed)
+    order_ids = rng.sample(list(lob._order_by_ids), N_MESSAGES // 2)
+    msgs = []
+    for order_id in order_ids:
+        msgs.append(DeleteMessage.from_fields(order_id))
+        if rng.random() < 0.5:
+            msgs.append(AddMessage(['A', 'B', '30', str(MID - rng.randint(1, LEVELS))]))
+        else:
+            msgs.append(AddMessage(['A', 'S', '30', str(MID + rng.randint(0, LEVELS - 1))]))
+    return msgs
+
+
+def reference_equilibrium_mid(lob, half_time_ticks: float) -> float:
+    mid = (lob._low_ask + lob._high_bid) / 2.
+    bid_cum_q = lob.cum_decaying_bid_quantity(half_time_ticks, mid)
+    ask_cum_q = lob.cum_decaying_ask_quantity(half_time_ticks, mid)
+    return solve_equilibrium_mid(lob._high_bid, lob._low_ask, half_time_ticks * mid, bid_cum_q, ask_cum_q)
+
+
+def main():
+    lob = build_stress_book()
+    msgs = flow(lob)
+
+    def run(equilibrium_mid):
+        for msg in msgs:
+            lob.process(msg)
+            equilibrium_mid(lob, HALF_TIME_TICKS)
+
+    elapsed = timed(run, lambda lob_, half_time_ticks: None)
+    print(f'Messages only:            {1e6 * elapsed / len(msgs):.2f} us/msg')
+
+    for name, equilibrium_mid in (
+            ('reference', reference_equilibrium_mid),
+            ('vectorized', lambda lob_, half_time_ticks: lob_.equilibrium_mid_vectorized(half_time_ticks)),
+            ('cached', lambda lob_, half_time_ticks: lob_.equilibrium_mid(half_time_ticks)),
+    ):
+        lob = build_stress_book()
+        elapsed = timed(run, equilibrium_mid)
+        print(f'Messages + EP {name:<11} {1e6 * elapsed / len(msgs):.2f} us/msg')
+
+    eps = (reference_equilibrium_mid(lob, HALF_TIME_TICKS), lob.equilibrium_mid_vectorized(HALF_TIME_TICKS))
+    print(f'EP reference {eps[0]:.6f} / vectorized {eps[1]:.6f} / cached {lob.equilibrium_mid(HALF_TIME_TICKS):.6f}')
+
+    elapsed = timed(lambda: [lob.equilibrium_mid(HALF_TIME_TICKS) for _ in range(len(msgs))])
+    print(f'EP cached, unchanged book: {1e6 * elapsed / len(msgs):.2f} us/call')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+"""
+Load generator of the order-entry gateway: messages/sec and latency percentiles by number of connections.
+Each connection keeps at most WINDOW messages in flight, the latency of a message runs from its send until its ack.
+Without --port or --unix_socket, a local gateway is started in the same process.
+
+$ python -m benchmarks.bench_gateway
+$ python -m benchmarks.bench_gateway --port 8888 --connections 1,8,64
+"""
+import argparse
+import asyncio
+import random
+import time
+from collections import deque
+
+import numpy as np
+
+from gateway import Gateway
+from market import Market
+
+N_MESSAGES = 40000
+WINDOW = 32
+MID = 1000
+
+
+def client_messages(n_messages: int, seed: int) -> [bytes]:
+    rng = random.Random(seed)
+    msgs = []
+    for _ in range(n_messages):
+        side = rng.choice('BS')
+        # One message in 10 crosses the spread
+        price = MID - rng.randint(1, 50) if side == 'B' else MID + rng.randint(0, 49)
+        if rng.random() < .1:
+            price = MID + 60 if side == 'B' else MID - 60
+        msgs.append(f'A-{side}-{rng.randint(1, 60)}-{price}\n'.encode())
+    return msgs
+
+
+async def run_client(address: dict, msgs: [bytes], latencies: list):
+    if 'path' in address:
+        reader, writer = await asyncio.open_unix_connection(**address)
+    else:
+        reader, writer = await asyncio.open_connection(**address)
+    sent = deque()
+    in_flight = asyncio.Semaphore(WINDOW)
+
+    async def read_acks():
+        n_acks = 0
+        while n_acks < len(msgs):
+            line = await reader.readline()
+            if line.startswith(b'FILL'):
+                continue
+            latencies.append(time.perf_counter() - sent.popleft())
+            in_flight.release()
+            n_acks += 1
+
+    reading = asyncio.create_task(read_acks())
+    for msg in msgs:
+        await in_flight.acquire()
+        sent.append(time.perf_counter())
+        writer.write(msg)
+        await writer.drain()
+    await reading
+    writer.close()
+    await writer.wait_closed()
+
+
+async def run(address: dict, connections: [int]):
+    gateway = None
+    if not address:
+        gateway = Gateway(Market(interactive=False))
+        server = await gateway.start()
+        host, port = server.sockets[0].getsockname()[:2]
+        address = dict(host=host, port=port)
+
+    for n_connections in connections:
+        latencies = []
+        per_client = N_MESSAGES // n_connections
+        clients = [client_messages(per_client, seed) for seed in range(n_connections)]
+        n_batches, n_messages = (gateway.n_batches, gateway.n_messages) if gateway else (0, 0)
+        start = time.perf_counter()
+        await asyncio.gather(*(run_client(address, msgs, latencies) for msgs in clients))
+        elapsed = time.perf_counter() - start
+
+        p50, p99 = 1e6 * np.percentile(latencies, [50, 99])
+        line = (
+            f'{n_connections:>3} connections: {len(latencies) / elapsed:>7.0f} msgs/s, '
+            f'latency p50 {p50:>7.0f} us, p99 {p99:>7.0f} us'
+        )
+        if gateway:
+            line += f', {(gateway.n_messages - n_messages) / (gateway.n_batches - n_batches):.1f} msgs/batch'
+        print(line)
+
+    if gateway:
+        server.close()
+        gateway.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--host', type=str, required=False, default='127.0.0.1')
+    parser.add_argument('--port', type=int, required=False, help='Port of a running gateway')
+    parser.add_argument('--unix_socket', type=str, required=False, help='Unix socket of a running gateway')
+    parser.add_argument(
+        '--connections', type=str, required=False, default='1,4,16,64', help='Comma separated numbers of connections'
+    )
+    args = parser.parse_args()
+
+    address = {}
+    if args.unix_socket:
+        address = dict(path=args.unix_socket)
+    elif args.port:
+        address = dict(host=args.host, port=args.port)
+    asyncio.run(run(address, [int(n_connections) for n_connections in args.connections.split(',')]))
+
+
+if __name__ == '__main__':
+    main()
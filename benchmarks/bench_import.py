@@ -0,0 +1,76 @@
+"""
+Import time of the core modules, each in a fresh interpreter, and guard of their dependencies: the book, the market
+and the exchange script must be importable without NumPy, which is only imported once needed (batches, fills read
+by columns, snapshots, journal, vectorized EP).
+
+The import times are also given relative to the import of sortedcontainers, their only third party dependency, so
+that they compare across machines. Exits with 1 if one of them imports NumPy, or, if --max_ms is given, takes longer
+than --max_ms over the import of sortedcontainers.
+
+$ python -m benchmarks.bench_import
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+CORE_MODULES = ('limit_order_book', 'market', 'run_exchange')
+BASELINE_MODULE = 'sortedcontainers'
+HEAVY_MODULES = ('numpy',)
+N_RUNS = 5
+
+_SCRIPT = '''
+import sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(elapsed, ','.join(name for name in {heavy_modules!r} if name in sys.modules))
+'''
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def import_time(module: str):
+    """
+    :return: best import time of the module in seconds over N_RUNS fresh interpreters, and the heavy modules it
+        imported
+    """
+    best, heavy = float('inf'), ''
+    for _ in range(N_RUNS):
+        output = subprocess.run(
+            [sys.executable, '-c', _SCRIPT.format(module=module, heavy_modules=HEAVY_MODULES)],
+            cwd=ROOT, check=True, capture_output=True, text=True,
+        ).stdout.split()
+        best, heavy = min(best, float(output[0])), output[1] if len(output) > 1 else ''
+    return best, heavy
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        '--max_ms', type=float, required=False, default=None,
+        help='Accepted import time of each core module over the import of sortedcontainers, not checked by default',
+    )
+    args = parser.parse_args()
+
+    failures = []
+    baseline, _ = import_time(BASELINE_MODULE)
+    for module in (*HEAVY_MODULES, BASELINE_MODULE, *CORE_MODULES):
+        elapsed, heavy = import_time(module) if module != BASELINE_MODULE else (baseline, '')
+        print(
+            f'{module:<18} {1e3 * elapsed:>8.1f} ms {1e3 * (elapsed - baseline):>+8.1f} ms   '
+            f'{f"imports {heavy}" if heavy else ""}'
+        )
+        if module in CORE_MODULES:
+            if heavy:
+                failures.append(f'{module} imports {heavy}')
+            if args.max_ms is not None and 1e3 * (elapsed - baseline) > args.max_ms:
+                failures.append(f'{module} takes {1e3 * (elapsed - baseline):.1f} ms over {BASELINE_MODULE} to import')
+
+    for failure in failures:
+        print(f'Failure: {failure}')
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
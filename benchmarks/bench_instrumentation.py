@@ -0,0 +1,46 @@
+"""
+Overhead of the latency instrumentation on the replay of the binary fleet file of bench_replay, by batches:
+without instrumentation, then with every message timed into the histograms.
+"""
+import os
+import tempfile
+
+import binary_message
+from benchmarks.bench_replay import write_fleet_file
+from benchmarks.stress_book import timed
+from instrumentation import Instrumentation
+from market import Market
+from run_exchange import BATCH_SIZE
+
+N_RUNS = 3
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        text_path = os.path.join(tmp_dir, 'fleet.txt')
+        binary_path = os.path.join(tmp_dir, 'fleet.bin')
+        write_fleet_file(text_path)
+        binary_message.convert_text_file(text_path, binary_path)
+        with open(binary_path, 'rb') as f:
+            buffer = f.read()
+    n_msgs = len(buffer) // binary_message.RECORD.size
+    step = BATCH_SIZE * binary_message.RECORD.size
+
+    def replay(market: Market):
+        for start in range(0, len(buffer), step):
+            market.execute_batch(market.decode_many(memoryview(buffer)[start:start + step]))
+
+    for name, new_instrumentation in (('disabled', lambda: None), ('enabled', Instrumentation)):
+        # Best of a few runs, the replays are alike
+        elapsed = min(
+            timed(replay, Market(interactive=False, instrumentation=new_instrumentation())) for _ in range(N_RUNS)
+        )
+        print(f'Instrumentation {name:<8}: {1e6 * elapsed / n_msgs:.2f} us/msg')
+
+    instrumentation = Instrumentation()
+    replay(Market(interactive=False, instrumentation=instrumentation))
+    print(instrumentation.to_str())
+
+
+if __name__ == '__main__':
+    main()
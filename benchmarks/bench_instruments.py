@@ -0,0 +1,49 @@
+"""
+One Market serving many instruments: memory of an empty book, and replay of a flow spread over all the instruments
+versus the same flow on a single instrument.
+"""
+import gc
+import random
+import tracemalloc
+
+from benchmarks.stress_book import timed
+from market import Market
+
+N_INSTRUMENTS = 500
+N_MESSAGES = 200000
+MID = 1000
+
+
+def flow(symbols: [str], seed: int = 0) -> str:
+    rng = random.Random(seed)
+    msgs = []
+    for _ in range(N_MESSAGES):
+        side = rng.choice('BS')
+        price = MID - rng.randint(1, 50) if side == 'B' else MID + rng.randint(0, 49)
+        symbol = rng.choice(symbols)
+        msgs.append(f'{symbol + ":" if symbol else ""}A-{side}-{rng.randint(1, 60)}-{price}')
+    return '\n'.join(msgs)
+
+
+def main():
+    symbols = [f'S{idx:03d}' for idx in range(N_INSTRUMENTS)]
+
+    market = Market(interactive=False)
+    gc.collect()
+    tracemalloc.start()
+    for symbol in symbols:
+        market.add_instrument(symbol)
+    gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f'{N_INSTRUMENTS} instruments: {size / N_INSTRUMENTS / 2 ** 10:.1f} KiB per empty book')
+
+    for name, flow_symbols in (('1 instrument', ['']), (f'{N_INSTRUMENTS} instruments', symbols)):
+        market = Market(interactive=False, symbols=symbols)
+        text = flow(flow_symbols)
+        elapsed = timed(lambda: market.execute_batch(market.decode_many(text)))
+        print(f'{name:<16} decode + match: {1e6 * elapsed / N_MESSAGES:.2f} us/msg')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+"""
+Throughput of the replay of the binary fleet file of bench_replay under each durability setting of the journal:
+no journal, journal written without fsync, fsync of every record, and group commits by size or by interval.
+The journal is written in a temporary directory, i.e. on the disk of /tmp.
+"""
+import os
+import tempfile
+
+import binary_message
+from benchmarks.bench_replay import write_fleet_file
+from benchmarks.stress_book import timed
+from journal import Journal
+from market import Market
+from run_exchange import BATCH_SIZE
+
+# fsync of every record is measured on the first messages only
+N_MESSAGES_FSYNC_EACH = 2000
+
+SETTINGS = (
+    ('no journal', None, None),
+    ('no fsync', dict(group_size=BATCH_SIZE, fsync=False), None),
+    ('fsync every record', dict(group_size=1), N_MESSAGES_FSYNC_EACH),
+    ('fsync every 64', dict(group_size=64), None),
+    ('fsync every 1024', dict(group_size=1024), None),
+    ('fsync every 1 ms', dict(group_size=BATCH_SIZE, group_interval=1e-3), None),
+    ('fsync every 10 ms', dict(group_size=BATCH_SIZE, group_interval=1e-2), None),
+)
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        text_path = os.path.join(tmp_dir, 'fleet.txt')
+        binary_path = os.path.join(tmp_dir, 'fleet.bin')
+        write_fleet_file(text_path)
+        binary_message.convert_text_file(text_path, binary_path)
+        with open(binary_path, 'rb') as f:
+            buffer = f.read()
+
+        for name, journal_kwargs, n_messages in SETTINGS:
+            records = memoryview(buffer)[:n_messages * binary_message.RECORD.size if n_messages else len(buffer)]
+            journal_path = os.path.join(tmp_dir, 'journal.log')
+            if os.path.exists(journal_path):
+                os.remove(journal_path)
+            journal = Journal(journal_path, **journal_kwargs) if journal_kwargs else None
+            market = Market(interactive=False, journal=journal)
+
+            def replay():
+                step = BATCH_SIZE * binary_message.RECORD.size
+                for start in range(0, len(records), step):
+                    market.execute_batch(market.decode_many(records[start:start + step]))
+                if journal is not None:
+                    journal.close()
+
+            elapsed = timed(replay)
+            n_msgs = len(records) // binary_message.RECORD.size
+            print(f'{name:<20} {n_msgs / elapsed:>9.0f} msgs/s, {1e6 * elapsed / n_msgs:>7.2f} us/msg')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+"""
+SortedDict versus dense PriceLadder backend on the 100x2000 book:
+building the book, small aggressive orders hitting the top of the book and orders sweeping whole levels.
+"""
+from benchmarks.stress_book import LEVELS, MID, build_stress_book, stress_messages, timed
+from limit_order_book import LimitOrderBook
+from message import AddMessage
+
+BACKENDS = {
+    'SortedDict': dict(dense_ladder=False),
+    'PriceLadder': dict(min_price=0, max_price=2 * MID, dense_ladder=True),
+}
+N_TOP_HITS = 20000
+N_SWEEPS = 50
+
+
+def main():
+    add_msgs = [AddMessage(msg_str.split('-')) for msg_str in stress_messages()]
+    for name, lob_kwargs in BACKENDS.items():
+        lob = LimitOrderBook(order_id_count=1, **lob_kwargs)
+
+        def build():
+            for msg in add_msgs:
+                lob.process(msg)
+
+        elapsed = timed(build)
+        print(f'{name:<12} Add (build):   {1e6 * elapsed / len(add_msgs):.2f} us/msg')
+
+        # Each one partially fills the first order of the best bid level
+        hits = [AddMessage(['A', 'S', '1', str(MID - LEVELS)]) for _ in range(N_TOP_HITS)]
+
+        def hit_top():
+            for msg in hits:
+                lob.process(msg)
+
+        elapsed = timed(hit_top)
+        print(f'{name:<12} Top of book:   {1e6 * elapsed / N_TOP_HITS:.2f} us/msg')
+
+        lob = build_stress_book(**lob_kwargs)
+        elapsed = 0
+        for _ in range(N_SWEEPS):
+            # Consumes exactly the whole best ask level
+            best_price, price_level = lob._orders_by_asks.peekitem(0)
+            quantity = price_level.quantity
+            elapsed += timed(lob.process, AddMessage(['A', 'B', str(quantity), str(best_price)]))
+        print(f'{name:<12} Level sweep:   {1e3 * elapsed / N_SWEEPS:.2f} ms/msg')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""
+Cost of the L2 market data feed.
+
+* Consumer side, on the stress book: after each passive add or delete, the depth is read either by rendering the LOB
+  with to_str, by a full NumPy snapshot of both sides, or by applying the deltas of the message to a DepthView and
+  reading its 10 best levels.
+* Producer side, on the replay of the binary fleet file of bench_replay, by batches: without the feed, with a delta
+  per level update, and conflated between the batches.
+"""
+import os
+import random
+import tempfile
+
+import binary_message
+from benchmarks.bench_replay import write_fleet_file
+from benchmarks.stress_book import LEVELS, MID, build_stress_book, timed
+from limit_order_book import BUY, SELL
+from market import Market
+from market_data import DepthView, MarketDataPublisher
+from message import AddMessage, DeleteMessage
+from order_side import OrderSide
+from run_exchange import BATCH_SIZE
+
+N_MESSAGES = 10000
+N_RUNS = 3
+
+
+def bench_consumer():
+    rng = random.Random(0)
+    lob = build_stress_book()
+    msgs = []
+    for order_id in rng.sample(list(lob._order_by_ids), N_MESSAGES // 2):
+        msgs.append(DeleteMessage.from_fields(order_id))
+        msgs.append(AddMessage.from_fields(OrderSide.BUY, rng.randint(1, 60), MID - rng.randint(1, LEVELS)))
+
+    def depth_by_to_str(lob, _):
+        return lambda: lob.to_str()
+
+    def depth_by_full_snapshot(lob, _):
+        return lambda: (lob.level_arrays(OrderSide.BUY), lob.level_arrays(OrderSide.SELL))
+
+    def depth_by_deltas(lob, market_data):
+        view = DepthView()
+        market_data.publish_book(lob)
+        view.apply(market_data.drain())
+
+        def read_depth():
+            view.apply(market_data.drain())
+            return view.levels(BUY), view.levels(SELL)
+        return read_depth
+
+    for name, new_read_depth in (
+            ('to_str', depth_by_to_str), ('full snapshot', depth_by_full_snapshot), ('deltas', depth_by_deltas),
+    ):
+        market_data = MarketDataPublisher()
+        lob = build_stress_book(market_data=market_data if new_read_depth is depth_by_deltas else None)
+        read_depth = new_read_depth(lob, market_data)
+
+        def replay():
+            for msg in msgs:
+                lob.process(msg)
+                read_depth()
+        print(f'Depth by {name:<14}: {1e6 * timed(replay) / N_MESSAGES:.2f} us/msg')
+
+
+def bench_producer():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        text_path = os.path.join(tmp_dir, 'fleet.txt')
+        binary_path = os.path.join(tmp_dir, 'fleet.bin')
+        write_fleet_file(text_path)
+        binary_message.convert_text_file(text_path, binary_path)
+        with open(binary_path, 'rb') as f:
+            buffer = f.read()
+    n_msgs = len(buffer) // binary_message.RECORD.size
+    step = BATCH_SIZE * binary_message.RECORD.size
+
+    def replay(market: Market):
+        for start in range(0, len(buffer), step):
+            market.execute_batch(market.decode_many(memoryview(buffer)[start:start + step]))
+            if market.market_data is not None:
+                market.market_data.drain()
+
+    for name, new_market_data in (
+            ('disabled', lambda: None),
+            ('every update', MarketDataPublisher),
+            ('conflated', lambda: MarketDataPublisher(conflation_interval=0)),
+    ):
+        # Best of a few runs, the replays are alike
+        elapsed = min(
+            timed(replay, Market(interactive=False, market_data=new_market_data())) for _ in range(N_RUNS)
+        )
+        market_data = new_market_data()
+        replay(Market(interactive=False, market_data=market_data))
+        deltas = f'{market_data.sequence} deltas for {market_data.n_updates} updates' if market_data is not None else ''
+        print(f'Feed {name:<12}: {1e6 * elapsed / n_msgs:.2f} us/msg   {deltas}')
+
+
+def main():
+    bench_consumer()
+    bench_producer()
+
+
+if __name__ == '__main__':
+    main()
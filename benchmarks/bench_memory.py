@@ -0,0 +1,24 @@
+"""
+Memory held by the 100x2000 book, i.e. 400k standing orders, measured with tracemalloc.
+"""
+import gc
+import tracemalloc
+
+from benchmarks.stress_book import LEVELS, ORDERS_PER_LEVEL, build_stress_book
+
+
+def main():
+    gc.collect()
+    tracemalloc.start()
+    lob = build_stress_book()
+    gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    n_orders = 2 * LEVELS * ORDERS_PER_LEVEL
+    print(f'{n_orders} standing orders: {size / 2 ** 20:.1f} MiB, {size / n_orders:.0f} bytes per standing order')
+    return lob
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+"""
+Orders which never rest, on the stress book (100 levels of 2000 orders on each side):
+* An order below the best ask, either sent as a limit order then deleted, as an IOC would be emulated without the
+  order type, or sent as an IOC, cancelled on arrival.
+* A FOK sell killed after checking the liquidity of the k best bid levels, one lot short of filling.
+  It reads the total quantity of each level, whatever its number of orders, and leaves the book untouched.
+"""
+import random
+
+from benchmarks.stress_book import LEVELS, MID, build_stress_book, timed
+from message import AddMessage, DeleteMessage
+from order_side import OrderSide
+from order_type import OrderType
+
+N_MESSAGES = 10000
+FOK_LEVELS = (1, 10, 100)
+
+
+def bench_no_rest():
+    rng = random.Random(0)
+    lob = build_stress_book()
+    prices = [MID - rng.randint(1, LEVELS) for _ in range(N_MESSAGES)]
+
+    def limit_then_delete():
+        for price in prices:
+            order_id = lob.process(AddMessage.from_fields(OrderSide.BUY, 10, price))
+            lob.process(DeleteMessage.from_fields(order_id))
+
+    def ioc():
+        for price in prices:
+            lob.process(AddMessage.from_fields(OrderSide.BUY, 10, price, OrderType.IOC))
+
+    for name, replay in (('limit + delete', limit_then_delete), ('IOC', ioc)):
+        print(f'Not crossing, {name:<14}: {1e6 * timed(replay) / N_MESSAGES:.2f} us/order')
+
+
+def bench_fok_killed():
+    lob = build_stress_book()
+    bid_prices, bid_quantities = lob.level_arrays(OrderSide.BUY)
+    for n_levels in FOK_LEVELS:
+        msg = AddMessage.from_fields(
+            OrderSide.SELL, int(bid_quantities[:n_levels].sum()) + 1, int(bid_prices[n_levels - 1]), OrderType.FOK,
+        )
+
+        def fok():
+            for _ in range(N_MESSAGES):
+                lob.process(msg)
+        elapsed = timed(fok)
+        assert not len(lob.fills)
+        print(f'FOK killed over {n_levels:>3} levels: {1e6 * elapsed / N_MESSAGES:.2f} us/order')
+
+
+def main():
+    bench_no_rest()
+    bench_fok_killed()
+
+
+if __name__ == '__main__':
+    main()
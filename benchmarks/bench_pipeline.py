@@ -0,0 +1,40 @@
+"""
+Replay of a text fleet file of a few million lines, the stress book followed by random flow: the batches decoded then
+matched one after the other, versus decoded on a thread or in a child process while the previous ones are matched
+(see pipeline).
+"""
+import argparse
+import os
+import tempfile
+
+from benchmarks.bench_replay import write_fleet_file
+from benchmarks.stress_book import timed
+from market import Market
+from run_exchange import run_file_exchange
+
+N_FLOW = 2000000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--flow', type=int, required=False, default=N_FLOW, help='Messages after the stress book')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        fleet_file = os.path.join(tmp_dir, 'fleet.txt')
+        write_fleet_file(fleet_file, args.flow)
+        with open(fleet_file, 'r') as f:
+            n_msgs = sum(1 for _ in f)
+
+        for pipeline in (None, 'thread', 'process'):
+            replay_args = argparse.Namespace(
+                fleet_file=fleet_file, pipeline=pipeline, price_increment=1, quantity_increment=1, min_price=None,
+                max_price=None, min_quantity=None, max_quantity=None, sanity_checks=False, random_order_id=False,
+                symbols='',
+            )
+            elapsed = timed(run_file_exchange, replay_args, Market(interactive=False))
+            print(f'{pipeline or "sequential":<10}: {n_msgs} messages in {elapsed:.2f}s -> {n_msgs / elapsed:.0f} msgs/s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""
+Replay of a fleet file building the 100x2000 book followed by random flow: text format versus binary format,
+one Message object per message versus columnar batches (Market.decode_many).
+Decoding only, then decoding and matching.
+"""
+import mmap
+import os
+import random
+import tempfile
+
+import binary_message
+from benchmarks.stress_book import LEVELS, MID, stress_messages, timed
+from market import Market
+from run_exchange import BATCH_SIZE
+
+N_FLOW = 100000
+
+
+def write_fleet_file(path: str, n_flow: int = N_FLOW):
+    rng = random.Random(3)
+    msgs = stress_messages()
+    n_orders = len(msgs)
+    for _ in range(n_flow):
+        draw = rng.random()
+        if draw < 0.4:
+            side = rng.choice('BS')
+            price = MID - rng.randint(1, LEVELS) if side == 'B' else MID + rng.randint(0, LEVELS - 1)
+            msgs.append(f'A-{side}-{rng.randint(1, 60)}-{price}')
+            n_orders += 1
+        elif draw < 0.7:
+            msgs.append(f'D-{rng.randint(2, n_orders + 1)}')
+        else:
+            msgs.append(f'M-{rng.randint(2, n_orders + 1)}-{rng.randint(1, 60)}')
+    with open(path, 'w') as f:
+        f.write('\n'.join(msgs) + '\n')
+
+
+def new_market() -> Market:
+    return Market(interactive=False)
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        text_path = os.path.join(tmp_dir, 'fleet.txt')
+        binary_path = os.path.join(tmp_dir, 'fleet.bin')
+        write_fleet_file(text_path)
+        binary_message.convert_text_file(text_path, binary_path)
+
+        def text_replay(execute: bool):
+            market = new_market()
+            with open(text_path, 'r') as f:
+                for msg_str in f:
+                    msg = market.decode(msg_str.rstrip())
+                    if execute and msg and msg.is_init:
+                        market.execute(msg)
+
+        def binary_replay(execute: bool):
+            market = new_market()
+            with open(binary_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                for record in binary_message.iter_records(buffer):
+                    msg = market.decode_record(record)
+                    if execute and msg:
+                        market.execute(msg)
+
+        def text_batch_replay(execute: bool):
+            market = new_market()
+            with open(text_path, 'r') as f:
+                while True:
+                    msg_strs = f.readlines(BATCH_SIZE * 16)
+                    if not msg_strs:
+                        break
+                    batch = market.decode_many(''.join(msg_strs))
+                    if execute:
+                        market.execute_batch(batch)
+
+        def binary_batch_replay(execute: bool):
+            market = new_market()
+            with open(binary_path, 'rb') as f:
+                buffer = f.read()
+            step = BATCH_SIZE * binary_message.RECORD.size
+            for start in range(0, len(buffer), step):
+                batch = market.decode_many(memoryview(buffer)[start:start + step])
+                if execute:
+                    market.execute_batch(batch)
+
+        n_msgs = os.path.getsize(binary_path) // binary_message.RECORD.size
+        for name, replay in (
+                ('text', text_replay), ('binary', binary_replay),
+                ('text batch', text_batch_replay), ('binary batch', binary_batch_replay),
+        ):
+            for execute in (False, True):
+                elapsed = timed(replay, execute)
+                what = 'decode + match' if execute else 'decode only   '
+                print(f'{name:<12} {what}: {1e6 * elapsed / n_msgs:.2f} us/msg')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,35 @@
+"""
+Sharded exchange: aggregate throughput of the same multi-instrument flow over 1, 2 and 4 worker processes.
+The flow is encoded to binary records beforehand, so that the measure covers the forwarding and the matching.
+"""
+import os
+
+import numpy as np
+
+from benchmarks.bench_instruments import N_MESSAGES, flow
+from market import Market
+from run_exchange import BATCH_SIZE
+from sharded_exchange import run_sharded_exchange
+
+N_INSTRUMENTS = 64
+WORKERS = (1, 2, 4)
+
+
+def main():
+    symbols = [f'S{idx:02d}' for idx in range(N_INSTRUMENTS)]
+    kwargs = dict(symbols=symbols)
+    records = Market(interactive=False, **kwargs).decode_many(flow(symbols)).to_records()
+    chunks = [records[start:start + BATCH_SIZE] for start in range(0, len(records), BATCH_SIZE)]
+
+    print(f'{os.cpu_count()} CPUs, {N_MESSAGES} messages over {N_INSTRUMENTS} instruments')
+    for n_workers in WORKERS:
+        n_msgs, elapsed, stats = run_sharded_exchange(iter(chunks), n_workers, kwargs)
+        busy = np.array([worker_busy for _, _, worker_busy, _ in stats])
+        print(
+            f'{n_workers} workers: {n_msgs / elapsed:>9.0f} msgs/s, '
+            f'busiest worker {busy.max():.2f}s of {elapsed:.2f}s'
+        )
+
+
+if __name__ == '__main__':
+    main()
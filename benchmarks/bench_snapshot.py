@@ -0,0 +1,28 @@
+"""
+Rebuilding the 100x2000 book on restart: replay of its 400k adds versus restore of a binary snapshot.
+"""
+import os
+import tempfile
+
+from benchmarks.stress_book import build_stress_book, timed
+from snapshot import load_snapshot, save_snapshot
+
+
+def main():
+    for name, lob_kwargs in (('SortedDict', dict(dense_ladder=False)), ('PriceLadder', dict(max_price=2000))):
+        lobs = []
+        replay_elapsed = timed(lambda: lobs.append(build_stress_book(**lob_kwargs)))
+        lob = lobs[0]
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'book.lob')
+            save_elapsed = timed(save_snapshot, path, [('', lob)])
+            size = os.path.getsize(path)
+            load_elapsed = timed(load_snapshot, path)
+        print(
+            f'{name:<12} replay {replay_elapsed:.2f}s, snapshot {size / 2 ** 20:.1f} MiB saved in {save_elapsed:.2f}s '
+            f'and restored in {load_elapsed:.3f}s (x{replay_elapsed / load_elapsed:.0f})'
+        )
+
+
+if __name__ == '__main__':
+    main()
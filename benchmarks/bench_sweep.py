@@ -0,0 +1,33 @@
+"""
+Aggressive orders sweeping the book: each one eats the 10 best ask levels of 2000 orders,
+and one more order is partially filled so that the sweep ends inside a level.
+"""
+from itertools import islice
+
+from benchmarks.stress_book import LEVELS, build_stress_book, timed
+from message import AddMessage
+
+LEVELS_PER_SWEEP = 10
+N_SWEEPS = LEVELS // LEVELS_PER_SWEEP - 1
+
+
+def main():
+    for name, lob_kwargs in (('SortedDict', dict(dense_ladder=False)), ('PriceLadder', dict(max_price=2000))):
+        lob = build_stress_book(**lob_kwargs)
+        # The best sweep is kept as the sweeps of the book are alike, so that the measure is robust to noise
+        best = None
+        for _ in range(N_SWEEPS):
+            prices = list(islice(lob._orders_by_asks.irange(), LEVELS_PER_SWEEP + 1))
+            levels = [lob._orders_by_asks[price] for price in prices]
+            quantity = sum(price_level.quantity for price_level in levels[:-1]) + 1
+            n_fills = sum(len(price_level) for price_level in levels[:-1]) + 1
+            elapsed = timed(lob.process, AddMessage(['A', 'B', str(quantity), str(prices[-1])]))
+            if best is None or elapsed / n_fills < best[1]:
+                best = elapsed, elapsed / n_fills
+        print(
+            f'{name:<12} {1e3 * best[0]:.2f} ms/sweep of {LEVELS_PER_SWEEP} levels, {1e9 * best[1]:.0f} ns/fill'
+        )
+
+
+if __name__ == '__main__':
+    main()
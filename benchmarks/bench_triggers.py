@@ -0,0 +1,101 @@
+"""
+Cost of the pending stops, on the stress book (100 levels of 2000 orders on each side) with 100k stops pending
+beyond the book: half buy stops above the asks, half sell stops below the bids.
+* Trades which trigger no stop: 1 lot bought at the best ask then sold at the best bid, processed by the LOB alone,
+  through the TriggerBook, or followed by a scan of every pending stop for the crossed ones.
+* Release: a trade at the best ask triggers 10k buy stop-limit orders, which rest below the bids. Compared to the
+  same limit orders sent to the LOB directly.
+"""
+import random
+
+from benchmarks.stress_book import LEVELS, MID, build_stress_book, timed
+from message import AddMessage
+from order_side import OrderSide
+from trigger_book import TriggerBook
+
+BUY = OrderSide.BUY
+SELL = OrderSide.SELL
+
+N_STOPS = 100000
+N_MESSAGES = 10000
+N_TRIGGERED = 10000
+# The scan of every stop is only timed on a few trades
+N_SCANNED = 100
+STOP_PRICE_RANGE = 1000
+
+
+def add_pending_stops(trigger_book: TriggerBook, seed: int = 0):
+    rng = random.Random(seed)
+    for _ in range(N_STOPS // 2):
+        trigger_book.add_stop(OrderSide.BUY, rng.randint(1, 60), MID + LEVELS + rng.randint(0, STOP_PRICE_RANGE))
+        trigger_book.add_stop(OrderSide.SELL, rng.randint(1, 60), MID - LEVELS - rng.randint(1, STOP_PRICE_RANGE))
+
+
+def bench_no_trigger():
+    msgs = [
+        AddMessage.from_fields(BUY, 1, MID) if idx % 2 == 0 else AddMessage.from_fields(SELL, 1, MID - 1)
+        for idx in range(N_MESSAGES)
+    ]
+    trigger_book = TriggerBook(build_stress_book())
+    add_pending_stops(trigger_book)
+    lob = trigger_book.limit_order_book
+    # The pending stops as a flat list, as side, stop price
+    flat_stops = [
+        (side, stop_price) for side, stops in ((BUY, trigger_book._buy_stops), (SELL, trigger_book._sell_stops))
+        for stop_price, stop_level in stops.items() for _ in stop_level
+    ]
+
+    def lob_only():
+        for msg in msgs:
+            lob.process(msg)
+
+    def through_trigger_book():
+        for msg in msgs:
+            trigger_book.process(msg)
+
+    def scan_all_stops():
+        fills = lob.fills
+        for msg in msgs[:N_SCANNED]:
+            sequence = fills.sequence
+            lob.process(msg)
+            if fills.sequence != sequence:
+                trade_price = lob.last_trade_prices[1]
+                [
+                    stop for stop in flat_stops
+                    if (stop[0] == BUY and stop[1] <= trade_price) or (stop[0] == SELL and stop[1] >= trade_price)
+                ]
+
+    for name, replay, n_msgs in (
+            ('LOB only', lob_only, N_MESSAGES), ('TriggerBook', through_trigger_book, N_MESSAGES),
+            ('scan of the stops', scan_all_stops, N_SCANNED),
+    ):
+        print(f'{len(trigger_book)} stops pending, {name:<18}: {1e6 * timed(replay) / n_msgs:.2f} us/trade')
+
+
+def bench_release():
+    trigger_book = TriggerBook(build_stress_book())
+    add_pending_stops(trigger_book)
+    lob = trigger_book.limit_order_book
+    limit_price = MID - LEVELS - 1
+    for _ in range(N_TRIGGERED):
+        trigger_book.add_stop(OrderSide.BUY, 10, MID, limit_price)
+    trade = AddMessage.from_fields(OrderSide.BUY, 1, MID)
+    elapsed = timed(trigger_book.process, trade)
+    assert len(trigger_book.drain_triggered()) == N_TRIGGERED
+    print(f'{N_TRIGGERED} stops released by one trade: {1e6 * elapsed / N_TRIGGERED:.2f} us/stop')
+
+    msgs = [AddMessage.from_fields(OrderSide.BUY, 10, limit_price) for _ in range(N_TRIGGERED)]
+
+    def direct():
+        for msg in msgs:
+            lob.process(msg)
+    print(f'{N_TRIGGERED} same limit orders sent directly: {1e6 * timed(direct) / N_TRIGGERED:.2f} us/order')
+
+
+def main():
+    bench_no_trigger()
+    bench_release()
+
+
+if __name__ == '__main__':
+    main()
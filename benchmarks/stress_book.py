@@ -0,0 +1,58 @@
+"""
+Builds the heavily liquid book of the assignment stress test:
+100 price levels on each side of the book with 2000 orders at each level.
+
+Benchmarks are run from the repository root as modules, e.g.:
+$ python -m benchmarks.bench_cancel
+"""
+import gc
+import random
+import time
+
+from limit_order_book import LimitOrderBook
+from message import AddMessage
+
+LEVELS = 100
+ORDERS_PER_LEVEL = 2000
+MID = 1000
+
+
+def stress_messages(levels: int = LEVELS, orders_per_level: int = ORDERS_PER_LEVEL, seed: int = 0) -> [str]:
+    """
+    Same shape as the initial book of scripts/gen_order_flow.py: bids below the mid, asks at and above it.
+    """
+    rng = random.Random(seed)
+    ret = []
+    for idx in range(levels):
+        for _ in range(orders_per_level):
+            ret.append(f'A-B-{25 + abs(round(rng.gauss(0, 10)))}-{MID - levels + idx}')
+    for idx in range(levels):
+        for _ in range(orders_per_level):
+            ret.append(f'A-S-{25 + abs(round(rng.gauss(0, 10)))}-{MID + idx}')
+    return ret
+
+
+def build_stress_book(
+        levels: int = LEVELS, orders_per_level: int = ORDERS_PER_LEVEL, seed: int = 0, **lob_kwargs
+) -> LimitOrderBook:
+    """
+    :param lob_kwargs: forwarded to LimitOrderBook, e.g. the price boundaries to get the dense ladder backend.
+    """
+    lob = LimitOrderBook(order_id_count=1, **lob_kwargs)
+    for msg_str in stress_messages(levels, orders_per_level, seed):
+        lob.process(AddMessage(msg_str.split('-')))
+    return lob
+
+
+def timed(func, *args) -> float:
+    """
+    The garbage collector is paused so that its passes over the large book do not pollute the measure.
+    :return: elapsed wall time in seconds.
+    """
+    gc.disable()
+    try:
+        start = time.perf_counter()
+        func(*args)
+        return time.perf_counter() - start
+    finally:
+        gc.enable()
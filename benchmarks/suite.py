@@ -0,0 +1,191 @@
+"""
+Stress benchmark suite of the LimitOrderBook, on the 100 levels x 2000 orders book of the assignment.
+
+Each operation is timed message by message on the same liquid book, for both backends of the LOB sides:
+* add: passive orders anywhere in the book
+* delete: random standing orders
+* modify_down: quantity decreased, the order keeps its priority
+* modify_up: quantity increased, the order is requeued at the back of its level
+* sweep: aggressive orders consuming a whole price level and part of the next one
+* equilibrium_mid: EP after a passive add at a random depth
+
+The book is rebuilt and the operations replayed a few times, the run of lowest median latency of each operation is
+kept so that the measure is robust to noise. The throughput and the latency percentiles are written to a JSON file.
+Given the file of a previous run, the operations whose median latency got worse by more than the tolerance are
+reported and the suite exits with 1.
+
+$ python -m benchmarks.suite --output bench_results.json
+$ python -m benchmarks.suite --output new.json --baseline bench_results.json --tolerance 0.25
+"""
+import argparse
+import gc
+import json
+import platform
+import random
+import sys
+import time
+from itertools import islice
+
+import numpy as np
+
+from benchmarks.stress_book import LEVELS, MID, ORDERS_PER_LEVEL, build_stress_book
+from message import AddMessage, DeleteMessage, ModifyMessage
+
+N_OPERATIONS = 10000
+N_SWEEPS = LEVELS // 2
+HALF_TIME_TICKS = 0.2
+PERCENTILES = (50, 90, 99, 99.9)
+
+BACKENDS = {
+    'sorted_dict': dict(dense_ladder=False),
+    'price_ladder': dict(min_price=0, max_price=2 * MID),
+}
+
+
+def time_each(func, args) -> np.ndarray:
+    """
+    :return: elapsed wall time of each call of func, in ns. The garbage collector is paused during the measure.
+    """
+    perf_counter_ns = time.perf_counter_ns
+    elapsed = np.empty(len(args), dtype=np.int64)
+    gc.disable()
+    try:
+        for idx, arg in enumerate(args):
+            start = perf_counter_ns()
+            func(arg)
+            elapsed[idx] = perf_counter_ns() - start
+    finally:
+        gc.enable()
+    return elapsed
+
+
+def passive_add(rng: random.Random) -> AddMessage:
+    if rng.random() < 0.5:
+        return AddMessage(['A', 'B', str(rng.randint(1, 60)), str(MID - rng.randint(1, LEVELS))])
+    return AddMessage(['A', 'S', str(rng.randint(1, 60)), str(MID + rng.randint(0, LEVELS - 1))])
+
+
+def bench_operations(lob, seed: int = 0) -> dict:
+    """
+    :return: elapsed wall time of each message in ns, by operation
+    """
+    rng = random.Random(seed)
+    ret = {}
+
+    ret['add'] = time_each(lob.process, [passive_add(rng) for _ in range(N_OPERATIONS)])
+
+    order_ids = rng.sample(list(lob._order_by_ids), 3 * N_OPERATIONS)
+    modified_down = order_ids[:N_OPERATIONS]
+    ret['modify_down'] = time_each(lob.process, [
+        ModifyMessage.from_fields(order_id, max(lob.get_order(order_id).quantity - 1, 1))
+        for order_id in modified_down
+    ])
+    modified_up = order_ids[N_OPERATIONS:2 * N_OPERATIONS]
+    ret['modify_up'] = time_each(lob.process, [
+        ModifyMessage.from_fields(order_id, lob.get_order(order_id).quantity + 10) for order_id in modified_up
+    ])
+    deleted = order_ids[2 * N_OPERATIONS:]
+    ret['delete'] = time_each(lob.process, [DeleteMessage.from_fields(order_id) for order_id in deleted])
+
+    def add_then_equilibrium_mid(msg):
+        lob.process(msg)
+        lob.equilibrium_mid(HALF_TIME_TICKS)
+
+    # The add is timed alone to be deducted, so that the EP with a cache invalidated at a random depth remains
+    eps = time_each(add_then_equilibrium_mid, [passive_add(rng) for _ in range(N_OPERATIONS)])
+    adds = time_each(lob.process, [passive_add(rng) for _ in range(N_OPERATIONS)])
+    ret['equilibrium_mid'] = np.maximum(eps - int(np.median(adds)), 0)
+
+    def sweep(_):
+        # The best ask level and one order of the next one, the quantities are read outside of the measure
+        lob.process(sweeps.pop())
+
+    sweeps_elapsed = []
+    for _ in range(N_SWEEPS):
+        prices = list(islice(lob._orders_by_asks.irange(), 2))
+        quantity = lob._orders_by_asks[prices[0]].quantity + 1
+        sweeps = [AddMessage(['A', 'B', str(quantity), str(prices[1])])]
+        sweeps_elapsed.append(time_each(sweep, [None])[0])
+    ret['sweep'] = np.array(sweeps_elapsed)
+    return ret
+
+
+def summary(elapsed: np.ndarray) -> dict:
+    return {
+        'n': len(elapsed),
+        'ops_per_s': float(len(elapsed) / (elapsed.sum() / 1e9)) if elapsed.sum() else None,
+        'mean_ns': float(elapsed.mean()),
+        **{f'p{percentile:g}_ns': float(value) for percentile, value in zip(
+            PERCENTILES, np.percentile(elapsed, PERCENTILES)
+        )},
+        'max_ns': float(elapsed.max()),
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> [str]:
+    """
+    :return: description of each operation whose median latency regressed by more than the tolerance
+    """
+    ret = []
+    for backend, operations in results['backends'].items():
+        for operation, stats in operations.items():
+            base = baseline.get('backends', {}).get(backend, {}).get(operation)
+            if not base or not base['p50_ns']:
+                continue
+            ratio = stats['p50_ns'] / base['p50_ns']
+            if ratio > 1 + tolerance:
+                ret.append(
+                    f'{backend} {operation}: p50 {base["p50_ns"]:.0f} ns -> {stats["p50_ns"]:.0f} ns (x{ratio:.2f})'
+                )
+    return ret
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--output', type=str, required=False, default='bench_results.json', help='JSON results')
+    parser.add_argument('--baseline', type=str, required=False, help='JSON results of a previous run to compare to')
+    parser.add_argument(
+        '--tolerance', type=float, required=False, default=0.25, help='Accepted relative increase of the p50 latency'
+    )
+    parser.add_argument('--seed', type=int, required=False, default=0)
+    parser.add_argument('--repeat', type=int, required=False, default=3, help='Runs of each operation')
+    args = parser.parse_args()
+
+    results = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'levels': LEVELS,
+        'orders_per_level': ORDERS_PER_LEVEL,
+        'seed': args.seed,
+        'repeat': args.repeat,
+        'backends': {},
+    }
+    for backend, lob_kwargs in BACKENDS.items():
+        operations = {}
+        for _ in range(args.repeat):
+            lob = build_stress_book(seed=args.seed, **lob_kwargs)
+            for operation, elapsed in bench_operations(lob, args.seed).items():
+                stats = summary(elapsed)
+                if operation not in operations or stats['p50_ns'] < operations[operation]['p50_ns']:
+                    operations[operation] = stats
+        results['backends'][backend] = operations
+        for operation, stats in operations.items():
+            print(
+                f'{backend:<12} {operation:<16} {stats["ops_per_s"]:>10.0f} ops/s   '
+                f'p50 {stats["p50_ns"] / 1e3:>8.2f} us   p99 {stats["p99_ns"] / 1e3:>8.2f} us'
+            )
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f'Results written to {args.output}')
+
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f'Regression {regression}')
+        return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
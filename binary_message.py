@@ -0,0 +1,134 @@
+"""
+Binary fixed-width encoding of the messages, to replay fleet files without parsing text.
+
+Every message is a record of 32 bytes, little-endian:
+| msg type: uint8 | side: uint8 | order type: uint8 | padding: 1 byte | instrument: uint32 |
+| quantity: int64 | price: int64 | order id: uint64 |
+
+msg type is the ASCII code of the first character of the text format: A, D or M.
+side is the value of OrderSide, order type the value of OrderType, 0 for a limit order: both only meaningful for an
+AddMessage. The order type used to be padding, so that the records written before it are limit orders.
+instrument is the id of the instrument in the Market, 0 being the default one (see Market.add_instrument).
+quantity is not meaningful for a DeleteMessage, price only for an AddMessage other than a market order.
+Order ids are the native int ids (see order_id): an id that can not be decoded is encoded as 0, which is never assigned.
+
+Convert a text fleet file:
+$ python ./binary_message.py --fleet_file test_data/test_1.txt --output test_1.bin
+Add --random_order_id if the fleet file refers to random order ids, and the symbols of the instruments with --symbols,
+in the order of the --symbols of the replay.
+"""
+import argparse
+import struct
+from typing import Iterator, Mapping, Optional, Tuple
+
+from message import DEFAULT_INSTRUMENT, DEFAULT_SYMBOL, Message, AddMessage, DeleteMessage, ModifyMessage, split_symbol
+from order_id import (
+    UNKNOWN_ORDER_ID, OrderIdAllocator, RandomOrderIdAllocator, SequentialOrderIdAllocator,
+)
+
+RECORD = struct.Struct('<BBBxIqqQ')
+
+ADD = ord('A')
+DELETE = ord('D')
+MODIFY = ord('M')
+
+_SEQUENTIAL_ORDER_IDS = SequentialOrderIdAllocator()
+_DEFAULT_INSTRUMENTS = {DEFAULT_SYMBOL: DEFAULT_INSTRUMENT}
+
+_MESSAGE_FACTORY = {
+    'A': AddMessage,
+    'D': DeleteMessage,
+    'M': ModifyMessage,
+}
+
+
+def encode(msg: Message) -> bytes:
+    if isinstance(msg, AddMessage):
+        return RECORD.pack(
+            ADD, msg.side.value, msg.order_type.value, msg.instrument, msg.quantity, msg.price, UNKNOWN_ORDER_ID,
+        )
+    if isinstance(msg, DeleteMessage):
+        return RECORD.pack(DELETE, 0, 0, msg.instrument, 0, 0, msg.order_id)
+    if isinstance(msg, ModifyMessage):
+        return RECORD.pack(MODIFY, 0, 0, msg.instrument, msg.quantity, 0, msg.order_id)
+
+
+def encode_str(
+        msg_str: str, order_ids: OrderIdAllocator = _SEQUENTIAL_ORDER_IDS,
+        instruments: Mapping[str, int] = _DEFAULT_INSTRUMENTS,
+) -> Optional[bytes]:
+    """
+    :param msg_str: message in text format, e.g. 'A-B-12-240', 'A-B-12-240-IOC' or 'AAPL:A-B-12-240'
+    :param order_ids: decodes the order ids of the text format
+    :param instruments: instrument id by symbol
+    :return: None if the message is malformed or of an unknown symbol
+    """
+    symbol, msg_str = split_symbol(msg_str.strip())
+    if symbol not in instruments:
+        return None
+    msg_chars = msg_str.split('-')
+    if msg_chars[0] not in _MESSAGE_FACTORY:
+        return None
+    msg = _MESSAGE_FACTORY[msg_chars[0]](msg_chars, order_ids)
+    if not msg.is_init:
+        return None
+    msg.instrument = instruments[symbol]
+    return encode(msg)
+
+
+def iter_records(buffer) -> Iterator[Tuple[int, int, int, int, int, int, int]]:
+    """
+    Unpack the records in place, e.g. from a mmap of a binary fleet file.
+    :param buffer: any object supporting the buffer protocol, of a length multiple of RECORD.size
+    :return: iterator of (msg type, side, order type, instrument, quantity, price, order id)
+    """
+    return RECORD.iter_unpack(buffer)
+
+
+def convert_text_file(
+        text_path: str, binary_path: str, order_ids: OrderIdAllocator = _SEQUENTIAL_ORDER_IDS,
+        instruments: Mapping[str, int] = _DEFAULT_INSTRUMENTS,
+) -> Tuple[int, int]:
+    """
+    :param order_ids: decodes the order ids of the text format
+    :param instruments: instrument id by symbol, the messages of the other symbols are skipped
+    :return: number of messages converted and of malformed messages skipped
+    """
+    n_converted = n_skipped = 0
+    with open(text_path, 'r') as text_file, open(binary_path, 'wb') as binary_file:
+        for msg_str in text_file:
+            if not msg_str.strip():
+                continue
+            record = encode_str(msg_str, order_ids, instruments)
+            if record is None:
+                n_skipped += 1
+                continue
+            binary_file.write(record)
+            n_converted += 1
+    return n_converted, n_skipped
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--fleet_file', type=str, required=True, help='The path to a text input file')
+    parser.add_argument('--output', type=str, required=True, help='The path to the binary output file')
+    parser.add_argument(
+        '--random_order_id', required=False, default=False, action='store_true',
+        help='The order ids of the text file are random hexadecimal strings instead of incremented ints.'
+    )
+    parser.add_argument(
+        '--symbols', type=str, required=False, default='',
+        help='Comma separated symbols of the instruments, numbered from 1 as in the Market. See message.'
+    )
+    args = parser.parse_args()
+
+    order_ids = RandomOrderIdAllocator() if args.random_order_id else SequentialOrderIdAllocator()
+    instruments = dict(_DEFAULT_INSTRUMENTS)
+    for symbol in filter(None, args.symbols.split(',')):
+        instruments.setdefault(symbol, len(instruments))
+    n_converted, n_skipped = convert_text_file(args.fleet_file, args.output, order_ids, instruments)
+    print(f'{n_converted} messages converted, {n_skipped} malformed messages skipped')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+"""
+Equilibrium mid-market price (EP) of the LOB.
+
+The cumulative decaying quantity of a side is computed from its worst price level up to its best one:
+f(level) = (f(previous level) + TotalQuantity(level)) * 2 ** (-|level - top_of_book| / scale)
+with scale = half_time_ticks * mid.
+
+Within the spread, f_bid and f_ask decay from their top of the book so that
+f_bid(EP) = f_ask(EP) has a closed-form solution.
+
+Unrolled over the levels sorted from the best price (index 0) to the worst one:
+f(top_of_book) = sum_i TotalQuantity(i) * 2 ** (-sum_{k <= i} |price_k - top_of_book| / scale)
+which is computed in one vectorized pass over a snapshot of the side as NumPy arrays.
+
+The EP itself is solved in pure Python: NumPy is only imported by the vectorized functions, on their first call.
+"""
+from __future__ import annotations
+
+import math
+from bisect import bisect_left
+from typing import TYPE_CHECKING, List, Optional, Tuple
+
+from order_side import OrderSide
+
+if TYPE_CHECKING:
+    import numpy as np
+
+
+def solve_equilibrium_mid(
+        high_bid: int, low_ask: int, scale: float, bid_cum_quantity: float, ask_cum_quantity: float,
+) -> float:
+    """
+    Solves 2 ** (-(EP - high_bid) / scale) * bid_cum_quantity = 2 ** (-(low_ask - EP) / scale) * ask_cum_quantity.
+    :return: EP, bounded by the spread as the equality has no solution outside of it.
+    """
+    # TODO - Complexity: In O(1)
+    ep = (high_bid + low_ask) / 2. + scale / 2. * math.log2(bid_cum_quantity / ask_cum_quantity)
+    return float(min(max(ep, high_bid), low_ask))
+
+
+def level_arrays(orderbook_side) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Snapshot of one side of the LOB.
+    :param orderbook_side: SortedDict or PriceLadder of the side, price level -> PriceLevel
+    :return: contiguous arrays of the prices and total quantities of the levels, from the best price to the worst.
+    """
+    import numpy as np
+
+    n_levels = len(orderbook_side)
+    prices = np.fromiter(orderbook_side.irange(), dtype=np.int64, count=n_levels)
+    quantities = np.fromiter(
+        (price_level.quantity for _, price_level in orderbook_side.items()), dtype=np.int64, count=n_levels,
+    )
+    return prices, quantities
+
+
+def cum_decaying_quantity_vectorized(
+        prices: np.ndarray, quantities: np.ndarray, top_of_book: int, scale: float,
+) -> float:
+    """
+    Same value as CumDecayingQuantity and LimitOrderBook.cum_decaying_*_quantity, without any Python loop.
+    :param prices: from the best price to the worst, see level_arrays
+    :param quantities: total quantities of the levels
+    :param top_of_book: high bid or low ask
+    :param scale: half_time_ticks * mid
+    :return: cumulative decaying quantity at the top of the book
+    """
+    import numpy as np
+
+    decay_exponents = np.cumsum(np.abs(prices - top_of_book) / scale)
+    return float(np.dot(quantities, np.exp2(-decay_exponents)))
+
+
+class CumDecayingQuantity:
+    """
+    Cumulative decaying quantity of one side of the LOB, cached between two EP computations.
+
+    The value of the recursion after each price level is kept, from the worst level to the best one.
+    The LOB reports every price level it changes through ``touch``: only the deepest one since the last computation
+    is kept, as the values of the levels worse than it are still valid. Only the levels from it to the top of the book
+    are then recomputed. A new top of the book or scale invalidates all the values.
+    An unchanged side is returned in O(1).
+    """
+
+    __slots__ = ('_sign', '_keys', '_partials', '_top_of_book', '_scale', '_dirty_price')
+
+    def __init__(self, side: OrderSide):
+        # Keys of the price levels are signed so that they are ascending from the worst level to the best one
+        self._sign: int = 1 if side == OrderSide.BUY else -1
+        self._keys: List[int] = []
+        self._partials: List[float] = []
+        self._top_of_book: Optional[int] = None
+        self._scale: Optional[float] = None
+        self._dirty_price: Optional[int] = None
+
+    def touch(self, price: int):
+        # TODO - Complexity: In O(1)
+        if self._dirty_price is None or price * self._sign < self._dirty_price * self._sign:
+            self._dirty_price = price
+
+    def value(self, orderbook_side, top_of_book: int, scale: float) -> float:
+        """
+        :param orderbook_side: SortedDict or PriceLadder of the side, price level -> PriceLevel
+        :param top_of_book: high bid or low ask
+        :param scale: half_time_ticks * mid
+        :return: cumulative decaying quantity at the top of the book
+        """
+        if top_of_book != self._top_of_book or scale != self._scale:
+            self._top_of_book, self._scale = top_of_book, scale
+            self._keys, self._partials = [], []
+            from_price = None
+        elif self._dirty_price is None:
+            return self._partials[-1] if self._partials else 0
+        else:
+            # TODO - Complexity: In O(log(n) + #levels between the deepest change and the top of the book)
+            from_price = self._dirty_price
+            cut = bisect_left(self._keys, from_price * self._sign)
+            del self._keys[cut:]
+            del self._partials[cut:]
+
+        cum_sum = self._partials[-1] if self._partials else 0
+        # From the deepest changed price level toward the best one
+        for price in orderbook_side.irange(maximum=from_price, reverse=True):
+            cum_sum += orderbook_side[price].quantity
+            cum_sum *= 2 ** (-abs(price - top_of_book) / scale)
+            self._keys.append(price * self._sign)
+            self._partials.append(cum_sum)
+
+        self._dirty_price = None
+        return cum_sum
@@ -0,0 +1,192 @@
+"""
+Stream of the fills of the matching engine, for the downstream risk and clearing systems.
+
+Every fill is a packed record of 48 bytes, little-endian:
+| sequence: uint64 | instrument: uint32 | padding: 4 bytes |
+| maker order id: uint64 | taker order id: uint64 | price: int64 | quantity: int64 |
+
+The maker is the order standing in the LOB, the taker the incoming order. The sequence number counts the fills of the
+report from 0, so that a consumer detects the fills it missed. The books of all the instruments of a Market share
+one report.
+
+The records are packed with struct, by the matching engine which never needs NumPy. NumPy is only imported once the
+records are read by columns by the consumers, see since and drain.
+"""
+from __future__ import annotations
+
+import struct
+from typing import TYPE_CHECKING, Optional, Sequence
+
+if TYPE_CHECKING:
+    import numpy as np
+
+FILL = struct.Struct('<QI4xQQqq')
+
+# Fields of FILL_DTYPE: same layout as FILL, so that the drained records are read as columns
+_FILL_FIELDS = [
+    ('sequence', '<u8'),
+    ('instrument', '<u4'),
+    ('padding', 'V4'),
+    ('maker_order_id', '<u8'),
+    ('taker_order_id', '<u8'),
+    ('price', '<i8'),
+    ('quantity', '<i8'),
+]
+_fill_dtype: Optional[np.dtype] = None
+
+_pack_fill_into = FILL.pack_into
+# The price of a fill, read in place
+_PRICE = struct.Struct('<q')
+_PRICE_OFFSET = 32
+
+
+def fill_dtype() -> np.dtype:
+    """
+    :return: NumPy dtype of the records, also exposed as FILL_DTYPE
+    """
+    global _fill_dtype
+    if _fill_dtype is None:
+        import numpy as np
+
+        _fill_dtype = np.dtype(_FILL_FIELDS)
+        assert _fill_dtype.itemsize == FILL.size
+    return _fill_dtype
+
+
+def __getattr__(name: str):
+    # FILL_DTYPE is built on first access, so that importing the module does not import NumPy
+    if name == 'FILL_DTYPE':
+        return fill_dtype()
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+
+class FillReport:
+    """
+    Fixed-capacity ring buffer of the fill records, preallocated once.
+
+    The matching engine records each fill in place in the buffer, without creating any Python object per fill.
+    The consumers drain the records by batches. If they fall behind by more than the capacity, the oldest records are
+    overwritten: the gap is seen in the sequence numbers and counted by ``n_overwritten``.
+    """
+
+    __slots__ = ('_buffer', '_records', '_capacity', '_sequence', '_drained', '_n_overwritten')
+
+    def __init__(self, capacity: int = 1 << 16):
+        self._buffer: bytearray = bytearray(capacity * FILL.size)
+        # View on the buffer by columns, see _columns
+        self._records: Optional[np.ndarray] = None
+        self._capacity: int = capacity
+        # Sequence number of the next fill, and of the next fill to be drained
+        self._sequence: int = 0
+        self._drained: int = 0
+        self._n_overwritten: int = 0
+
+    def __len__(self) -> int:
+        """
+        :return: number of fills recorded and not drained yet
+        """
+        return min(self._sequence - self._drained, self._capacity)
+
+    @property
+    def sequence(self) -> int:
+        """
+        :return: number of fills ever recorded
+        """
+        return self._sequence
+
+    @property
+    def n_overwritten(self) -> int:
+        """
+        :return: number of fills overwritten before being drained
+        """
+        return self._n_overwritten + max(self._sequence - self._drained - self._capacity, 0)
+
+    def _columns(self) -> np.ndarray:
+        if self._records is None:
+            import numpy as np
+
+            self._records = np.frombuffer(self._buffer, dtype=fill_dtype())
+        return self._records
+
+    def record(self, instrument: int, maker_order_id: int, taker_order_id: int, price: int, quantity: int):
+        # TODO - Complexity: In O(1), the record is packed in place
+        sequence = self._sequence
+        _pack_fill_into(
+            self._buffer, (sequence % self._capacity) * FILL.size,
+            sequence, instrument, maker_order_id, taker_order_id, price, quantity,
+        )
+        self._sequence = sequence + 1
+
+    def record_many(
+            self, instrument: int, maker_order_ids: Sequence[int], taker_order_id: int, price: int,
+            quantities: Sequence[int],
+    ):
+        """
+        Fills of one taker at one price, e.g. all the orders of a price level.
+        :param instrument:
+        :param maker_order_ids:
+        :param taker_order_id:
+        :param price:
+        :param quantities: filled quantity of each maker
+        """
+        # TODO - Complexity: In O(#fills), each record is packed in place, wrapping around the end of the buffer
+        buffer = self._buffer
+        sequence = self._sequence
+        offset = (sequence % self._capacity) * FILL.size
+        end = len(buffer)
+        for maker_order_id, quantity in zip(maker_order_ids, quantities):
+            _pack_fill_into(buffer, offset, sequence, instrument, maker_order_id, taker_order_id, price, quantity)
+            sequence += 1
+            offset += FILL.size
+            if offset == end:
+                offset = 0
+        self._sequence = sequence
+
+    def price(self, sequence: int) -> int:
+        """
+        :param sequence: sequence number of a fill, the oldest one still in the buffer if it was overwritten
+        :return: price of the fill, without NumPy
+        """
+        # TODO - Complexity: In O(1), the price is unpacked in place
+        sequence = max(sequence, self._sequence - self._capacity)
+        return _PRICE.unpack_from(self._buffer, (sequence % self._capacity) * FILL.size + _PRICE_OFFSET)[0]
+
+    def since(self, sequence: int) -> np.ndarray:
+        """
+        Peek at the latest fills without draining them, e.g. the fills of the last message.
+        :param sequence: sequence number of the first fill, the fills already overwritten are skipped
+        :return: the fills from sequence on, a view on the buffer unless they wrap around its end
+        """
+        # TODO - Complexity: In O(1) as a view, in O(#fills) when they wrap around
+        import numpy as np
+
+        columns = self._columns()
+        sequence = max(sequence, self._sequence - self._capacity)
+        start = sequence % self._capacity
+        stop = start + self._sequence - sequence
+        if stop <= self._capacity:
+            return columns[start:stop]
+        return np.concatenate((columns[start:], columns[:stop - self._capacity]))
+
+    def drain(self, max_fills: int = None) -> np.ndarray:
+        """
+        :param max_fills: at most this number of fills are drained, all of them if None
+        :return: copy of the oldest fills not drained yet, by sequence number, as a structured array of FILL_DTYPE
+        """
+        # TODO - Complexity: In O(#fills drained)
+        import numpy as np
+
+        columns = self._columns()
+        # Skips the fills overwritten since the last drain
+        n_overwritten = max(self._sequence - self._drained - self._capacity, 0)
+        self._n_overwritten += n_overwritten
+        self._drained += n_overwritten
+
+        n_fills = len(self) if max_fills is None else min(max_fills, len(self))
+        start = self._drained % self._capacity
+        if start + n_fills <= self._capacity:
+            fills = columns[start:start + n_fills].copy()
+        else:  # The fills wrap around the end of the buffer
+            fills = np.concatenate((columns[start:], columns[:start + n_fills - self._capacity]))
+        self._drained += n_fills
+        return fills
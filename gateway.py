@@ -0,0 +1,223 @@
+"""
+Order-entry gateway:
+Asyncio server accepting the text messages of the exchange (see message) from many concurrent clients, over TCP or a
+Unix socket, one message per line.
+
+Every message of a client gets one response line, in order:
+    ACK <result>    e.g. ACK Message Added 12, see LimitOrderBook.send_result
+    REJ <message>   the message could not be decoded or failed the sanity checks
+and the fills of the orders of a client are streamed to it, on the side of the maker as on the side of the taker:
+    FILL [<symbol>:]<maker order id> <taker order id> <quantity>@<price>
+
+The messages of all the clients are coalesced into batches: the dispatcher takes whatever has arrived, up to
+MAX_BATCH_SIZE messages, and hands the batch over to the matching thread. The event loop keeps reading and writing the
+sockets while a batch is matched, and the next batch gathers the messages arrived meanwhile.
+
+Backpressure: the inbound queue is bounded, so that the clients are not read anymore while it is full. A client is
+not read either while its responses are not sent, so that a slow reader only slows itself down.
+
+When a client disconnects, its orders stay in the LOBs but the gateway forgets that they are its own, once its last
+messages are matched.
+
+$ python ./gateway.py --port 8888 --symbols AAPL,MSFT
+$ python -m benchmarks.bench_gateway
+"""
+import asyncio
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Set, Tuple
+
+from market import Market
+from message import AddMessage, DeleteMessage, ModifyMessage, SYMBOL_SEPARATOR
+from run_exchange import build_parser, market_kwargs
+
+MAX_BATCH_SIZE = 1024
+INBOUND_CAPACITY = 1 << 14
+
+
+class Gateway:
+    """
+    Sessions of the clients, and ownership of their orders so that the fills are sent to the right clients.
+    Only the matching thread touches the market.
+    """
+
+    def __init__(self, market: Market, max_batch_size: int = MAX_BATCH_SIZE, inbound_capacity: int = INBOUND_CAPACITY):
+        self._market: Market = market
+        # Symbol prefix of the fills, indexed by instrument id
+        self._prefixes: List[str] = [
+            f'{symbol}{SYMBOL_SEPARATOR}' if symbol else '' for symbol in market.instruments
+        ]
+        self._max_batch_size: int = max_batch_size
+        self._inbound: asyncio.Queue = asyncio.Queue(inbound_capacity)
+        # TODO - Complexity: Hash Table of the session of the standing orders by (instrument, order id), and of the
+        #  standing orders by session, so that the orders of a closed session are forgotten in O(#orders)
+        self._owners: Dict[Tuple[int, int], asyncio.StreamWriter] = {}
+        self._orders_by_session: Dict[asyncio.StreamWriter, Set[Tuple[int, int]]] = {}
+        self._matching: ThreadPoolExecutor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='matching')
+        self._dispatcher: asyncio.Task = None
+        self.n_batches: int = 0
+        self.n_messages: int = 0
+
+    async def start(self, host: str = '127.0.0.1', port: int = 0, unix_socket: str = None) -> asyncio.AbstractServer:
+        """
+        :param host:
+        :param port: 0 picks a free port, see the sockets of the returned server
+        :param unix_socket: path of a Unix socket to listen on instead of TCP
+        :return: the listening server
+        """
+        self._dispatcher = asyncio.create_task(self._dispatch())
+        if unix_socket:
+            return await asyncio.start_unix_server(self._handle_client, path=unix_socket)
+        return await asyncio.start_server(self._handle_client, host, port)
+
+    def close(self):
+        if self._dispatcher:
+            self._dispatcher.cancel()
+        self._matching.shutdown()
+
+    async def _handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                msg_str = line.decode().strip()
+                if not msg_str:
+                    continue
+                # Waits while the inbound queue is full, then while the responses of the client are not sent
+                await self._inbound.put((writer, msg_str))
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+            # Queued after the messages of the session: its orders are forgotten once they are matched
+            await self._inbound.put((writer, None))
+
+    async def _dispatch(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._inbound.get()]
+            while len(batch) < self._max_batch_size and not self._inbound.empty():
+                batch.append(self._inbound.get_nowait())
+
+            responses = await loop.run_in_executor(self._matching, self._match, batch)
+            self.n_batches += 1
+            self.n_messages += sum(msg_str is not None for _, msg_str in batch)
+
+            for writer, lines in responses.items():
+                if not writer.is_closing():
+                    writer.write(''.join(lines).encode())
+
+    def _match(
+            self, batch: List[Tuple[asyncio.StreamWriter, Optional[str]]],
+    ) -> Dict[asyncio.StreamWriter, List[str]]:
+        """
+        Runs in the matching thread.
+        :param batch: messages in arrival order, with the session of their client. None ends the session.
+        :return: response lines by session, the ack of each message followed by its fills
+        """
+        market = self._market
+        owners = self._owners
+        orders_by_session = self._orders_by_session
+        responses: Dict[asyncio.StreamWriter, List[str]] = {}
+        # Orders deleted or fully filled by the batch
+        released: List[Tuple[int, int]] = []
+
+        for writer, msg_str in batch:
+            if msg_str is None:
+                for key in orders_by_session.pop(writer, ()):
+                    del owners[key]
+                continue
+            lines = responses.setdefault(writer, [])
+            sequence = market.fill_sequence
+            try:
+                msg = market.decode(msg_str)
+                if not msg or not msg.is_init:
+                    lines.append(f'REJ {msg_str}\n')
+                    continue
+                ret = market.execute(msg)
+            except Exception as error:
+                # A message the market fails on is rejected, the gateway keeps serving the others
+                print(f'Message {msg_str!r} failed: {error!r}', file=sys.stderr)
+                lines.append(f'REJ {msg_str}\n')
+            else:
+                if ret is not None:
+                    if isinstance(msg, AddMessage):
+                        owners[msg.instrument, ret] = writer
+                        orders_by_session.setdefault(writer, set()).add((msg.instrument, ret))
+                    elif isinstance(msg, DeleteMessage) or (isinstance(msg, ModifyMessage) and not msg.quantity):
+                        released.append((msg.instrument, ret))
+                lines.append(f'ACK {market.get_limit_order_book(msg.instrument).send_result(msg, ret)}\n')
+
+            # The fills are drained after each message, so that those of a batch never overrun the FillReport
+            if market.fill_sequence != sequence:
+                self._send_fills(writer, responses, released)
+
+        for key in released:
+            writer = owners.pop(key, None)
+            if writer is not None:
+                orders_by_session[writer].discard(key)
+        return responses
+
+    def _send_fills(
+            self, taker: asyncio.StreamWriter, responses: Dict[asyncio.StreamWriter, List[str]],
+            released: List[Tuple[int, int]],
+    ):
+        """
+        Drain the fills of the last message, sent to its client, the taker, and to the clients of the makers.
+        :param released: the fully filled makers are appended to it
+        """
+        market = self._market
+        owners = self._owners
+        for fill in market.drain_fills().tolist():
+            _, instrument, _, maker_order_id, taker_order_id, price, quantity = fill
+            limit_order_book = market.get_limit_order_book(instrument)
+            order_ids = limit_order_book.order_ids
+            line = (
+                f'FILL {self._prefixes[instrument]}{order_ids.encode(maker_order_id)} '
+                f'{order_ids.encode(taker_order_id)} {quantity}@{price}\n'
+            )
+            responses.setdefault(taker, []).append(line)
+
+            maker = owners.get((instrument, maker_order_id))
+            if maker is not None:
+                if maker is not taker:
+                    responses.setdefault(maker, []).append(line)
+                if limit_order_book.get_order(maker_order_id) is None:  # Fully filled
+                    released.append((instrument, maker_order_id))
+
+
+async def serve(market: Market, host: str, port: int, unix_socket: str = None):
+    gateway = Gateway(market)
+    server = await gateway.start(host, port, unix_socket)
+    for sock in server.sockets:
+        print(f'Gateway listening on {sock.getsockname()}')
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        gateway.close()
+
+
+def main():
+    parser = build_parser()
+    parser.add_argument('--host', type=str, required=False, default='127.0.0.1', help='Interface to listen on')
+    parser.add_argument('--port', type=int, required=False, default=8888, help='TCP port to listen on')
+    parser.add_argument(
+        '--unix_socket', type=str, required=False, help='Path of a Unix socket to listen on instead of TCP'
+    )
+    args = parser.parse_args()
+
+    print('Opening Exchange')
+    market = Market(interactive=False, **market_kwargs(args))
+    try:
+        asyncio.run(serve(market, args.host, args.port, args.unix_socket))
+    except KeyboardInterrupt:
+        pass
+    print('Closing Exchange')
+
+
+if __name__ == '__main__':
+    ret = main()
+    sys.exit(ret)
@@ -0,0 +1,222 @@
+"""
+Opt-in instrumentation of the matching engine: latency of the messages by type and outcome, and size of the matches.
+
+The values are recorded into log-bucketed histograms: bucket b counts the values v with v.bit_length() == b,
+i.e. 2 ** (b - 1) <= v < 2 ** b. Recording a value is a few int operations on a list, so that the latency of each
+message is measured without distorting it much; the percentiles are read at the resolution of a factor 2.
+
+The outcome of a message is:
+* rest: an add standing in the LOB without any fill
+* full_fill: an add fully filled, nothing rests
+* partial_fill: an add partially filled, its residual rests
+* cancelled_residual: an add partially filled, its residual cancelled instead of resting (see OrderType)
+* accept: a delete or modify of a standing order
+* reject: an add rejected by the LOB or cancelled without any fill, or a delete or modify of an unknown order
+
+The Market only times the messages when it is given an Instrumentation: disabled, it costs one test per message.
+"""
+from time import perf_counter_ns
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from binary_message import ADD, DELETE, MODIFY
+from fill_report import FillReport
+from message import Message, AddMessage, DeleteMessage, ModifyMessage
+from order_type import OrderType
+
+REST = 'rest'
+FULL_FILL = 'full_fill'
+PARTIAL_FILL = 'partial_fill'
+CANCELLED_RESIDUAL = 'cancelled_residual'
+ACCEPT = 'accept'
+REJECT = 'reject'
+
+MSG_TYPE_NAMES = {ADD: 'add', DELETE: 'delete', MODIFY: 'modify'}
+_MSG_TYPES = {AddMessage: ADD, DeleteMessage: DELETE, ModifyMessage: MODIFY}
+
+PERCENTILES = (50, 90, 99, 99.9)
+
+_LIMIT = OrderType.LIMIT.value
+
+
+class LogHistogram:
+    """
+    Histogram of non-negative ints in power of 2 buckets.
+    """
+
+    __slots__ = ('_counts', '_count', '_total', '_max')
+
+    N_BUCKETS = 65  # Up to 2 ** 64
+
+    def __init__(self):
+        self._counts: List[int] = [0] * self.N_BUCKETS
+        self._count: int = 0
+        self._total: int = 0
+        self._max: int = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def record(self, value: int):
+        # TODO - Complexity: In O(1)
+        self._counts[value.bit_length()] += 1
+        self._count += 1
+        self._total += value
+        if value > self._max:
+            self._max = value
+
+    def percentile(self, q: float) -> int:
+        """
+        :param q: in [0, 100]
+        :return: upper bound of the bucket of the q-th percentile, capped by the max value
+        """
+        rank = q / 100. * self._count
+        cum = 0
+        for bucket, count in enumerate(self._counts):
+            cum += count
+            if count and cum >= rank:
+                return min((1 << bucket) - 1, self._max)
+        return self._max
+
+    def snapshot(self) -> dict:
+        """
+        :return: count, mean, percentiles, max, and the non-empty buckets by upper bound
+        """
+        return {
+            'count': self._count,
+            'mean': self._total / self._count if self._count else 0.,
+            **{f'p{q:g}': self.percentile(q) for q in PERCENTILES},
+            'max': self._max,
+            'buckets': {(1 << bucket) - 1: count for bucket, count in enumerate(self._counts) if count},
+        }
+
+
+class Instrumentation:
+    """
+    Latency histograms by (msg type, outcome), in ns, and histograms of the levels swept and the orders filled by
+    each add which matched.
+    """
+
+    __slots__ = ('_latencies', '_levels_swept', '_orders_touched')
+
+    def __init__(self):
+        self._latencies: Dict[Tuple[str, str], LogHistogram] = {}
+        self._levels_swept: LogHistogram = LogHistogram()
+        self._orders_touched: LogHistogram = LogHistogram()
+
+    def reset(self):
+        self._latencies = {}
+        self._levels_swept = LogHistogram()
+        self._orders_touched = LogHistogram()
+
+    def record(
+            self, msg_type: int, elapsed_ns: int, ret: Optional[int], fills: FillReport, sequence: int,
+            quantity: int = 0,
+    ):
+        """
+        :param msg_type: see binary_message
+        :param elapsed_ns: latency of the message
+        :param ret: result of the message, see LimitOrderBook.process
+        :param fills: FillReport of the LOB
+        :param sequence: sequence number of the FillReport before the message
+        :param quantity: quantity of an add, compared with its filled quantity when nothing rests
+        """
+        n_fills = fills.sequence - sequence
+        if msg_type == ADD:
+            if n_fills:
+                self._orders_touched.record(n_fills)
+                # The fills of a match are recorded best price first, one run of fills per level
+                match = fills.since(sequence)
+                prices = match['price']
+                self._levels_swept.record(1 + int(np.count_nonzero(prices[1:] != prices[:-1])))
+                if ret is not None:
+                    outcome = PARTIAL_FILL
+                # The fills already overwritten in the FillReport are not counted: the add is then taken as filled
+                elif len(match) == n_fills and int(match['quantity'].sum()) < quantity:
+                    outcome = CANCELLED_RESIDUAL
+                else:
+                    outcome = FULL_FILL
+            else:
+                outcome = REST if ret is not None else REJECT
+        else:
+            outcome = ACCEPT if ret is not None else REJECT
+
+        key = (MSG_TYPE_NAMES[msg_type], outcome)
+        histogram = self._latencies.get(key)
+        if histogram is None:
+            histogram = self._latencies[key] = LogHistogram()
+        histogram.record(elapsed_ns)
+
+    def process(self, limit_order_book, msg: Message) -> Optional[int]:
+        """
+        Timed LimitOrderBook.process
+        """
+        fills = limit_order_book.fills
+        sequence = fills.sequence
+        start = perf_counter_ns()
+        ret = limit_order_book.process(msg)
+        msg_type = _MSG_TYPES[type(msg)]
+        quantity = msg.quantity if msg_type == ADD else 0
+        self.record(msg_type, perf_counter_ns() - start, ret, fills, sequence, quantity)
+        return ret
+
+    def process_row(
+            self, limit_order_book, msg_type: int, side: int, quantity: int, price: int, order_id: int,
+            order_type: int = _LIMIT,
+    ) -> Optional[int]:
+        """
+        Timed LimitOrderBook.process_row
+        """
+        fills = limit_order_book.fills
+        sequence = fills.sequence
+        start = perf_counter_ns()
+        ret = limit_order_book.process_row(msg_type, side, quantity, price, order_id, order_type)
+        self.record(msg_type, perf_counter_ns() - start, ret, fills, sequence, quantity)
+        return ret
+
+    def process_batch(self, limit_order_book, batch) -> List[Optional[int]]:
+        """
+        Timed LimitOrderBook.process_batch, message by message
+        """
+        fills = limit_order_book.fills
+        process_row = limit_order_book.process_row
+        ret = []
+        for msg_type, side, quantity, price, order_id, order_type in batch.rows():
+            sequence = fills.sequence
+            start = perf_counter_ns()
+            row_ret = process_row(msg_type, side, quantity, price, order_id, order_type)
+            self.record(msg_type, perf_counter_ns() - start, row_ret, fills, sequence, quantity)
+            ret.append(row_ret)
+        return ret
+
+    def snapshot(self) -> dict:
+        """
+        :return: the histograms as plain dicts, e.g. to be dumped in JSON
+        """
+        return {
+            'latency_ns': {
+                f'{msg_type}/{outcome}': histogram.snapshot()
+                for (msg_type, outcome), histogram in sorted(self._latencies.items())
+            },
+            'levels_swept': self._levels_swept.snapshot(),
+            'orders_touched': self._orders_touched.snapshot(),
+        }
+
+    def to_str(self) -> str:
+        """
+        :return: table of the counts, means and percentiles, the latencies in ns
+        """
+        snapshot = self.snapshot()
+        rows = [
+            *snapshot['latency_ns'].items(),
+            ('levels_swept', snapshot['levels_swept']),
+            ('orders_touched', snapshot['orders_touched']),
+        ]
+        lines = [f'{"":<20}{"count":>10}{"mean":>10}' + ''.join(f'{f"p{q:g}":>10}' for q in PERCENTILES)]
+        for name, stats in rows:
+            lines.append(
+                f'{name:<20}{stats["count"]:>10}{stats["mean"]:>10.0f}'
+                + ''.join(f'{stats[f"p{q:g}"]:>10}' for q in PERCENTILES)
+            )
+        return '\n'.join(lines)
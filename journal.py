@@ -0,0 +1,274 @@
+"""
+Journal of the messages accepted by the LOBs, so that a book lost in a crash is rebuilt from its last snapshot
+(see snapshot) and the tail of the journal.
+
+Every message which changed a LOB is appended once processed, as a record of 40 bytes, little-endian:
+| sequence: uint64 | binary record of the message, see binary_message |
+where the order id of an add is the id it was assigned, even if nothing of it rests (see OrderType). Deletes and modifies of unknown orders, and adds rejected by
+the LOB, change nothing and are not journaled. The sequence numbers the records of the journal from 0.
+
+The random order ids of a LOB depend on the key of its allocator (see order_id), drawn anew by every process: before
+the first message of an instrument it journals, a Journal appends an ORDER_IDS record of its allocator, with the key
+as order id and the count of the ids already allocated as quantity. The replay restores the allocator from it, so
+that a journal of random order ids is replayed without a snapshot.
+
+Group commit: the records are buffered and written to the file with one fsync per group, either every group_size
+records or as soon as group_interval seconds passed since the last commit. The interval is checked on each append, and
+by a background thread which commits the records of an idle exchange, e.g. waiting for the interactive console.
+A record is durable once its group is committed, see committed_sequence.
+"""
+import os
+import struct
+import threading
+import time
+from typing import List, Optional, Set
+
+import numpy as np
+
+from binary_message import ADD, DELETE, MODIFY, RECORD
+from message import Message, AddMessage, DeleteMessage, ModifyMessage
+from message_batch import RECORD_DTYPE, MessageBatch
+from order_id import RandomOrderIdAllocator
+from order_type import OrderType
+
+JOURNAL_RECORD = struct.Struct('<Q' + RECORD.format[1:])
+JOURNAL_DTYPE = np.dtype([('sequence', '<u8'), ('record', RECORD_DTYPE)])
+assert JOURNAL_DTYPE.itemsize == JOURNAL_RECORD.size
+
+# Message type of the records of the random order id allocator of an instrument, only found in journals
+ORDER_IDS = ord('O')
+
+_pack_record = JOURNAL_RECORD.pack
+_fsync = getattr(os, 'fdatasync', os.fsync)
+_LIMIT = OrderType.LIMIT.value
+
+
+class Journal:
+    """
+    Append-only journal file with group commit.
+    """
+
+    def __init__(
+            self, path: str, group_size: int = 1, group_interval: Optional[float] = None, fsync: bool = True,
+    ):
+        """
+        :param path: the journal is appended to if it exists, a torn last record is dropped
+        :param group_size: number of records per commit
+        :param group_interval: seconds after which the records are committed, whatever their number, even if no
+            record follows them
+        :param fsync: if False, a commit only hands the records over to the OS: they survive a crash of the process,
+            not of the machine
+        """
+        self._group_size: int = group_size
+        self._group_interval: Optional[float] = group_interval
+        self._fsync: bool = fsync
+        self._fd: int = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        size = os.fstat(self._fd).st_size
+        if size % JOURNAL_RECORD.size:
+            os.ftruncate(self._fd, size - size % JOURNAL_RECORD.size)
+        self._sequence: int = size // JOURNAL_RECORD.size
+        self._committed: int = self._sequence
+        self._buffer: bytearray = bytearray()
+        self._last_commit: float = time.monotonic()
+        # Instruments whose order id allocator was journaled since the journal was opened
+        self._instruments: Set[int] = set()
+        # The buffer is shared with the thread committing the records left pending by an idle exchange: an append only
+        # extends its end and a commit only removes the records it wrote from its start, so that only the commits
+        # are serialized, the appends take no lock
+        self._lock: threading.Lock = threading.Lock()
+        self._closed: threading.Event = threading.Event()
+        self._committer: Optional[threading.Thread] = None
+        if group_interval is not None:
+            self._committer = threading.Thread(target=self._commit_periodically, daemon=True)
+            self._committer.start()
+
+    @property
+    def sequence(self) -> int:
+        """
+        :return: sequence number of the next record
+        """
+        return self._sequence
+
+    @property
+    def committed_sequence(self) -> int:
+        """
+        :return: the records before this sequence number are durable
+        """
+        return self._committed
+
+    def append(
+            self, msg_type: int, side: int, instrument: int, quantity: int, price: int, order_id: int,
+            order_type: int = _LIMIT,
+    ):
+        # TODO - Complexity: In O(1), plus the commit of the group
+        self._buffer += _pack_record(self._sequence, msg_type, side, order_type, instrument, quantity, price, order_id)
+        self._sequence += 1
+        if self._sequence - self._committed >= self._group_size or (
+                self._group_interval is not None and time.monotonic() - self._last_commit >= self._group_interval
+        ):
+            self.commit()
+
+    def _commit_periodically(self):
+        # A record waits at most group_interval after the last commit, whether other records follow it or not
+        while not self._closed.wait(self._group_interval):
+            with self._lock:
+                if time.monotonic() - self._last_commit >= self._group_interval:
+                    self._commit()
+
+    def commit(self):
+        """
+        Write the pending records, then fsync them.
+        """
+        with self._lock:
+            self._commit()
+
+    def _commit(self):
+        size = len(self._buffer)
+        if size:
+            records = self._buffer[:size]
+            del self._buffer[:size]
+            os.write(self._fd, records)
+            if self._fsync:
+                _fsync(self._fd)
+            self._committed += size // JOURNAL_RECORD.size
+        self._last_commit = time.monotonic()
+
+    def close(self):
+        self._closed.set()
+        if self._committer is not None:
+            self._committer.join()
+        self.commit()
+        os.close(self._fd)
+
+    def _append_order_ids(self, limit_order_book):
+        """
+        Journal the random order id allocator of a LOB, before its first message journaled by this journal.
+        """
+        instrument = limit_order_book.instrument
+        self._instruments.add(instrument)
+        allocator = limit_order_book.order_ids
+        # The sequential order ids are allocated again from the same start by the replay
+        if isinstance(allocator, RandomOrderIdAllocator):
+            self.append(ORDER_IDS, 0, instrument, allocator.count, 0, allocator.key)
+
+    def process(self, limit_order_book, msg: Message, instrumentation=None) -> Optional[int]:
+        """
+        LimitOrderBook.process, journaling the message if accepted.
+        :param instrumentation: times the message if given, see instrumentation
+        """
+        if isinstance(msg, AddMessage):
+            return self.process_row(
+                limit_order_book, ADD, msg.side.value, msg.quantity, msg.price, 0, msg.order_type.value,
+                instrumentation,
+            )
+        if isinstance(msg, ModifyMessage):
+            return self.process_row(
+                limit_order_book, MODIFY, 0, msg.quantity, 0, msg.order_id, _LIMIT, instrumentation,
+            )
+        if isinstance(msg, DeleteMessage):
+            return self.process_row(limit_order_book, DELETE, 0, 0, 0, msg.order_id, _LIMIT, instrumentation)
+
+    def process_row(
+            self, limit_order_book, msg_type: int, side: int, quantity: int, price: int, order_id: int,
+            order_type: int = _LIMIT, instrumentation=None,
+    ) -> Optional[int]:
+        """
+        LimitOrderBook.process_row, journaling the message if accepted.
+        """
+        if limit_order_book.instrument not in self._instruments:
+            self._append_order_ids(limit_order_book)
+        order_ids = limit_order_book.order_ids
+        last_order_id = order_ids.last
+        if instrumentation is None:
+            ret = limit_order_book.process_row(msg_type, side, quantity, price, order_id, order_type)
+        else:
+            ret = instrumentation.process_row(limit_order_book, msg_type, side, quantity, price, order_id, order_type)
+
+        if msg_type == ADD:
+            # An add was accepted if it was assigned an id, even if it was fully filled or cancelled
+            if order_ids.last != last_order_id:
+                self.append(msg_type, side, limit_order_book.instrument, quantity, price, order_ids.last, order_type)
+        elif ret is not None:
+            self.append(msg_type, side, limit_order_book.instrument, quantity, price, order_id)
+        return ret
+
+    def process_batch(self, limit_order_book, batch: MessageBatch, instrumentation=None) -> List[Optional[int]]:
+        """
+        LimitOrderBook.process_batch, journaling the accepted messages.
+        """
+        if limit_order_book.instrument not in self._instruments:
+            self._append_order_ids(limit_order_book)
+        if instrumentation is not None:
+            return [
+                self.process_row(
+                    limit_order_book, msg_type, side, quantity, price, order_id, order_type, instrumentation,
+                )
+                for msg_type, side, quantity, price, order_id, order_type in batch.rows()
+            ]
+
+        # Same as process_row, inlined
+        process_row = limit_order_book.process_row
+        order_ids = limit_order_book.order_ids
+        instrument = limit_order_book.instrument
+        append = self.append
+        ret = []
+        last_order_id = order_ids.last
+        for msg_type, side, quantity, price, order_id, order_type in batch.rows():
+            row_ret = process_row(msg_type, side, quantity, price, order_id, order_type)
+            if msg_type == ADD:
+                if order_ids.last != last_order_id:
+                    last_order_id = order_ids.last
+                    append(msg_type, side, instrument, quantity, price, last_order_id, order_type)
+            elif row_ret is not None:
+                append(msg_type, side, instrument, quantity, price, order_id)
+            ret.append(row_ret)
+        return ret
+
+
+def read_journal(path: str, from_sequence: int = 0) -> np.ndarray:
+    """
+    :param path:
+    :param from_sequence: the records before are skipped
+    :return: the records of the journal from from_sequence on, as a structured array of JOURNAL_DTYPE.
+        A torn last record is ignored.
+    """
+    if not os.path.exists(path):
+        return np.empty(0, dtype=JOURNAL_DTYPE)
+    with open(path, 'rb') as f:
+        f.seek(from_sequence * JOURNAL_RECORD.size)
+        buffer = f.read()
+    return np.frombuffer(buffer[:len(buffer) - len(buffer) % JOURNAL_RECORD.size], dtype=JOURNAL_DTYPE)
+
+
+def replay_journal(market, path: str, from_sequence: int = 0) -> int:
+    """
+    Apply the records of a journal to the LOBs of a market, e.g. restored from a snapshot taken at from_sequence.
+    The market must not journal the replayed messages itself.
+    :return: number of records replayed
+    :raise ValueError: if a record refers to an instrument not registered in the market, or if an add is assigned
+        another id than the journaled one, i.e. the journal does not follow the state of the market
+    """
+    journal = read_journal(path, from_sequence)
+    records = journal['record']
+    n_instruments = len(market.instruments)
+    for sequence, msg_type, side, instrument, quantity, price, order_id, order_type in zip(
+            journal['sequence'].tolist(), records['msg_type'].tolist(), records['side'].tolist(),
+            records['instrument'].tolist(), records['quantity'].tolist(), records['price'].tolist(),
+            records['order_id'].tolist(), records['order_type'].tolist(),
+    ):
+        # The instrument ids are assigned from 0 by the market, in registration order
+        if instrument >= n_instruments:
+            raise ValueError(
+                f'Journal {path} record {sequence} refers to instrument {instrument}, not registered in the market'
+            )
+        limit_order_book = market.get_limit_order_book(instrument)
+        if msg_type == ORDER_IDS:
+            limit_order_book.order_ids = RandomOrderIdAllocator(key=order_id, count=quantity)
+            continue
+        limit_order_book.process_row(msg_type, side, quantity, price, order_id, order_type)
+        if msg_type == ADD and limit_order_book.order_ids.last != order_id:
+            raise ValueError(
+                f'Journal {path} diverges: order id {order_id} of instrument {instrument} '
+                f'was replayed as {limit_order_book.order_ids.last}'
+            )
+    return len(records)
@@ -1,421 +1,740 @@
-from typing import Dict, Tuple
-from collections import deque
-from scipy import optimize
-
-import numpy as np
-from sortedcontainers import SortedDict
-
-from order import Order
-from order_side import OrderSide
-from message import Message, AddMessage, DeleteMessage, ModifyMessage
-
-
-class LimitOrderBook:
-    """
-    We assumed an order-based LOB with Price/Time/quantity priority.
-    """
-
-    def __init__(
-            self, price_increment: int = 1, quantity_increment: int = 1, min_price: int = 0, max_price: int = np.inf,
-            order_id_count: int = None,
-    ):
-        self._price_increment: int = price_increment
-        self._quantity_increment: int = quantity_increment
-        self._min_price: int = min_price
-        self._max_price: int = max_price
-        # TODO - Complexity:
-        #  Two data structures for each side of the LOB: a special hash table with keys being the price levels and
-        #  the values being double-entry queues.
-        #  A SortedDict is essentially a hash table with a list of keys maintained in order:
-        #  Complexity of Add, Del and Get from index in O(log(n)), Get from key in O(1).
-        #  n is the theoretical number of price levels.
-        #  The underlying implementation might be a binary tree.
-        #  See doc: https://grantjenks.com/docs/sortedcontainers/sorteddict.html
-
-        self._order_ids_by_bids: SortedDict[int, deque] = SortedDict(lambda n: -n)  # Reversed order
-        self._order_ids_by_asks: SortedDict[int, deque] = SortedDict()
-        # TODO - Complexity:
-        #  Hash Table. Add, Del, Get in O(1).
-        self._order_by_ids: Dict[str, Order] = {}
-        self._high_bid: int = self._min_price
-        self._low_ask: int = self._max_price
-
-        # Cache of order_ids to be deleted
-        self._to_delete_order_ids = []
-
-        # For sequential order id generation
-        self._order_id_count = order_id_count
-
-    def process(self, msg: Message):
-        if isinstance(msg, AddMessage):
-            self._process_add_message(msg)
-        elif isinstance(msg, DeleteMessage):
-            self._process_delete_message(msg)
-        elif isinstance(msg, ModifyMessage):
-            self._process_modify_message(msg)
-
-    def _process_add_message(self, msg: AddMessage):
-        if msg.side == OrderSide.BUY:
-            if msg.price < self._low_ask:
-                return self._bid_msg_add(msg)
-            else:  # msg.price >= self._limit_order_book.low_ask
-                return self._ask_match(msg)
-        else:  # msg.side == OrderSide.SELL
-            if msg.price > self._high_bid:
-                return self._ask_msg_add(msg)
-            else:  # msg.price <= self._limit_order_book.high_bid
-                return self._bid_match(msg)
-
-    def _process_delete_message(self, msg: DeleteMessage):
-        # TODO - Complexity: In O(1)
-        if msg.order_id not in self._order_by_ids:
-            return None
-        # TODO - Complexity: In O(1)
-        order = self._order_by_ids[msg.order_id]
-
-        if order.side == OrderSide.BUY:
-            ret = self._bid_delete(order)
-
-        else:  # order.side == OrderSide.SELL
-            ret = self._ask_delete(order)
-
-        del self._order_by_ids[msg.order_id]
-        return ret
-
-    def _process_modify_message(self, msg: ModifyMessage):
-        if msg.order_id not in self._order_by_ids:
-            return None
-
-        order = self._order_by_ids[msg.order_id]
-        quantity = order.quantity
-        order.quantity = msg.quantity
-
-        # If the new quantity is greater than the previous order quantity we place the order at the end of the queue
-        if quantity < msg.quantity:
-            if order.side == OrderSide.BUY:
-                ret = self._bid_delete(order)
-                return self._bid_order_add(order)
-            else:  # order_side == OrderSide.SELL
-                ret = self._ask_delete(order)
-                return self._ask_order_add(order)
-
-        # If the new quantity == 0 we simply delete the order
-        if msg.quantity == 0:
-            if order.side == OrderSide.BUY:
-                order_id = self._bid_delete(order)
-            else:  # order_side == OrderSide.SELL
-                order_id = self._ask_delete(order)
-
-            del self._order_by_ids[msg.order_id]
-
-            return order_id
-
-    def _ask_msg_add(self, msg: AddMessage) -> str:
-        if not self._order_id_count:
-            order = Order.from_msg(msg)
-            order_id = self._ask_order_add(order)
-        else:
-            order = Order.from_msg(msg, self._order_id_count)
-            order_id = self._ask_order_add(order)
-            self._order_id_count = order_id
-
-        self._order_by_ids[order_id] = order
-        if msg.price < self._low_ask:
-            self._low_ask = msg.price
-        return order_id
-
-    def _bid_msg_add(self, msg: AddMessage) -> str:
-        if not self._order_id_count:
-            order = Order.from_msg(msg)
-            order_id = self._bid_order_add(order)
-        else:
-            order = Order.from_msg(msg, self._order_id_count)
-            order_id = self._bid_order_add(order)
-            self._order_id_count = order_id
-
-        self._order_by_ids[order_id] = order
-        if msg.price > self._high_bid:
-            self._high_bid = msg.price
-        return order_id
-
-    def _ask_order_add(self, order: Order):
-        if order.price not in self._order_ids_by_asks:
-            self._order_ids_by_asks[order.price] = deque()
-        self._order_ids_by_asks[order.price].append(order.order_id)
-        return order.order_id
-
-    def _bid_order_add(self, order: Order):
-        if order.price not in self._order_ids_by_bids:
-            self._order_ids_by_bids[order.price] = deque()
-        self._order_ids_by_bids[order.price].append(order.order_id)
-        return order.order_id
-            
-    def _ask_match(self, msg: AddMessage) -> str:
-
-        self._low_ask, new_order_id = self._match(msg, self._order_ids_by_asks, self._bid_msg_add)
-        # TODO - JE: return more info and build a data structure to keep track of fills and partial fills
-        return new_order_id
-
-    def _bid_match(self, msg: AddMessage) -> str:
-
-        self._high_bid, new_order_id = self._match(msg, self._order_ids_by_bids, self._ask_msg_add)
-        # TODO - JE: return more info and build a data structure to keep track of fills and partial fills
-        return new_order_id
-
-    def _has_price_crossed(self, target_price, price_level, side) -> bool:
-        """
-        Check if an incoming message price is more attractive than a price level given a side.
-        :param target_price:
-        :param price_level:
-        :param side:
-        :return: True if the price is unattractive.
-        """
-        # If it's a BUY the price level is not attractive if it is above the target price -> True
-        # If it's a SELL the price level is not attractive if it is below the target price -> True
-
-        if side == OrderSide.BUY:
-            return target_price < price_level
-        else:  # side == OrderSide.SELL
-            return target_price > price_level
-
-    def _match(self, msg: AddMessage, orderbook_side, add_method) -> Tuple[int, str]:
-        """
-        Matching Engine.
-        Returns the updated top of the book as an int and the new order id as str if
-        it is a partial fill of the incoming message.
-
-        """
-        # TODO - Complexity: The engine runs through all the orders of one side of the book so the algo
-        #   complexity is in O(m) m being the total number of orders in the book, = O(k n) with k price levels and
-        #   n orders per price level.
-
-        residual_quantity, last_visited_price_level = self._consume_quantity_or_order_book(
-            quantity=msg.quantity, target_price=msg.price, side=msg.side, orderbook_side=orderbook_side,
-        )
-
-        top_of_the_book, new_order_id = self._manage_partial_fill(
-            residual_quantity, msg.side, orderbook_side, last_visited_price_level, add_method, msg
-        )
-
-        self._clear_delete_order_ids_cache()
-
-        return top_of_the_book, new_order_id
-
-    def _consume_quantity_or_order_book(self, quantity, target_price, side, orderbook_side) -> Tuple[int, int]:
-        """
-        :param quantity:
-        :param target_price:
-        :param side:
-        :param orderbook_side:
-        :return: quantity, last_visited_price_level
-        """
-
-        last_visited_price_level = None
-
-
-        # Run through the different existing price levels of the given side of the LOB
-        # TODO - Complexity: Because the SortedDict is modified while running through the keys, it takes O(log(n)),
-        #   with n being the number of price levels, to pop item and reinsert at the end if needed.
-        while orderbook_side:
-            price_level, order_deque = orderbook_side.popitem()
-
-            # If the price level becomes not matchable (i.e. worse of than the one in the message)
-            if self._has_price_crossed(target_price=target_price, price_level=price_level, side=side):
-                return quantity, last_visited_price_level
-
-            last_visited_price_level = price_level
-
-            # Until we consume the orderbook level
-            while order_deque:
-                current_order_id = order_deque.popleft()
-
-                quantity -= self._order_by_ids[current_order_id].quantity
-                self._to_delete_order_ids.append(current_order_id)
-
-                #  The incoming order quantity can be exhausted
-                if quantity <= 0:
-                    if order_deque:
-                        orderbook_side[price_level] = order_deque
-                    return quantity, last_visited_price_level
-
-            if order_deque:
-                orderbook_side[price_level] = order_deque
-
-        return quantity, last_visited_price_level
-
-    def _manage_partial_fill(self, residual_quantity, side, orderbook_side, price_level, add_method, msg) -> Tuple[int, str]:
-        new_order_id = None
-
-        if residual_quantity < 0:  # partial fill of order standing in LOB, but full fill of incoming message
-            order_id = self._to_delete_order_ids.pop()
-            self._order_by_ids[order_id].quantity = abs(residual_quantity)
-            top_of_book = self._order_by_ids[order_id].price
-            if top_of_book not in orderbook_side:
-                orderbook_side[top_of_book] = deque()
-            orderbook_side[top_of_book].appendleft(order_id)
-
-        else:  # quantity >= 0, partial matching of incoming message because order book empty or crossed price
-            if price_level not in orderbook_side:
-                if not orderbook_side:
-                    top_of_book = self._get_reset_top_of_book(side=side)
-                else:
-                    top_of_book = orderbook_side.iloc[0]
-            else:
-                top_of_book = price_level
-
-            if residual_quantity:  # quantity > 0, it's a partial fill
-                msg.quantity = residual_quantity
-                new_order_id = add_method(msg)
-
-        return top_of_book, new_order_id
-
-    def _clear_delete_order_ids_cache(self):
-        # TODO - Complexity: in O(m)
-        for order_id in self._to_delete_order_ids:
-            del self._order_by_ids[order_id]
-        self._to_delete_order_ids = []
-
-    def _bid_delete(self, order: Order):
-        """
-        :param order:
-        :return:
-        """
-        # TODO - Complexity: Remove is in O(k), k = deque length at the price level
-        #  Thus O(k log(n)).
-        #  We could have added pointer from order_by_order_ids to the bid to get O(1) in access,
-        #  but pointer access and manipulation could have costed more during removal.
-        self._order_ids_by_bids[order.price].remove(order.order_id)
-        return order.order_id
-
-    def _ask_delete(self, order: Order):
-        """
-        :param order:
-        :return:
-        """
-        # TODO - Complexity: Remove is in O(k), k = deque length at the price level
-        #  Thus O(k log(n))
-        #  We could have added pointer from order_by_order_ids to the bid to get O(1) in access,
-        #  but pointer access and manipulation could have costed more during removal.
-        self._order_ids_by_asks[order.price].remove(order.order_id)
-        return order.order_id
-
-    def _get_reset_top_of_book(self, side) -> int:
-        """
-        Send a reseting value of top of the book ie either high bid or low ask according to the incoming message side.
-
-        The incoming msg is a BUY, hence it consumed the ask side
-        or, it is a SELL and it consumed the bid side.
-
-        :param side: Enum
-        :return: self._min_price or self._max_price
-        """
-
-        if side == OrderSide.BUY:
-            return self._max_price
-        else:  # msg_side == OrderSide.SELL
-            return self._min_price
-
-    def to_str(self) -> str:
-        """
-        String representation of the LOB. The orders are each level are not shown whereas they are managed internally.
-        :return: Some LOB representation.
-        """
-        ret = ''
-        if np.isinf(self._low_ask):
-            ret += '\n ---------- Empty Asks ---------- \n'
-        else:
-            ret_prices = []
-            ret_quantitys = []
-
-            step = self._low_ask
-            for _ in range(10):
-                ret_prices.append(step)
-                if step not in self._order_ids_by_asks:
-                    ret_quantitys.append(0)
-                    step += self._price_increment
-                    continue
-                ret_quantitys.append(sum([self._order_by_ids[id_].quantity for id_ in self._order_ids_by_asks[step]]))
-                step += self._price_increment
-
-            ret += f'Ask quantitys : {ret_quantitys} \n'
-            ret += f'Ask Prices : {ret_prices} \n'
-
-        if not self._high_bid:
-            ret += '\n ---------- Empty Bids ---------- \n'
-        else:
-            ret_prices = []
-            ret_quantitys = []
-
-            step = self._high_bid
-            for _ in range(10):
-                ret_prices.append(step)
-                if step not in self._order_ids_by_bids:
-                    ret_quantitys.append(0)
-                    step -= self._price_increment
-                    continue
-                ret_quantitys.append(sum([self._order_by_ids[id_].quantity for id_ in self._order_ids_by_bids[step]]))
-                step -= self._price_increment
-
-            ret += f'Bid quantitys : {ret_quantitys} \n'
-            ret += f'Bid Prices : {ret_prices} \n'
-
-        return ret
-
-    def send_result(self, msg, ret) -> str:
-        """
-        String representation of the result of an incoming message
-        :param msg:
-        :param ret:
-        :return:
-        """
-        # TODO - JE: More verbose
-        if isinstance(msg, AddMessage):
-            return f'Message Added {ret}'
-        if isinstance(msg, DeleteMessage):
-            return f'Message Deleted {ret}'
-        if isinstance(msg, ModifyMessage):
-            return f'Message Modified {ret}'
-
-    def equilibrium_mid(self, half_time_ticks: float) -> float:
-        """
-        Needs low_ask and high_bid => mid != 0
-        :param half_time_ticks: > 0
-        :return: equilibrium mid within spread: Note that this quantity should be able to be outside the spread
-        """
-        mid = (self._low_ask + self._high_bid) / 2.
-
-        bid_cum_q = self.cum_decaying_bid_quantity(half_time_ticks, mid)
-        ask_cum_q = self.cum_decaying_ask_quantity(half_time_ticks, mid)
-        diff_cum_q = lambda p: (
-                2 ** (-abs(p-self._high_bid)/(mid * half_time_ticks)) * bid_cum_q
-                - 2 ** (-abs(p-self._low_ask)/(mid * half_time_ticks)) * ask_cum_q
-        )
-
-        high_bound = self._low_ask
-        low_bound = self._high_bid
-        ret = optimize.root_scalar(
-            diff_cum_q, bracket=[low_bound, high_bound], xtol=0.1 * self._price_increment, maxiter=100, method='bisect'
-        )
-        return ret.root
-
-    def _cum_decaying_quantity(self, half_time_ticks: float, orderbook_side, mid: float, top_of_book: int) -> float:
-        """
-        Slicing make it costly to run in terms of performance
-        :param price: 
-        :param half_time_ticks: 
-        :return: 
-        """
-        cum_sum = 0
-        for price_level, order_id_deque in reversed(orderbook_side.items()):
-            for order_id in order_id_deque:
-                cum_sum += self._order_by_ids[order_id].quantity
-            cum_sum *= 2 ** (-abs(price_level - top_of_book) / (half_time_ticks * mid))
-
-        return cum_sum
-
-    def cum_decaying_bid_quantity(self, half_time_ticks: float, mid: float) -> float:
-        return self._cum_decaying_quantity(half_time_ticks, self._order_ids_by_bids, mid, self._high_bid)
-    
-    def cum_decaying_ask_quantity(self, half_time_ticks, mid: float) -> float:
-        return self._cum_decaying_quantity(half_time_ticks, self._order_ids_by_asks, mid, self._low_ask)
-
+from __future__ import annotations
+
+import math
+from itertools import islice
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+from sortedcontainers import SortedDict
+
+from equilibrium import CumDecayingQuantity, cum_decaying_quantity_vectorized, level_arrays, solve_equilibrium_mid
+from fill_report import FillReport
+from order import Order
+from order_id import OrderIdAllocator, make_order_id_allocator
+from order_store import MAX_VALUE, MIN_VALUE, NIL, OrderStore
+from price_level import PriceLevel
+from price_ladder import PriceLadder
+from order_side import OrderSide
+from order_type import OrderType
+from message import Message, AddMessage, DeleteMessage, ModifyMessage
+from binary_message import ADD, DELETE, MODIFY
+
+# The LOB only needs NumPy for its depth as arrays, and the opt-in components are imported by their users
+if TYPE_CHECKING:
+    import numpy as np
+
+    from instrumentation import Instrumentation
+    from market_data import MarketDataPublisher
+    from message_batch import MessageBatch
+
+# OrderSide values, as stored in the side column of the OrderStore
+BUY = OrderSide.BUY.value
+SELL = OrderSide.SELL.value
+_SIDES = (OrderSide.BUY, OrderSide.SELL)  # Indexed by OrderSide value
+_ORDER_TYPES = tuple(OrderType)  # Indexed by OrderType value
+LIMIT = OrderType.LIMIT.value
+
+
+class LimitOrderBook:
+    """
+    We assumed an order-based LOB with Price/Time/quantity priority.
+    Only the limit orders rest in the LOB: the market, IOC and FOK orders are matched on arrival and their residual is
+    cancelled, see OrderType.
+    """
+
+    # Above this number of ticks between min_price and max_price, the dense ladder would waste too much memory
+    MAX_LADDER_TICKS = 1 << 20
+
+    def __init__(
+            self, price_increment: int = 1, quantity_increment: int = 1, min_price: int = 0, max_price: int = math.inf,
+            order_id_count: int = None, dense_ladder: Optional[bool] = None, fill_capacity: int = 1 << 16,
+            instrument: int = 0, fills: Optional[FillReport] = None, market_data: Optional[MarketDataPublisher] = None,
+    ):
+        """
+        :param order_id_count: the order ids are incremented from it, or random ones if None (see order_id)
+        :param fill_capacity: number of fills the FillReport keeps until they are drained
+        :param instrument: id of the instrument of the LOB, reported in its fills
+        :param fills: FillReport shared with the LOBs of other instruments, a new one of fill_capacity if None
+        :param market_data: told the new total quantity of every price level changed if given, see market_data
+        :param dense_ladder: store the price levels in a PriceLadder instead of a SortedDict.
+            By default, it is used as soon as the price range is bounded.
+        """
+        self._price_increment: int = price_increment
+        self._quantity_increment: int = quantity_increment
+        self._min_price: int = min_price
+        self._max_price: int = max_price
+        # TODO - Complexity:
+        #  Two data structures for each side of the LOB: a special hash table with keys being the price levels and
+        #  the values being FIFO queues of orders (see PriceLevel).
+        #  A SortedDict is essentially a hash table with a list of keys maintained in order:
+        #  Complexity of Add, Del and Get from index in O(log(n)), Get from key in O(1).
+        #  n is the theoretical number of price levels.
+        #  The underlying implementation might be a binary tree.
+        #  See doc: https://grantjenks.com/docs/sortedcontainers/sorteddict.html
+        #  When the price range is bounded, a PriceLadder is used instead: Add, Del and Get from key in O(1),
+        #  Get the best price level in O(1) amortized.
+
+        if dense_ladder is None:
+            dense_ladder = (
+                not math.isinf(max_price)
+                and PriceLadder.n_ticks(min_price, max_price, price_increment) <= self.MAX_LADDER_TICKS
+            )
+        self._is_dense_ladder: bool = dense_ladder
+
+        if self._is_dense_ladder:
+            self._orders_by_bids = PriceLadder(min_price, max_price, price_increment, reverse=True)
+            self._orders_by_asks = PriceLadder(min_price, max_price, price_increment)
+        else:
+            self._orders_by_bids: SortedDict[int, PriceLevel] = SortedDict(lambda n: -n)  # Reversed order
+            self._orders_by_asks: SortedDict[int, PriceLevel] = SortedDict()
+        # TODO - Complexity:
+        #  The orders are stored in the columns of the OrderStore, as handles.
+        #  Hash Table of the handles by order id. Add, Del, Get in O(1).
+        self._orders: OrderStore = OrderStore()
+        self._order_by_ids: Dict[int, int] = {}
+        self._high_bid: int = self._min_price
+        self._low_ask: int = self._max_price
+
+        # The order ids are ints, their text form is only handled by the allocator at the I/O edge
+        self._order_ids: OrderIdAllocator = make_order_id_allocator(order_id_count)
+
+        # Every fill of the matching engine is recorded there, see fills
+        self._instrument: int = instrument
+        self._fills: FillReport = fills if fills is not None else FillReport(fill_capacity)
+        # First and last price level matched by the last message which traded, see last_trade_prices
+        self._first_trade_price: int = 0
+        self._last_trade_price: int = 0
+        self._market_data: Optional[MarketDataPublisher] = market_data
+
+        # Incremented by every message which changes the LOB, the depth of each side is cached against it
+        self._version: int = 0
+        self._depth_cache: List[Optional[Tuple[int, int, np.ndarray, np.ndarray]]] = [None, None]
+
+        # Cumulative decaying quantities of the EP, told of every price level change
+        self._bid_cum_decaying_quantity = CumDecayingQuantity(OrderSide.BUY)
+        self._ask_cum_decaying_quantity = CumDecayingQuantity(OrderSide.SELL)
+
+    def process(self, msg: Message):
+        if isinstance(msg, AddMessage):
+            return self._process_add(msg.side, msg.quantity, msg.price, msg.order_type)
+        elif isinstance(msg, DeleteMessage):
+            return self._process_delete(msg.order_id)
+        elif isinstance(msg, ModifyMessage):
+            return self._process_modify(msg.order_id, msg.quantity)
+
+    def process_batch(
+            self, batch: MessageBatch, instrumentation: Optional[Instrumentation] = None,
+    ) -> List[Optional[int]]:
+        """
+        Process the messages of a batch in order, straight from its columns without building Message objects.
+        :param batch: see Market.decode_many
+        :param instrumentation: if given, each message is timed, see instrumentation
+        :return: results of the messages, as returned by process
+        """
+        if instrumentation is not None:
+            return instrumentation.process_batch(self, batch)
+
+        sides = _SIDES
+        order_types = _ORDER_TYPES
+        ret = []
+        for msg_type, side, quantity, price, order_id, order_type in batch.rows():
+            if msg_type == ADD:
+                ret.append(self._process_add(sides[side], quantity, price, order_types[order_type]))
+            elif msg_type == DELETE:
+                ret.append(self._process_delete(order_id))
+            else:  # msg_type == MODIFY
+                ret.append(self._process_modify(order_id, quantity))
+        return ret
+
+    def process_row(
+            self, msg_type: int, side: int, quantity: int, price: int, order_id: int, order_type: int = LIMIT,
+    ) -> Optional[int]:
+        """
+        Process one message given as a row of a MessageBatch, see MessageBatch.rows
+        :return: result of the message, as returned by process
+        """
+        if msg_type == ADD:
+            return self._process_add(_SIDES[side], quantity, price, _ORDER_TYPES[order_type])
+        elif msg_type == DELETE:
+            return self._process_delete(order_id)
+        else:  # msg_type == MODIFY
+            return self._process_modify(order_id, quantity)
+
+    def _process_add(self, side: OrderSide, quantity: int, price: int, order_type: OrderType = OrderType.LIMIT):
+        """
+        :return: id of the order if it rests in the LOB, else None: fully filled, of an order type which never rests,
+            or rejected
+        """
+        # The columns of the OrderStore and the fills are int64: checked before any id or slot is used
+        if not MIN_VALUE <= quantity <= MAX_VALUE:
+            return None
+        if order_type == OrderType.MARKET:
+            # A market order crosses every price level
+            price = math.inf if side == OrderSide.BUY else -math.inf
+        # The ladder has no slot for a price outside the boundaries or the ticks
+        elif not MIN_VALUE <= price <= MAX_VALUE or (self._is_dense_ladder and not self._is_valid_price(price)):
+            return None
+
+        # The id is assigned on arrival, so that the fills of an incoming order refer to it as the taker
+        order_id = self._order_ids.next()
+        if order_type != OrderType.LIMIT:
+            return self._process_immediate(side, quantity, price, order_id, order_type == OrderType.FOK)
+
+        self._version += 1
+        if side == OrderSide.BUY:
+            if price < self._low_ask:
+                return self._bid_new_order_add(quantity, price, order_id)
+            else:  # price >= self._limit_order_book.low_ask
+                return self._ask_match(quantity, price, order_id)
+        else:  # side == OrderSide.SELL
+            if price > self._high_bid:
+                return self._ask_new_order_add(quantity, price, order_id)
+            else:  # price <= self._limit_order_book.high_bid
+                return self._bid_match(quantity, price, order_id)
+
+    def _process_immediate(self, side: OrderSide, quantity: int, price: int, order_id: int, is_fok: bool) -> None:
+        """
+        Match an order which never rests: its residual is dropped instead of being added to the LOB.
+        :param is_fok: the order is only matched if the levels it crosses hold its whole quantity, else killed
+        :return: None, as nothing rests
+        """
+        # TODO - Complexity: An order which does not cross the spread is cancelled in O(1), without touching the LOB.
+        #  The FOK check is in O(k), k being the number of levels needed to fill it, read from their total quantity.
+        if side == OrderSide.BUY:
+            if price < self._low_ask:
+                return None
+            if is_fok and not self._is_fillable(side, quantity, price, self._orders_by_asks):
+                return None
+            self._version += 1
+            self._ask_match(quantity, price, order_id, rests=False)
+        else:  # side == OrderSide.SELL
+            if price > self._high_bid:
+                return None
+            if is_fok and not self._is_fillable(side, quantity, price, self._orders_by_bids):
+                return None
+            self._version += 1
+            self._bid_match(quantity, price, order_id, rests=False)
+        return None
+
+    def _is_fillable(self, side: OrderSide, quantity: int, price: int, orderbook_side) -> bool:
+        """
+        Read only: the levels are visited best price first and the book is left untouched.
+        :return: True if the levels of orderbook_side matchable at price hold at least quantity
+        """
+        for level_price in orderbook_side.irange():
+            if self._has_price_crossed(target_price=price, price_level=level_price, side=side):
+                return False
+            quantity -= orderbook_side[level_price].quantity
+            if quantity <= 0:
+                return True
+        return False
+
+    def _process_delete(self, order_id: int):
+        # TODO - Complexity: In O(1)
+        if order_id not in self._order_by_ids:
+            return None
+        # TODO - Complexity: In O(1)
+        handle = self._order_by_ids.pop(order_id)
+        self._version += 1
+
+        if self._orders.side[handle] == BUY:
+            self._bid_delete(handle)
+        else:  # side == SELL
+            self._ask_delete(handle)
+
+        self._orders.free(handle)
+        return order_id
+
+    def _process_modify(self, order_id: int, quantity: int):
+        if order_id not in self._order_by_ids or not MIN_VALUE <= quantity <= MAX_VALUE:
+            return None
+
+        handle = self._order_by_ids[order_id]
+        orders = self._orders
+        self._version += 1
+
+        # If the new quantity == 0 we simply delete the order
+        if quantity == 0:
+            if orders.side[handle] == BUY:
+                self._bid_delete(handle)
+            else:  # side == SELL
+                self._ask_delete(handle)
+
+            del self._order_by_ids[order_id]
+            orders.free(handle)
+
+            return order_id
+
+        price = orders.price[handle]
+        if orders.side[handle] == BUY:
+            price_level = self._orders_by_bids[price]
+            self._bid_cum_decaying_quantity.touch(price)
+        else:  # side == SELL
+            price_level = self._orders_by_asks[price]
+            self._ask_cum_decaying_quantity.touch(price)
+
+        # If the new quantity is greater than the previous order quantity we place the order at the end of the queue
+        # TODO - Complexity: In O(1), the order is unlinked from its queue and appended back to it
+        if orders.quantity[handle] < quantity:
+            price_level.remove(handle)
+            orders.quantity[handle] = quantity
+            price_level.append(handle)
+        else:
+            price_level.set_quantity(handle, quantity)
+
+        if self._market_data is not None:
+            self._market_data.update(self._instrument, orders.side[handle], price, price_level.quantity)
+        return order_id
+
+    @property
+    def order_ids(self) -> OrderIdAllocator:
+        """
+        :return: allocator of the order ids, which also converts them from and to their text form
+        """
+        return self._order_ids
+
+    @order_ids.setter
+    def order_ids(self, value: OrderIdAllocator):
+        """
+        :param value: allocator resumed from a journal, see journal.replay_journal
+        """
+        self._order_ids = value
+
+    @property
+    def version(self) -> int:
+        """
+        :return: number of messages which changed the LOB
+        """
+        return self._version
+
+    @property
+    def instrument(self) -> int:
+        return self._instrument
+
+    @property
+    def market_data(self) -> Optional[MarketDataPublisher]:
+        return self._market_data
+
+    @market_data.setter
+    def market_data(self, value: Optional[MarketDataPublisher]):
+        self._market_data = value
+
+    @property
+    def fills(self) -> FillReport:
+        """
+        :return: ring buffer of the fills of the matching engine, to be drained by the consumers
+        """
+        return self._fills
+
+    @property
+    def last_trade_prices(self) -> Tuple[int, int]:
+        """
+        Kept by the matching itself, so they do not depend on the fills still being in the ring buffer.
+        :return: price of the first and of the last fill of the last message which traded, its best and worst prices
+        """
+        return self._first_trade_price, self._last_trade_price
+
+    def get_order(self, order_id: int) -> Optional[Order]:
+        """
+        :param order_id:
+        :return: view on the order if it stands in the LOB
+        """
+        handle = self._order_by_ids.get(order_id)
+        return None if handle is None else Order(self._orders, handle)
+
+    def _ask_new_order_add(self, quantity: int, price: int, order_id: int) -> int:
+        handle = self._orders.allocate(order_id, SELL, quantity, price)
+        self._ask_order_add(handle, price)
+
+        self._order_by_ids[order_id] = handle
+        if price < self._low_ask:
+            self._low_ask = price
+        return order_id
+
+    def _bid_new_order_add(self, quantity: int, price: int, order_id: int) -> int:
+        handle = self._orders.allocate(order_id, BUY, quantity, price)
+        self._bid_order_add(handle, price)
+
+        self._order_by_ids[order_id] = handle
+        if price > self._high_bid:
+            self._high_bid = price
+        return order_id
+
+    def _ask_order_add(self, handle: int, price: int):
+        price_level = self._orders_by_asks.get(price)
+        if price_level is None:
+            price_level = self._orders_by_asks[price] = PriceLevel(self._orders)
+        price_level.append(handle)
+        self._ask_cum_decaying_quantity.touch(price)
+        if self._market_data is not None:
+            self._market_data.update(self._instrument, SELL, price, price_level.quantity)
+
+    def _bid_order_add(self, handle: int, price: int):
+        price_level = self._orders_by_bids.get(price)
+        if price_level is None:
+            price_level = self._orders_by_bids[price] = PriceLevel(self._orders)
+        price_level.append(handle)
+        self._bid_cum_decaying_quantity.touch(price)
+        if self._market_data is not None:
+            self._market_data.update(self._instrument, BUY, price, price_level.quantity)
+
+    def _ask_match(self, quantity: int, price: int, order_id: int, rests: bool = True) -> Optional[int]:
+        """
+        :param rests: the residual quantity of the incoming order is added to the LOB, else dropped
+        """
+        self._low_ask, new_order_id = self._match(
+            OrderSide.BUY, quantity, price, order_id, self._orders_by_asks, self._bid_new_order_add if rests else None,
+            self._ask_cum_decaying_quantity,
+        )
+        # The fills and partial fills are kept track of by self._fills
+        return new_order_id
+
+    def _bid_match(self, quantity: int, price: int, order_id: int, rests: bool = True) -> Optional[int]:
+        """
+        :param rests: the residual quantity of the incoming order is added to the LOB, else dropped
+        """
+        self._high_bid, new_order_id = self._match(
+            OrderSide.SELL, quantity, price, order_id, self._orders_by_bids, self._ask_new_order_add if rests else None,
+            self._bid_cum_decaying_quantity,
+        )
+        # The fills and partial fills are kept track of by self._fills
+        return new_order_id
+
+    def _has_price_crossed(self, target_price, price_level, side) -> bool:
+        """
+        Check if an incoming message price is more attractive than a price level given a side.
+        :param target_price:
+        :param price_level:
+        :param side:
+        :return: True if the price is unattractive.
+        """
+        # If it's a BUY the price level is not attractive if it is above the target price -> True
+        # If it's a SELL the price level is not attractive if it is below the target price -> True
+
+        if side == OrderSide.BUY:
+            return target_price < price_level
+        else:  # side == OrderSide.SELL
+            return target_price > price_level
+
+    def _match(
+            self, side: OrderSide, quantity: int, price: int, order_id: int, orderbook_side, add_method,
+            cum_decaying_quantity,
+    ) -> Tuple[int, int]:
+        """
+        Matching Engine.
+        Returns the updated top of the book as an int and the new order id as int if
+        it is a partial fill of the incoming message.
+        Each fill is recorded in the FillReport, with order_id as the taker.
+
+        """
+        # TODO - Complexity: The engine runs through all the orders of one side of the book so the algo
+        #   complexity is in O(m) m being the total number of orders in the book, = O(k n) with k price levels and
+        #   n orders per price level.
+
+        residual_quantity, last_visited_price_level = self._consume_quantity_or_order_book(
+            quantity=quantity, target_price=price, side=side, orderbook_side=orderbook_side, taker_order_id=order_id,
+        )
+        # The visited levels are consumed from the top of the book down to the last one
+        if last_visited_price_level is not None:
+            cum_decaying_quantity.touch(last_visited_price_level)
+
+        return self._manage_partial_fill(residual_quantity, side, orderbook_side, add_method, price, order_id)
+
+    def _consume_quantity_or_order_book(
+            self, quantity, target_price, side, orderbook_side, taker_order_id,
+    ) -> Tuple[int, int]:
+        """
+        The book is consumed in place: the filled orders are removed from their queue and the LOB as they go,
+        as well as the emptied price levels. The last order visited, if partially filled, keeps its priority.
+        :param quantity:
+        :param target_price:
+        :param side:
+        :param orderbook_side:
+        :param taker_order_id: id of the incoming order, reported in its fills
+        :return: residual quantity of the incoming order, last_visited_price_level
+        """
+        orders = self._orders
+        order_quantities = orders.quantity
+        order_ids = orders.order_id
+        order_nexts = orders.next
+        order_by_ids = self._order_by_ids
+        record_fill = self._fills.record
+        instrument = self._instrument
+        market_data = self._market_data
+        maker_side = SELL if side == OrderSide.BUY else BUY
+
+        last_visited_price_level = None
+
+        # Run through the different existing price levels of the given side of the LOB, best price first
+        # TODO - Complexity: Each fully consumed price level is deleted in O(log(n)), with n being the number of
+        #   price levels, each filled order in O(1).
+        while quantity and orderbook_side:
+            price_level, order_queue = orderbook_side.peekitem(0)
+            # If the price level becomes not matchable (i.e. worse of than the one in the message)
+            if self._has_price_crossed(target_price=target_price, price_level=price_level, side=side):
+                break
+            if last_visited_price_level is None:
+                self._first_trade_price = price_level
+            last_visited_price_level = price_level
+
+            # The whole level is consumed: its orders are removed at once
+            if quantity >= order_queue.quantity:
+                quantity -= order_queue.quantity
+                # The queue is walked by its links, so that no list of the orders is built
+                handle = order_queue.head
+                while handle != NIL:
+                    maker_order_id = order_ids[handle]
+                    del order_by_ids[maker_order_id]
+                    record_fill(instrument, maker_order_id, taker_order_id, price_level, order_quantities[handle])
+                    handle = order_nexts[handle]
+                order_queue.release()
+                del orderbook_side[price_level]
+                if market_data is not None:
+                    market_data.update(instrument, maker_side, price_level, 0)
+                continue
+
+            # Until we consume the incoming order quantity, within the level
+            while True:
+                handle = order_queue.head
+                standing_quantity = order_quantities[handle]
+
+                #  The incoming order quantity is exhausted by a partial fill of the standing order
+                if quantity < standing_quantity:
+                    record_fill(instrument, order_ids[handle], taker_order_id, price_level, quantity)
+                    order_queue.set_quantity(handle, standing_quantity - quantity)
+                    quantity = 0
+                    break
+
+                quantity -= standing_quantity
+                order_queue.popleft()
+                maker_order_id = order_ids[handle]
+                del order_by_ids[maker_order_id]
+                record_fill(instrument, maker_order_id, taker_order_id, price_level, standing_quantity)
+                orders.free(handle)
+                if not quantity:
+                    break
+            # The level was only partially consumed
+            if market_data is not None:
+                market_data.update(instrument, maker_side, price_level, order_queue.quantity)
+
+        if last_visited_price_level is not None:
+            self._last_trade_price = last_visited_price_level
+        return quantity, last_visited_price_level
+
+    def _manage_partial_fill(
+            self, residual_quantity, side, orderbook_side, add_method, price, order_id,
+    ) -> Tuple[int, int]:
+        """
+        :param add_method: adds the residual quantity to the other side of the LOB, None to drop it
+        :return: the new top of the book of the consumed side, and the order id of the residual quantity of the
+            incoming order, added to the other side of the LOB, if any.
+        """
+        if orderbook_side:
+            top_of_book = orderbook_side.peekitem(0)[0]
+        else:
+            top_of_book = self._get_reset_top_of_book(side=side)
+
+        new_order_id = None
+        if residual_quantity and add_method is not None:  # quantity > 0, partial matching of incoming message because order book empty or crossed price
+            new_order_id = add_method(residual_quantity, price, order_id)
+
+        return top_of_book, new_order_id
+
+    def _bid_delete(self, handle: int):
+        """
+        Unlink an order from its queue, its slot in the OrderStore is left to the caller.
+        :param handle:
+        :return:
+        """
+        # TODO - Complexity: Unlinking the order from its queue is in O(1).
+        #  Dropping the emptied price level is in O(log(n)).
+        price = self._orders.price[handle]
+        price_level = self._orders_by_bids[price]
+        price_level.remove(handle)
+        self._bid_cum_decaying_quantity.touch(price)
+        if self._market_data is not None:
+            self._market_data.update(self._instrument, BUY, price, price_level.quantity)
+        if not price_level:
+            del self._orders_by_bids[price]
+            if price == self._high_bid:
+                self._high_bid = self._orders_by_bids.peekitem(0)[0] if self._orders_by_bids else self._min_price
+
+    def _ask_delete(self, handle: int):
+        """
+        Unlink an order from its queue, its slot in the OrderStore is left to the caller.
+        :param handle:
+        :return:
+        """
+        # TODO - Complexity: Unlinking the order from its queue is in O(1).
+        #  Dropping the emptied price level is in O(log(n)).
+        price = self._orders.price[handle]
+        price_level = self._orders_by_asks[price]
+        price_level.remove(handle)
+        self._ask_cum_decaying_quantity.touch(price)
+        if self._market_data is not None:
+            self._market_data.update(self._instrument, SELL, price, price_level.quantity)
+        if not price_level:
+            del self._orders_by_asks[price]
+            if price == self._low_ask:
+                self._low_ask = self._orders_by_asks.peekitem(0)[0] if self._orders_by_asks else self._max_price
+
+    def _is_valid_price(self, price: int) -> bool:
+        return self._min_price <= price <= self._max_price and not price % self._price_increment
+
+    def _get_reset_top_of_book(self, side) -> int:
+        """
+        Send a reseting value of top of the book ie either high bid or low ask according to the incoming message side.
+
+        The incoming msg is a BUY, hence it consumed the ask side
+        or, it is a SELL and it consumed the bid side.
+
+        :param side: Enum
+        :return: self._min_price or self._max_price
+        """
+
+        if side == OrderSide.BUY:
+            return self._max_price
+        else:  # msg_side == OrderSide.SELL
+            return self._min_price
+
+    def to_str(self) -> str:
+        """
+        String representation of the LOB. The orders are each level are not shown whereas they are managed internally.
+        :return: Some LOB representation.
+        """
+        ret = ''
+        if not self._orders_by_asks:
+            ret += '\n ---------- Empty Asks ---------- \n'
+        else:
+            ret_prices = []
+            ret_quantitys = []
+
+            step = self._low_ask
+            for _ in range(10):
+                ret_prices.append(step)
+                price_level = self._orders_by_asks.get(step)
+                ret_quantitys.append(price_level.quantity if price_level is not None else 0)
+                step += self._price_increment
+
+            ret += f'Ask quantitys : {ret_quantitys} \n'
+            ret += f'Ask Prices : {ret_prices} \n'
+
+        if not self._orders_by_bids:
+            ret += '\n ---------- Empty Bids ---------- \n'
+        else:
+            ret_prices = []
+            ret_quantitys = []
+
+            step = self._high_bid
+            for _ in range(10):
+                ret_prices.append(step)
+                price_level = self._orders_by_bids.get(step)
+                ret_quantitys.append(price_level.quantity if price_level is not None else 0)
+                step -= self._price_increment
+
+            ret += f'Bid quantitys : {ret_quantitys} \n'
+            ret += f'Bid Prices : {ret_prices} \n'
+
+        return ret
+
+    def send_result(self, msg, ret) -> str:
+        """
+        String representation of the result of an incoming message
+        :param msg:
+        :param ret:
+        :return:
+        """
+        # TODO - JE: More verbose
+        if ret is not None:
+            ret = self._order_ids.encode(ret)
+        if isinstance(msg, AddMessage):
+            return f'Message Added {ret}'
+        if isinstance(msg, DeleteMessage):
+            return f'Message Deleted {ret}'
+        if isinstance(msg, ModifyMessage):
+            return f'Message Modified {ret}'
+
+    def equilibrium_mid(self, half_time_ticks: float) -> float:
+        """
+        Needs low_ask and high_bid => mid != 0
+        The cumulative decaying quantities are cached and only recomputed from the deepest price level changed since
+        the last call: an unchanged book is answered in O(1).
+        :param half_time_ticks: > 0
+        :return: equilibrium mid within spread
+        """
+        mid = (self._low_ask + self._high_bid) / 2.
+        scale = half_time_ticks * mid
+
+        bid_cum_q = self._bid_cum_decaying_quantity.value(self._orders_by_bids, self._high_bid, scale)
+        ask_cum_q = self._ask_cum_decaying_quantity.value(self._orders_by_asks, self._low_ask, scale)
+        return solve_equilibrium_mid(self._high_bid, self._low_ask, scale, bid_cum_q, ask_cum_q)
+
+    def equilibrium_mid_vectorized(self, half_time_ticks: float) -> float:
+        """
+        Same EP as equilibrium_mid, computed from scratch over NumPy snapshots of both sides of the LOB.
+        :param half_time_ticks: > 0
+        :return: equilibrium mid within spread
+        """
+        mid = (self._low_ask + self._high_bid) / 2.
+        scale = half_time_ticks * mid
+
+        bid_cum_q = cum_decaying_quantity_vectorized(*self.level_arrays(OrderSide.BUY), self._high_bid, scale)
+        ask_cum_q = cum_decaying_quantity_vectorized(*self.level_arrays(OrderSide.SELL), self._low_ask, scale)
+        return solve_equilibrium_mid(self._high_bid, self._low_ask, scale, bid_cum_q, ask_cum_q)
+
+    def depth(self, side: OrderSide, n: int = 10) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        The arrays are cached until the next message changing the LOB: a repeated query is answered in O(1).
+        :param side:
+        :param n: number of levels
+        :return: prices and total quantities of the n best non-empty price levels of a side, from the best price,
+            as read-only arrays.
+        """
+        # TODO - Complexity: In O(1) if cached, else in O(n) for the SortedDict, and for the PriceLadder whose bitmap
+        #  skips the empty ticks between the n best levels.
+        cached = self._depth_cache[side.value]
+        if cached is not None:
+            version, cached_n, prices, quantities = cached
+            # The cached arrays also answer a smaller n, or any n if they hold the whole side
+            if version == self._version and (n <= cached_n or len(prices) < cached_n):
+                return prices[:n], quantities[:n]
+
+        import numpy as np
+
+        orderbook_side = self._orders_by_bids if side == OrderSide.BUY else self._orders_by_asks
+        prices = list(islice(orderbook_side.irange(), n))
+        quantities = np.array([orderbook_side[price].quantity for price in prices], dtype=np.int64)
+        prices = np.array(prices, dtype=np.int64)
+        prices.flags.writeable = quantities.flags.writeable = False
+        self._depth_cache[side.value] = (self._version, n, prices, quantities)
+        return prices, quantities
+
+    def level_arrays(self, side: OrderSide) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        :param side:
+        :return: prices and total quantities of the price levels of a side, from the best price to the worst.
+        """
+        return level_arrays(self._orders_by_bids if side == OrderSide.BUY else self._orders_by_asks)
+
+    def _cum_decaying_quantity(self, half_time_ticks: float, orderbook_side, mid: float, top_of_book: int) -> float:
+        """
+        Computed from scratch, without the cache used by equilibrium_mid: kept as a reference.
+        :param half_time_ticks:
+        :param orderbook_side:
+        :param mid:
+        :param top_of_book:
+        :return:
+        """
+        cum_sum = 0
+        # TODO - Complexity: In O(n) thanks to the total quantity maintained on each price level
+        for price_level, order_queue in reversed(orderbook_side.items()):
+            cum_sum += order_queue.quantity
+            cum_sum *= 2 ** (-abs(price_level - top_of_book) / (half_time_ticks * mid))
+
+        return cum_sum
+
+    def cum_decaying_bid_quantity(self, half_time_ticks: float, mid: float) -> float:
+        return self._cum_decaying_quantity(half_time_ticks, self._orders_by_bids, mid, self._high_bid)
+    
+    def cum_decaying_ask_quantity(self, half_time_ticks, mid: float) -> float:
+        return self._cum_decaying_quantity(half_time_ticks, self._orders_by_asks, mid, self._low_ask)
+
@@ -1,166 +1,413 @@
-import numpy as np
-from typing import Optional
-
-from limit_order_book import LimitOrderBook
-from message import Message, AddMessage, DeleteMessage, ModifyMessage
-
-class Borg:
-    """
-       Abstract class which assists the implementation of singletons. See Alex Martelli's explanation.
-       https://www.oreilly.com/library/view/python-cookbook/0596001673/ch05s23.html
-    """
-    _shared_state = {}
-
-    def __init__(self):
-        self.__dict__ = self._shared_state
-
-    @property
-    def already_initialised(self):
-        return bool(self._shared_state)
-
-
-class Market(Borg):
-    """
-    Market is a class which decodes strings into the correct Message object.
-    During the encoding process sanity checks are performed.
-    Singleton i.e. one instance per runtime.
-    Decode messages.
-
-    TODO - JE: decimal package to be more generic instead of using ints.
-    TODO - JE: Maybe the sanity checks can be improved here.
-    """
-
-    __MESSAGE_FACTORY = {
-        'A': AddMessage,
-        'D': DeleteMessage,
-        'M': ModifyMessage,
-    }
-
-    def __init__(
-            self,
-            interactive,
-            price_increment: int = 1,
-            quantity_increment: int = 1,
-            min_price: int = None,
-            max_price: int = None,
-            min_quantity: int = None,
-            max_quantity: int = None,
-            run_sanity_checks: bool = False,
-            is_random_order_id: bool = False,
-    ):
-
-        # For singleton design pattern
-        Borg.__init__(self)
-
-        if not self.already_initialised:
-
-            self._price_increment: int = price_increment
-            self._quantity_increment: int = quantity_increment
-            self._min_price: int = min_price if min_price else 0
-            self._max_price: int = max_price if max_price else np.inf
-            self._min_quantity: int = min_quantity if min_quantity else 0
-            self._max_quantity: int = max_quantity if max_quantity else np.inf
-            self._run_sanity_checks: bool = run_sanity_checks
-
-            self._limit_order_book: LimitOrderBook = LimitOrderBook(
-                price_increment=self._price_increment,
-                quantity_increment=self._quantity_increment,
-                min_price=self._min_price,
-                max_price=self._max_price,
-                order_id_count=1 if not is_random_order_id else None,
-            )
-
-        self._interactive = interactive
-
-        if self._interactive:
-            print(self._limit_order_book.to_str())
-
-    def decode(self, msg_str: str) -> Optional[Message]:
-        msg_chars = msg_str.split('-')
-        if msg_chars[0] not in self.__MESSAGE_FACTORY:
-            if self._interactive:
-                print(f'Message Type not in {self.__MESSAGE_FACTORY.keys()}')
-            return
-
-        message = self.__MESSAGE_FACTORY[msg_chars[0]](msg_chars)
-
-        if self._run_sanity_checks:
-            return self._sanity_checks(message)
-
-        return message
-
-    def _sanity_checks_add_message(self, msg: AddMessage) -> Optional[AddMessage]:
-        if not msg or not msg.is_init:
-            return
-
-        if self._min_price > msg.price or self._max_price < msg.price:
-            if self._interactive:
-                print(f'Message has a price {msg.price} outside boundaries ({self._min_price} ; {self._max_price})')
-            return
-
-        if msg.price % self._price_increment:
-            if self._interactive:
-                print(
-                    f'Message has a price {msg.price} outside the ticks. Should be an increment of {self._price_increment}'
-                )
-            return
-
-        if self._min_quantity > msg.quantity or self._max_quantity < msg.quantity:
-            if self._interactive:
-                print(f'Message has an quantity {msg.quantity} outside boundaries [{self._min_quantity} ; {self._max_quantity}]')
-            return
-
-        if msg.quantity % self._quantity_increment:
-            if self._interactive:
-                print(
-                    f'Message has an quantity {msg.quantity} outside the ticks. '
-                    f'Should be an increment of {self._quantity_increment}'
-                )
-            return
-
-        return msg
-
-    def _sanity_checks_delete_message(self, msg: DeleteMessage) -> Optional[DeleteMessage]:
-        if not msg or not msg.is_init:
-            return
-        return msg
-
-    def _sanity_checks_modify_message(self, msg: ModifyMessage) -> Optional[ModifyMessage]:
-        if not msg or not msg.is_init:
-            return
-
-        if self._min_quantity > msg.quantity or self._max_quantity < msg.quantity:
-            if self._interactive:
-                print(f'Message has an quantity {msg.quantity} outside boundaries [{self._min_quantity} ; {self._max_quantity}]')
-            return
-
-        if msg.quantity % self._quantity_increment:
-            if self._interactive:
-                print(
-                    f'Message has an quantity {msg.quantity} outside the ticks. '
-                    f'Should be an increment of {self._quantity_increment}'
-                )
-            return
-
-        return msg
-
-    def _sanity_checks(self, msg: Message):
-        if isinstance(msg, AddMessage):
-            self._sanity_checks_add_message(msg)
-        elif isinstance(msg, DeleteMessage):
-            self._sanity_checks_delete_message(msg)
-        elif isinstance(msg, ModifyMessage):
-            self._sanity_checks_modify_message(msg)
-
-    def execute(self, msg: Message):
-        if self._interactive:
-            print(msg.encode())
-        ret = self._limit_order_book.process(msg)
-        if self._interactive:
-            print(self._limit_order_book.send_result(msg, ret))
-            print(self._limit_order_book.to_str())
-
-    def get_lob_eq_mid(self):
-        if not self._limit_order_book._order_ids_by_asks or not self._limit_order_book._order_ids_by_bids:
-            return "One side of the LOB is empty - Can't compute mid"
-        return self._limit_order_book.equilibrium_mid(self._limit_order_book._price_increment / 5.)
+from __future__ import annotations
+
+import math
+from typing import TYPE_CHECKING, Dict, List, Optional, Sequence, Tuple
+
+import binary_message
+from fill_report import FillReport
+from limit_order_book import LimitOrderBook
+from message import DEFAULT_SYMBOL, Message, AddMessage, DeleteMessage, ModifyMessage, split_symbol
+from order_side import OrderSide
+from order_type import OrderType
+
+# Importing the market only needs the standard library and sortedcontainers: NumPy, and the modules based on it,
+# are imported on the first batch, snapshot or journal
+if TYPE_CHECKING:
+    import numpy as np
+
+    from instrumentation import Instrumentation
+    from journal import Journal
+    from market_data import MarketDataPublisher
+    from message_batch import MessageBatch
+
+
+class Market:
+    """
+    Market is a class which decodes strings into the correct Message object.
+    During the encoding process sanity checks are performed.
+    Registry of the instruments: one LOB per instrument, all sharing the parametrization of the market and
+    one FillReport. The instruments are numbered in their order of registration, so that a message is routed to its
+    LOB by a list lookup in O(1).
+    Decode messages.
+
+    TODO - JE: decimal package to be more generic instead of using ints.
+    TODO - JE: Maybe the sanity checks can be improved here.
+    """
+
+    __MESSAGE_FACTORY = {
+        'A': AddMessage,
+        'D': DeleteMessage,
+        'M': ModifyMessage,
+    }
+
+    __SIDES = (OrderSide.BUY, OrderSide.SELL)  # Indexed by OrderSide value
+    __ORDER_TYPES = tuple(OrderType)  # Indexed by OrderType value
+
+    def __init__(
+            self,
+            interactive,
+            price_increment: int = 1,
+            quantity_increment: int = 1,
+            min_price: int = None,
+            max_price: int = None,
+            min_quantity: int = None,
+            max_quantity: int = None,
+            run_sanity_checks: bool = False,
+            is_random_order_id: bool = False,
+            symbols: Sequence[str] = (),
+            fill_capacity: int = 1 << 16,
+            instrumentation: Optional[Instrumentation] = None,
+            journal: Optional[Journal] = None,
+            market_data: Optional[MarketDataPublisher] = None,
+    ):
+        """
+        :param symbols: symbols of the instruments, numbered from 1. The default instrument, of symbol DEFAULT_SYMBOL
+            i.e. the messages without symbol, is always registered as instrument 0.
+        :param instrumentation: records the latency of every message if given, see instrumentation
+        :param journal: appends the accepted messages if given, see journal
+        :param market_data: publishes the L2 deltas of the LOBs if given, see market_data
+        """
+        self._price_increment: int = price_increment
+        self._quantity_increment: int = quantity_increment
+        self._min_price: int = min_price if min_price else 0
+        self._max_price: int = max_price if max_price else math.inf
+        self._min_quantity: int = min_quantity if min_quantity else 0
+        self._max_quantity: int = max_quantity if max_quantity else math.inf
+        self._run_sanity_checks: bool = run_sanity_checks
+        self._is_random_order_id: bool = is_random_order_id
+
+        # TODO - Complexity: Hash Table of the instrument ids by symbol, and list of the LOBs indexed by instrument id
+        self._instruments: Dict[str, int] = {}
+        self._limit_order_books: List[LimitOrderBook] = []
+        self._fills: FillReport = FillReport(fill_capacity)
+        self._market_data: Optional[MarketDataPublisher] = market_data
+        self.add_instrument(DEFAULT_SYMBOL)
+        for symbol in symbols:
+            self.add_instrument(symbol)
+
+        self._interactive = interactive
+        self._instrumentation: Optional[Instrumentation] = instrumentation
+        self._journal: Optional[Journal] = journal
+
+    def add_instrument(self, symbol: str) -> int:
+        """
+        Register an instrument, with an empty LOB. Registering a symbol twice returns its existing instrument id.
+        :param symbol:
+        :return: instrument id
+        """
+        if symbol in self._instruments:
+            return self._instruments[symbol]
+        instrument = len(self._limit_order_books)
+        self._instruments[symbol] = instrument
+        self._limit_order_books.append(LimitOrderBook(
+            price_increment=self._price_increment,
+            quantity_increment=self._quantity_increment,
+            min_price=self._min_price,
+            max_price=self._max_price,
+            order_id_count=1 if not self._is_random_order_id else None,
+            instrument=instrument,
+            fills=self._fills,
+            market_data=self._market_data,
+        ))
+        return instrument
+
+    @property
+    def instruments(self) -> Dict[str, int]:
+        """
+        :return: instrument id by symbol
+        """
+        return self._instruments
+
+    @property
+    def interactive(self) -> bool:
+        return self._interactive
+
+    @interactive.setter
+    def interactive(self, value: bool):
+        self._interactive = value
+
+    @property
+    def instrumentation(self) -> Optional[Instrumentation]:
+        return self._instrumentation
+
+    @property
+    def journal(self) -> Optional[Journal]:
+        return self._journal
+
+    @journal.setter
+    def journal(self, value: Optional[Journal]):
+        self._journal = value
+
+    @property
+    def market_data(self) -> Optional[MarketDataPublisher]:
+        return self._market_data
+
+    def get_limit_order_book(self, instrument: int = 0) -> LimitOrderBook:
+        return self._limit_order_books[instrument]
+
+    def save_snapshot(self, path: str):
+        """
+        Write the LOBs of all the instruments in a binary snapshot, see snapshot
+        """
+        from snapshot import save_snapshot
+
+        symbols = sorted(self._instruments, key=self._instruments.get)
+        journal_sequence = 0
+        if self._journal is not None:
+            self._journal.commit()
+            journal_sequence = self._journal.sequence
+        save_snapshot(path, list(zip(symbols, self._limit_order_books)), journal_sequence)
+
+    def load_snapshot(self, path: str) -> int:
+        """
+        Replace the LOBs by those of a snapshot, registering the instruments of the snapshot which are not yet.
+        The restored LOBs report their fills to the FillReport of the market, and their L2 deltas to its publisher,
+        which is given every level of the restored LOBs.
+        :return: sequence number of the journal from which to replay, see journal.replay_journal
+        """
+        from snapshot import load_snapshot
+
+        books, journal_sequence = load_snapshot(path, self._fills, self.add_instrument)
+        for symbol, limit_order_book in books:
+            self._limit_order_books[self._instruments[symbol]] = limit_order_book
+            if self._market_data is not None:
+                limit_order_book.market_data = self._market_data
+                self._market_data.publish_book(limit_order_book)
+        return journal_sequence
+
+    def decode(self, msg_str: str) -> Optional[Message]:
+        # A line read from a file keeps its newline: stripped once, as by the batch decoder, before the fields are split
+        symbol, msg_str = split_symbol(msg_str.strip())
+        instrument = self._instruments.get(symbol)
+        if instrument is None:
+            if self._interactive:
+                print(f'Instrument {symbol} not in {list(self._instruments)}')
+            return
+
+        msg_chars = msg_str.split('-')
+        if msg_chars[0] not in self.__MESSAGE_FACTORY:
+            if self._interactive:
+                print(f'Message Type not in {self.__MESSAGE_FACTORY.keys()}')
+            return
+
+        message = self.__MESSAGE_FACTORY[msg_chars[0]](msg_chars, self._limit_order_books[instrument].order_ids)
+        message.instrument = instrument
+
+        if self._run_sanity_checks:
+            return self._sanity_checks(message)
+
+        return message
+
+    def decode_record(self, record: Tuple[int, int, int, int, int, int, int]) -> Optional[Message]:
+        """
+        Decode an unpacked binary record, see binary_message.
+        :param record: (msg type, side, order type, instrument, quantity, price, order id)
+        :return:
+        """
+        msg_type, side, order_type, instrument, quantity, price, order_id = record
+        if instrument >= len(self._limit_order_books):
+            return
+        order_ids = self._limit_order_books[instrument].order_ids
+        if msg_type == binary_message.ADD:
+            if side > OrderSide.SELL.value or order_type >= len(self.__ORDER_TYPES):
+                return
+            message = AddMessage.from_fields(self.__SIDES[side], quantity, price, self.__ORDER_TYPES[order_type])
+        elif msg_type == binary_message.DELETE:
+            message = DeleteMessage.from_fields(order_id, order_ids)
+        elif msg_type == binary_message.MODIFY:
+            message = ModifyMessage.from_fields(order_id, quantity, order_ids)
+        else:
+            if self._interactive:
+                print(f'Message Type not in {self.__MESSAGE_FACTORY.keys()}')
+            return
+        message.instrument = instrument
+
+        if self._run_sanity_checks:
+            return self._sanity_checks(message)
+
+        return message
+
+    def decode_many(self, buffer) -> MessageBatch:
+        """
+        Decode a whole chunk of a fleet file into a columnar batch. The sanity checks run vectorized on the batch and
+        the messages failing them are dropped.
+        :param buffer: either a str of text messages, one per line, or binary records (see binary_message)
+        :return:
+        """
+        from message_batch import MessageBatch
+
+        if isinstance(buffer, str):
+            # All the LOBs of the market decode the order ids alike
+            batch = MessageBatch.from_text(buffer, self._limit_order_books[0].order_ids, self._instruments)
+        else:
+            batch = MessageBatch.from_binary(buffer)
+
+        is_add = batch.msg_type == binary_message.ADD
+        is_modify = batch.msg_type == binary_message.MODIFY
+        is_valid_add = is_add & (batch.side <= OrderSide.SELL.value) & (batch.order_type < len(self.__ORDER_TYPES))
+        is_valid = is_valid_add | is_modify | (batch.msg_type == binary_message.DELETE)
+        is_valid &= batch.instrument < len(self._limit_order_books)
+
+        if self._run_sanity_checks:
+            is_valid_quantity = (
+                    (self._min_quantity <= batch.quantity) & (batch.quantity <= self._max_quantity)
+                    & (batch.quantity % self._quantity_increment == 0)
+            )
+            is_valid_price = (
+                    (self._min_price <= batch.price) & (batch.price <= self._max_price)
+                    & (batch.price % self._price_increment == 0)
+            )
+            # The price of a market order is not meaningful
+            is_valid_price |= batch.order_type == OrderType.MARKET.value
+            is_valid &= ~is_add | (is_valid_quantity & is_valid_price)
+            is_valid &= ~is_modify | is_valid_quantity
+
+        if is_valid.all():
+            return batch
+        if self._interactive:
+            print(f'{len(batch) - int(is_valid.sum())} messages rejected')
+        return batch.select(is_valid)
+
+    def _sanity_checks_add_message(self, msg: AddMessage) -> Optional[AddMessage]:
+        if not msg or not msg.is_init:
+            return
+
+        # The price of a market order is not meaningful
+        if msg.order_type != OrderType.MARKET:
+            if self._min_price > msg.price or self._max_price < msg.price:
+                if self._interactive:
+                    print(f'Message has a price {msg.price} outside boundaries ({self._min_price} ; {self._max_price})')
+                return
+
+            if msg.price % self._price_increment:
+                if self._interactive:
+                    print(
+                        f'Message has a price {msg.price} outside the ticks. '
+                        f'Should be an increment of {self._price_increment}'
+                    )
+                return
+
+        if self._min_quantity > msg.quantity or self._max_quantity < msg.quantity:
+            if self._interactive:
+                print(f'Message has an quantity {msg.quantity} outside boundaries [{self._min_quantity} ; {self._max_quantity}]')
+            return
+
+        if msg.quantity % self._quantity_increment:
+            if self._interactive:
+                print(
+                    f'Message has an quantity {msg.quantity} outside the ticks. '
+                    f'Should be an increment of {self._quantity_increment}'
+                )
+            return
+
+        return msg
+
+    def _sanity_checks_delete_message(self, msg: DeleteMessage) -> Optional[DeleteMessage]:
+        if not msg or not msg.is_init:
+            return
+        return msg
+
+    def _sanity_checks_modify_message(self, msg: ModifyMessage) -> Optional[ModifyMessage]:
+        if not msg or not msg.is_init:
+            return
+
+        if self._min_quantity > msg.quantity or self._max_quantity < msg.quantity:
+            if self._interactive:
+                print(f'Message has an quantity {msg.quantity} outside boundaries [{self._min_quantity} ; {self._max_quantity}]')
+            return
+
+        if msg.quantity % self._quantity_increment:
+            if self._interactive:
+                print(
+                    f'Message has an quantity {msg.quantity} outside the ticks. '
+                    f'Should be an increment of {self._quantity_increment}'
+                )
+            return
+
+        return msg
+
+    def _sanity_checks(self, msg: Message) -> Optional[Message]:
+        if isinstance(msg, AddMessage):
+            return self._sanity_checks_add_message(msg)
+        elif isinstance(msg, DeleteMessage):
+            return self._sanity_checks_delete_message(msg)
+        elif isinstance(msg, ModifyMessage):
+            return self._sanity_checks_modify_message(msg)
+
+    def execute(self, msg: Message) -> Optional[int]:
+        """
+        :param msg: decoded message
+        :return: result of the message, see LimitOrderBook.process
+        """
+        if self._interactive:
+            print(msg.encode())
+        # TODO - Complexity: Routing to the LOB of the instrument in O(1)
+        limit_order_book = self._limit_order_books[msg.instrument]
+        if self._journal is not None:
+            ret = self._journal.process(limit_order_book, msg, self._instrumentation)
+        elif self._instrumentation is None:
+            ret = limit_order_book.process(msg)
+        else:
+            ret = self._instrumentation.process(limit_order_book, msg)
+        if self._interactive:
+            print(limit_order_book.send_result(msg, ret))
+            order_ids = limit_order_book.order_ids
+            for fill in self.drain_fills().tolist():
+                _, _, _, maker_order_id, taker_order_id, price, quantity = fill
+                print(f'Fill {order_ids.encode(maker_order_id)} by {order_ids.encode(taker_order_id)}: {quantity}@{price}')
+            print(limit_order_book.to_str())
+        return ret
+
+    def execute_batch(self, batch: MessageBatch) -> List[Optional[int]]:
+        """
+        The messages of each instrument are processed by its LOB in arrival order.
+        :param batch: see decode_many
+        :return: the results of the messages, see LimitOrderBook.process_batch, grouped by instrument if the batch
+        holds several of them
+        """
+        import numpy as np
+
+        instruments = batch.instrument
+        if not len(batch) or (instruments == instruments[0]).all():
+            limit_order_book = self._limit_order_books[int(instruments[0]) if len(batch) else 0]
+            ret = self._process_batch(limit_order_book, batch)
+        else:
+            # TODO - Complexity: In O(b log(b)) to split the batch by instrument, with b the size of the batch
+            batch = batch.select(np.argsort(instruments, kind='stable'))
+            bounds = [0, *(np.flatnonzero(np.diff(batch.instrument)) + 1).tolist(), len(batch)]
+            ret = []
+            for start, stop in zip(bounds[:-1], bounds[1:]):
+                instrument = int(batch.instrument[start])
+                ret.extend(self._process_batch(
+                    self._limit_order_books[instrument], batch.select(slice(start, stop)),
+                ))
+        if self._interactive:
+            print(f'{len(ret)} messages processed')
+            for instrument in np.unique(instruments).tolist():
+                print(self._limit_order_books[instrument].to_str())
+        return ret
+
+    def _process_batch(self, limit_order_book: LimitOrderBook, batch: MessageBatch) -> List[Optional[int]]:
+        if self._journal is not None:
+            return self._journal.process_batch(limit_order_book, batch, self._instrumentation)
+        return limit_order_book.process_batch(batch, self._instrumentation)
+
+    @property
+    def fill_sequence(self) -> int:
+        """
+        :return: sequence number of the next fill, the fills of a message are numbered from the value before it
+        """
+        return self._fills.sequence
+
+    def drain_fills(self, max_fills: int = None) -> np.ndarray:
+        """
+        :param max_fills: at most this number of fills are drained, all of them if None
+        :return: the oldest fills not drained yet, see fill_report.FILL_DTYPE
+        """
+        return self._fills.drain(max_fills)
+
+    def get_lob_eq_mid(self, instrument: int = 0):
+        limit_order_book = self._limit_order_books[instrument]
+        if not limit_order_book._orders_by_asks or not limit_order_book._orders_by_bids:
+            return "One side of the LOB is empty - Can't compute mid"
+        return limit_order_book.equilibrium_mid(limit_order_book._price_increment / 5.)
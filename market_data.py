@@ -0,0 +1,180 @@
+"""
+Incremental L2 market data: the LOB reports the new total quantity of every price level it changes, so that the
+consumers maintain their own depth view from the deltas instead of rendering the whole book.
+
+Every delta is a packed record of 32 bytes, little-endian:
+| sequence: uint64 | instrument: uint32 | side: uint8 | padding: 3 bytes | price: int64 | quantity: int64 |
+
+The quantity is the new total quantity of the level, 0 when the level is emptied: a delta replaces the level, so that
+applying it twice is harmless. The sequence number counts the published deltas from 0.
+
+Conflation: given a conflation interval, the updates of a level are merged until the deltas are drained, and the
+deltas are only published once the interval passed since the last publication. A level changed many times within the
+window, e.g. by the orders of a sweep or by a flurry of adds and deletes, is then published once, with its last
+quantity. With an interval of 0, the updates are merged between two drains.
+"""
+import struct
+import time
+from itertools import islice
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from sortedcontainers import SortedDict
+
+from order_side import OrderSide
+
+L2_DELTA = struct.Struct('<QIB3xqq')
+
+# Same layout as L2_DELTA, so that the drained records are read as columns
+L2_DELTA_DTYPE = np.dtype([
+    ('sequence', '<u8'),
+    ('instrument', '<u4'),
+    ('side', 'u1'),
+    ('padding', np.void, 3),
+    ('price', '<i8'),
+    ('quantity', '<i8'),
+])
+assert L2_DELTA_DTYPE.itemsize == L2_DELTA.size
+
+BUY = OrderSide.BUY.value
+SELL = OrderSide.SELL.value
+
+
+class MarketDataPublisher:
+    """
+    Pending L2 deltas of the LOBs of a market, drained by batches by the feed.
+
+    The LOB calls ``update`` from the points where it changes a price level: an add resting in a level, a delete,
+    a modify, and each level consumed by a match. Without conflation, every update is a delta.
+    """
+
+    __slots__ = ('_conflation_interval', '_pending', '_conflated', '_sequence', '_n_updates', '_last_publish')
+
+    def __init__(self, conflation_interval: Optional[float] = None):
+        """
+        :param conflation_interval: seconds between two publications of the merged updates, no conflation if None
+        """
+        self._conflation_interval: Optional[float] = conflation_interval
+        # Either the list of the updates, or the last quantity of each updated level by (instrument, side, price)
+        self._pending: List[Tuple[int, int, int, int]] = []
+        self._conflated: Optional[Dict[Tuple[int, int, int], int]] = None if conflation_interval is None else {}
+        self._sequence: int = 0
+        self._n_updates: int = 0
+        self._last_publish: float = time.monotonic()
+
+    def __len__(self) -> int:
+        """
+        :return: number of deltas pending
+        """
+        return len(self._pending) if self._conflated is None else len(self._conflated)
+
+    @property
+    def sequence(self) -> int:
+        """
+        :return: number of deltas ever published
+        """
+        return self._sequence
+
+    @property
+    def n_updates(self) -> int:
+        """
+        :return: number of level updates reported by the LOBs, before conflation
+        """
+        return self._n_updates
+
+    def update(self, instrument: int, side: int, price: int, quantity: int):
+        # TODO - Complexity: In O(1)
+        self._n_updates += 1
+        if self._conflated is None:
+            self._pending.append((instrument, side, price, quantity))
+        else:
+            self._conflated[(instrument, side, price)] = quantity
+
+    def publish_book(self, limit_order_book):
+        """
+        Queue a delta for every level of a LOB, e.g. for a consumer joining the feed. As the deltas replace the
+        levels, the consumers already up to date are left unchanged.
+        """
+        # TODO - Complexity: In O(n), n being the number of price levels
+        instrument = limit_order_book.instrument
+        for side, orderbook_side in ((BUY, limit_order_book._orders_by_bids), (SELL, limit_order_book._orders_by_asks)):
+            for price, price_level in orderbook_side.items():
+                self.update(instrument, side, price, price_level.quantity)
+
+    def drain(self, force: bool = False) -> np.ndarray:
+        """
+        :param force: publish the conflated updates even if the conflation interval did not pass yet
+        :return: the deltas published, by sequence number, as a structured array of L2_DELTA_DTYPE. Empty while
+            the conflation window is open.
+        """
+        # TODO - Complexity: In O(#deltas), vectorized
+        if self._conflated is None:
+            updates, self._pending = self._pending, []
+        else:
+            now = time.monotonic()
+            if not force and now - self._last_publish < self._conflation_interval:
+                return np.empty(0, dtype=L2_DELTA_DTYPE)
+            self._last_publish = now
+            updates = [(*level, quantity) for level, quantity in self._conflated.items()]
+            self._conflated = {}
+
+        deltas = np.zeros(len(updates), dtype=L2_DELTA_DTYPE)
+        if updates:
+            instruments, sides, prices, quantities = zip(*updates)
+            deltas['sequence'] = np.arange(self._sequence, self._sequence + len(updates))
+            deltas['instrument'] = instruments
+            deltas['side'] = sides
+            deltas['price'] = prices
+            deltas['quantity'] = quantities
+            self._sequence += len(updates)
+        return deltas
+
+
+class DepthView:
+    """
+    Depth of the LOB of one instrument, maintained by a consumer from the deltas of the feed.
+    """
+
+    __slots__ = ('_instrument', '_sides', '_sequence')
+
+    def __init__(self, instrument: int = 0):
+        self._instrument: int = instrument
+        # Total quantity by price, indexed by side, best price first as in the LOB
+        self._sides: Tuple[SortedDict, SortedDict] = (SortedDict(lambda n: -n), SortedDict())
+        self._sequence: int = 0
+
+    @property
+    def sequence(self) -> int:
+        """
+        :return: sequence number of the next delta expected
+        """
+        return self._sequence
+
+    def apply(self, deltas: np.ndarray):
+        """
+        :param deltas: see MarketDataPublisher.drain, the deltas of the other instruments are skipped
+        """
+        # TODO - Complexity: In O(#deltas log(k)), k being the number of price levels
+        if not len(deltas):
+            return
+        sides = self._sides
+        for instrument, side, price, quantity in zip(
+                deltas['instrument'].tolist(), deltas['side'].tolist(), deltas['price'].tolist(),
+                deltas['quantity'].tolist(),
+        ):
+            if instrument != self._instrument:
+                continue
+            if quantity:
+                sides[side][price] = quantity
+            else:
+                sides[side].pop(price, None)
+        self._sequence = int(deltas['sequence'][-1]) + 1
+
+    def levels(self, side: int, n: int = 10) -> List[Tuple[int, int]]:
+        """
+        :param side: BUY or SELL
+        :param n: number of levels
+        :return: (price, total quantity) of the n best levels of the side, best price first
+        """
+        # TODO - Complexity: In O(n)
+        return list(islice(self._sides[side].items(), n))
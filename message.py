@@ -1,125 +1,231 @@
-"""
-Message Strings follow a specific format:
-The first character defines the message type: A, D or M respectively for Add, Delete and Modify.
-
-
-For instance AddMessage:
-'A-<B or S>-<quantity>-<price>
-B for Buy and S for Sell
---> 'A-B-12-240'
-
-For instance DeleteMessage:
-'D-<id>'
---> 'D-1231316'
-
-For instance ModifyMessage:
-'M-<id>-<quantity>'
---> 'M-1231316-8'
-
-"""
-from abc import ABC, abstractmethod
-from typing import List
-from order_side import OrderSide
-
-
-class Message(ABC):
-
-    def __init__(self, msg_chars: List[str]):
-        self._is_init = False
-
-    @abstractmethod
-    def encode(self):
-        pass
-
-    @property
-    def is_init(self):
-        return self._is_init
-
-
-class AddMessage(Message):
-
-    def __init__(self, msg_chars: List[str]):
-        super().__init__(msg_chars)
-        if len(msg_chars) != 4:
-            return
-
-        self._side: OrderSide = None
-        if msg_chars[1] == 'B':
-            self._side = OrderSide.BUY
-        elif msg_chars[1] == 'S':
-            self._side = OrderSide.SELL
-        else:  # msg_chars[1] not in ['B', 'S']
-            return
-
-        try:
-            self._quantity: int = int(msg_chars[2])
-            self._price: int = int(msg_chars[3])
-        except Exception: #TODO - JE not the way but for the exercise ok
-            return
-        self._is_init = True
-
-    def encode(self):
-        side_str = 'B' if self._side == OrderSide.BUY else 'S'  # self._side == OrderSide.SELL
-        return f'A-{side_str}-{self._quantity}-{self._price}'
-
-    @property
-    def side(self):
-        return self._side
-
-    @property
-    def quantity(self):
-        return self._quantity
-
-    @quantity.setter
-    def quantity(self, value):
-        self._quantity = value
-
-    @property
-    def price(self):
-        return self._price
-
-
-class DeleteMessage(Message):
-
-    def __init__(self, msg_chars: List[str]):
-        super().__init__(msg_chars)
-        if len(msg_chars) != 2:
-            return
-        try:
-            self._order_id: str = str(msg_chars[1])
-        except Exception:  # TODO - JE not the way but for the exercise ok
-            return
-        self._is_init = True
-
-    def encode(self):
-        return f'D-{self._order_id}'
-
-    @property
-    def order_id(self):
-        return self._order_id
-
-
-class ModifyMessage(Message):
-
-    def __init__(self, msg_chars: List[str]):
-        super().__init__(msg_chars)
-        if len(msg_chars) != 3:
-            return
-
-        try:
-            self._order_id: str = str(msg_chars[1])
-            self._quantity: int = int(msg_chars[2])
-        except Exception:  # TODO - JE not the way but for the exercise ok
-            return
-        self._is_init = True
-
-    def encode(self):
-        return f'M-{self._order_id}-{self._quantity}'
-
-    @property
-    def order_id(self):
-        return self._order_id
-
-    @property
-    def quantity(self):
-        return self._quantity
+"""
+Message Strings follow a specific format:
+The first character defines the message type: A, D or M respectively for Add, Delete and Modify.
+
+
+For instance AddMessage:
+'A-<B or S>-<quantity>-<price>
+B for Buy and S for Sell
+--> 'A-B-12-240'
+An add is a limit order by default, its order type (see order_type) is given by a suffix or, for a market order,
+in place of the price:
+'A-<B or S>-<quantity>-<price>-<IOC or FOK>'
+--> 'A-B-12-240-IOC'
+'A-<B or S>-<quantity>-MKT'
+--> 'A-S-12-MKT'
+
+For instance DeleteMessage:
+'D-<id>'
+--> 'D-1231316'
+
+For instance ModifyMessage:
+'M-<id>-<quantity>'
+--> 'M-1231316-8'
+
+The order ids are decoded into ints by the order id allocator of the LOB, sequential by default (see order_id).
+An id which can not be decoded becomes UNKNOWN_ORDER_ID, which matches no order.
+
+Any message can be prefixed by the symbol of its instrument:
+'<symbol>:<message>'
+--> 'AAPL:A-B-12-240'
+Without prefix, the message is for the default instrument, of symbol DEFAULT_SYMBOL.
+The Market maps the symbols to their instrument ids, see Market.add_instrument.
+"""
+from abc import ABC, abstractmethod
+from typing import List, Tuple
+from order_id import OrderIdAllocator, SequentialOrderIdAllocator
+from order_side import OrderSide
+from order_type import OrderType
+
+_SEQUENTIAL_ORDER_IDS = SequentialOrderIdAllocator()
+
+SYMBOL_SEPARATOR = ':'
+DEFAULT_SYMBOL = ''
+DEFAULT_INSTRUMENT = 0
+
+# Price of a market order in text format
+MARKET_PRICE = 'MKT'
+# Suffixes of the order types of the text format, a limit order has none
+ORDER_TYPE_SUFFIXES = {'IOC': OrderType.IOC, 'FOK': OrderType.FOK}
+_SUFFIXES_BY_ORDER_TYPE = {order_type: suffix for suffix, order_type in ORDER_TYPE_SUFFIXES.items()}
+
+
+def split_symbol(msg_str: str) -> Tuple[str, str]:
+    """
+    :param msg_str: e.g. 'AAPL:A-B-12-240' or 'A-B-12-240'
+    :return: symbol and message, e.g. ('AAPL', 'A-B-12-240') or (DEFAULT_SYMBOL, 'A-B-12-240')
+    """
+    symbol, separator, body = msg_str.partition(SYMBOL_SEPARATOR)
+    if not separator:
+        return DEFAULT_SYMBOL, msg_str
+    return symbol, body
+
+
+class Message(ABC):
+
+    # Id of the instrument the message is routed to, set by the Market when it decodes a symbol
+    _instrument: int = DEFAULT_INSTRUMENT
+
+    def __init__(self, msg_chars: List[str], order_ids: OrderIdAllocator = _SEQUENTIAL_ORDER_IDS):
+        self._is_init = False
+        # Decodes and encodes the order ids of the message
+        self._order_ids: OrderIdAllocator = order_ids
+
+    @abstractmethod
+    def encode(self):
+        pass
+
+    @property
+    def is_init(self):
+        return self._is_init
+
+    @property
+    def instrument(self) -> int:
+        return self._instrument
+
+    @instrument.setter
+    def instrument(self, value: int):
+        self._instrument = value
+
+
+class AddMessage(Message):
+
+    def __init__(self, msg_chars: List[str], order_ids: OrderIdAllocator = _SEQUENTIAL_ORDER_IDS):
+        super().__init__(msg_chars, order_ids)
+        if len(msg_chars) not in (4, 5):
+            return
+
+        self._side: OrderSide = None
+        if msg_chars[1] == 'B':
+            self._side = OrderSide.BUY
+        elif msg_chars[1] == 'S':
+            self._side = OrderSide.SELL
+        else:  # msg_chars[1] not in ['B', 'S']
+            return
+
+        self._order_type: OrderType = OrderType.LIMIT
+        if len(msg_chars) == 5:
+            if msg_chars[4] not in ORDER_TYPE_SUFFIXES:
+                return
+            self._order_type = ORDER_TYPE_SUFFIXES[msg_chars[4]]
+
+        try:
+            self._quantity: int = int(msg_chars[2])
+            if msg_chars[3] == MARKET_PRICE and len(msg_chars) == 4:
+                # The price of a market order is not meaningful
+                self._order_type = OrderType.MARKET
+                self._price: int = 0
+            else:
+                self._price: int = int(msg_chars[3])
+        except Exception: #TODO - JE not the way but for the exercise ok
+            return
+        self._is_init = True
+
+    @classmethod
+    def from_fields(
+            cls, side: OrderSide, quantity: int, price: int, order_type: OrderType = OrderType.LIMIT,
+    ) -> 'AddMessage':
+        """
+        Build an already deserialized message, e.g. from a binary record, skipping the parsing of the constructor.
+        """
+        msg = cls.__new__(cls)
+        msg._order_ids = _SEQUENTIAL_ORDER_IDS
+        msg._side = side
+        msg._quantity = quantity
+        msg._price = price
+        msg._order_type = order_type
+        msg._is_init = True
+        return msg
+
+    def encode(self):
+        side_str = 'B' if self._side == OrderSide.BUY else 'S'  # self._side == OrderSide.SELL
+        if self._order_type == OrderType.MARKET:
+            return f'A-{side_str}-{self._quantity}-{MARKET_PRICE}'
+        if self._order_type == OrderType.LIMIT:
+            return f'A-{side_str}-{self._quantity}-{self._price}'
+        return f'A-{side_str}-{self._quantity}-{self._price}-{_SUFFIXES_BY_ORDER_TYPE[self._order_type]}'
+
+    @property
+    def side(self):
+        return self._side
+
+    @property
+    def quantity(self):
+        return self._quantity
+
+    @quantity.setter
+    def quantity(self, value):
+        self._quantity = value
+
+    @property
+    def price(self):
+        return self._price
+
+    @property
+    def order_type(self) -> OrderType:
+        return self._order_type
+
+
+class DeleteMessage(Message):
+
+    def __init__(self, msg_chars: List[str], order_ids: OrderIdAllocator = _SEQUENTIAL_ORDER_IDS):
+        super().__init__(msg_chars, order_ids)
+        if len(msg_chars) != 2:
+            return
+        try:
+            self._order_id: int = order_ids.decode(msg_chars[1].strip())
+        except Exception:  # TODO - JE not the way but for the exercise ok
+            return
+        self._is_init = True
+
+    @classmethod
+    def from_fields(cls, order_id: int, order_ids: OrderIdAllocator = _SEQUENTIAL_ORDER_IDS) -> 'DeleteMessage':
+        msg = cls.__new__(cls)
+        msg._order_ids = order_ids
+        msg._order_id = order_id
+        msg._is_init = True
+        return msg
+
+    def encode(self):
+        return f'D-{self._order_ids.encode(self._order_id)}'
+
+    @property
+    def order_id(self):
+        return self._order_id
+
+
+class ModifyMessage(Message):
+
+    def __init__(self, msg_chars: List[str], order_ids: OrderIdAllocator = _SEQUENTIAL_ORDER_IDS):
+        super().__init__(msg_chars, order_ids)
+        if len(msg_chars) != 3:
+            return
+
+        try:
+            self._order_id: int = order_ids.decode(msg_chars[1])
+            self._quantity: int = int(msg_chars[2])
+        except Exception:  # TODO - JE not the way but for the exercise ok
+            return
+        self._is_init = True
+
+    @classmethod
+    def from_fields(
+            cls, order_id: int, quantity: int, order_ids: OrderIdAllocator = _SEQUENTIAL_ORDER_IDS,
+    ) -> 'ModifyMessage':
+        msg = cls.__new__(cls)
+        msg._order_ids = order_ids
+        msg._order_id = order_id
+        msg._quantity = quantity
+        msg._is_init = True
+        return msg
+
+    def encode(self):
+        return f'M-{self._order_ids.encode(self._order_id)}-{self._quantity}'
+
+    @property
+    def order_id(self):
+        return self._order_id
+
+    @property
+    def quantity(self):
+        return self._quantity
@@ -0,0 +1,174 @@
+"""
+Columnar batch of decoded messages: one NumPy array per field of the binary format (see binary_message),
+so that a whole chunk of a fleet file is decoded and checked without building one Message object per message.
+"""
+from typing import Iterator, Mapping, Optional, Tuple
+
+import numpy as np
+
+from binary_message import ADD, DELETE, MODIFY, RECORD
+from message import DEFAULT_INSTRUMENT, DEFAULT_SYMBOL, MARKET_PRICE, ORDER_TYPE_SUFFIXES, SYMBOL_SEPARATOR
+from order_id import UNKNOWN_ORDER_ID, OrderIdAllocator, SequentialOrderIdAllocator
+from order_store import MAX_VALUE, MIN_VALUE
+from order_type import OrderType
+
+# Same layout as binary_message.RECORD, so that a binary buffer is viewed as a batch without any copy
+RECORD_DTYPE = np.dtype([
+    ('msg_type', np.uint8),
+    ('side', np.uint8),
+    ('order_type', np.uint8),
+    ('padding', np.void, 1),
+    ('instrument', '<u4'),
+    ('quantity', '<i8'),
+    ('price', '<i8'),
+    ('order_id', '<u8'),
+])
+assert RECORD_DTYPE.itemsize == RECORD.size
+
+_MSG_TYPES = {'A': ADD, 'D': DELETE, 'M': MODIFY}
+_SIDES = {'B': 0, 'S': 1}  # OrderSide values
+_LIMIT = OrderType.LIMIT.value
+_MARKET = OrderType.MARKET.value
+_ORDER_TYPES = {suffix: order_type.value for suffix, order_type in ORDER_TYPE_SUFFIXES.items()}
+
+_MAX_ORDER_ID = (1 << 64) - 1
+
+_SEQUENTIAL_ORDER_IDS = SequentialOrderIdAllocator()
+_DEFAULT_INSTRUMENTS = {DEFAULT_SYMBOL: DEFAULT_INSTRUMENT}
+
+
+class MessageBatch:
+    """
+    Messages in arrival order, stored as columns of equal length:
+    msg_type, side, instrument, quantity, price, order_id and order_type (see binary_message for the meaning of each
+    field).
+    """
+
+    __slots__ = ('msg_type', 'side', 'instrument', 'quantity', 'price', 'order_id', 'order_type')
+
+    def __init__(
+            self, msg_type: np.ndarray, side: np.ndarray, instrument: np.ndarray, quantity: np.ndarray,
+            price: np.ndarray, order_id: np.ndarray, order_type: Optional[np.ndarray] = None,
+    ):
+        """
+        :param order_type: limit orders only if None
+        """
+        self.msg_type: np.ndarray = msg_type
+        self.side: np.ndarray = side
+        self.instrument: np.ndarray = instrument
+        self.quantity: np.ndarray = quantity
+        self.price: np.ndarray = price
+        self.order_id: np.ndarray = order_id
+        self.order_type: np.ndarray = (
+            order_type if order_type is not None else np.full(len(msg_type), _LIMIT, dtype=np.uint8)
+        )
+
+    def __len__(self) -> int:
+        return len(self.msg_type)
+
+    @classmethod
+    def from_binary(cls, buffer) -> 'MessageBatch':
+        """
+        :param buffer: binary records, of a length multiple of RECORD.size. The columns are views on it.
+        """
+        records = np.frombuffer(buffer, dtype=RECORD_DTYPE)
+        return cls(
+            records['msg_type'], records['side'], records['instrument'], records['quantity'], records['price'],
+            records['order_id'], records['order_type'],
+        )
+
+    @classmethod
+    def from_text(
+            cls, text: str, order_ids: OrderIdAllocator = _SEQUENTIAL_ORDER_IDS,
+            instruments: Mapping[str, int] = _DEFAULT_INSTRUMENTS,
+    ) -> 'MessageBatch':
+        """
+        :param text: lines of messages in text format, e.g. 'A-B-12-240', 'A-B-12-240-IOC' or 'AAPL:A-B-12-240'.
+            Malformed lines, e.g. of a value out of the range of its column, and lines of unknown symbols are
+            skipped.
+        :param order_ids: decodes the order ids of the text format
+        :param instruments: instrument id by symbol
+        """
+        decode_order_id = order_ids.decode
+        msg_types, sides, instrument_ids, quantities, prices, order_ids, order_types = [], [], [], [], [], [], []
+        for msg_str in text.splitlines():
+            instrument = DEFAULT_INSTRUMENT
+            if SYMBOL_SEPARATOR in msg_str:
+                symbol, _, msg_str = msg_str.partition(SYMBOL_SEPARATOR)
+                instrument = instruments.get(symbol)
+                if instrument is None:
+                    continue
+            msg_chars = msg_str.split('-')
+            msg_type = _MSG_TYPES.get(msg_chars[0])
+            try:
+                if msg_type == ADD and len(msg_chars) == 4 and msg_chars[1] in _SIDES:
+                    if msg_chars[3] == MARKET_PRICE:
+                        row = (msg_type, _SIDES[msg_chars[1]], int(msg_chars[2]), 0, UNKNOWN_ORDER_ID, _MARKET)
+                    else:
+                        row = (
+                            msg_type, _SIDES[msg_chars[1]], int(msg_chars[2]), int(msg_chars[3]), UNKNOWN_ORDER_ID,
+                            _LIMIT,
+                        )
+                elif msg_type == ADD and len(msg_chars) == 5 and msg_chars[1] in _SIDES and (
+                        msg_chars[4] in _ORDER_TYPES
+                ):
+                    row = (
+                        msg_type, _SIDES[msg_chars[1]], int(msg_chars[2]), int(msg_chars[3]), UNKNOWN_ORDER_ID,
+                        _ORDER_TYPES[msg_chars[4]],
+                    )
+                elif msg_type == DELETE and len(msg_chars) == 2:
+                    row = (msg_type, 0, 0, 0, decode_order_id(msg_chars[1]), _LIMIT)
+                elif msg_type == MODIFY and len(msg_chars) == 3:
+                    row = (msg_type, 0, int(msg_chars[2]), 0, decode_order_id(msg_chars[1]), _LIMIT)
+                else:
+                    continue
+            except ValueError:
+                continue
+            # A value out of the range of its column is malformed, instead of failing the whole batch
+            if not (MIN_VALUE <= row[2] <= MAX_VALUE and MIN_VALUE <= row[3] <= MAX_VALUE and row[4] <= _MAX_ORDER_ID):
+                continue
+            msg_types.append(row[0])
+            sides.append(row[1])
+            instrument_ids.append(instrument)
+            quantities.append(row[2])
+            prices.append(row[3])
+            order_ids.append(row[4])
+            order_types.append(row[5])
+
+        return cls(
+            np.array(msg_types, dtype=np.uint8),
+            np.array(sides, dtype=np.uint8),
+            np.array(instrument_ids, dtype=np.uint32),
+            np.array(quantities, dtype=np.int64),
+            np.array(prices, dtype=np.int64),
+            np.array(order_ids, dtype=np.uint64),
+            np.array(order_types, dtype=np.uint8),
+        )
+
+    def to_records(self) -> np.ndarray:
+        """
+        :return: copy of the batch as binary records, see binary_message
+        """
+        records = np.zeros(len(self), dtype=RECORD_DTYPE)
+        for field in self.__slots__:
+            records[field] = getattr(self, field)
+        return records
+
+    def select(self, mask: np.ndarray) -> 'MessageBatch':
+        """
+        :param mask: boolean array, True for the messages to keep, or indices or slice of the messages to keep
+        """
+        return MessageBatch(
+            self.msg_type[mask], self.side[mask], self.instrument[mask], self.quantity[mask], self.price[mask],
+            self.order_id[mask], self.order_type[mask],
+        )
+
+    def rows(self) -> Iterator[Tuple[int, int, int, int, int, int]]:
+        """
+        :return: (msg type, side, quantity, price, order id, order type) of each message as Python ints, in arrival
+            order. The instrument is left out, as a LOB only processes the messages of its instrument.
+        """
+        return zip(
+            self.msg_type.tolist(), self.side.tolist(), self.quantity.tolist(), self.price.tolist(),
+            self.order_id.tolist(), self.order_type.tolist(),
+        )
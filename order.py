@@ -1,46 +1,31 @@
-import uuid
-
-from message import AddMessage
-from order_side import OrderSide
-
-
-class Order:
-
-    def __init__(self,  order_id: str, side: OrderSide, quantity: int, price: int):
-        self._order_id = order_id
-        self._side: OrderSide = side
-        self._quantity: int = quantity
-        self._price: int = price
-
-    @classmethod
-    def from_msg(cls, msg: AddMessage, prev_order_id: int = None):
-        if not prev_order_id:
-            order_id = uuid.uuid4().hex
-        else:
-            order_id = int(prev_order_id) + 1
-        return Order(
-            order_id=str(order_id),
-            side=msg.side,
-            quantity=msg.quantity,
-            price=msg.price,
-        )
-
-    @property
-    def order_id(self):
-        return self._order_id
-
-    @property
-    def quantity(self):
-        return self._quantity
-
-    @quantity.setter
-    def quantity(self, value):
-        self._quantity = value
-
-    @property
-    def price(self):
-        return self._price
-
-    @property
-    def side(self):
-        return self._side
+from order_side import OrderSide
+from order_store import OrderStore
+
+
+class Order:
+    """
+    Read-only view on an order standing in the LOB, built on demand (see LimitOrderBook.get_order).
+    The order itself lives in the columns of the OrderStore: the view is only valid as long as the order stands.
+    """
+
+    __slots__ = ('_store', '_handle')
+
+    def __init__(self, store: OrderStore, handle: int):
+        self._store: OrderStore = store
+        self._handle: int = handle
+
+    @property
+    def order_id(self):
+        return self._store.order_id[self._handle]
+
+    @property
+    def quantity(self):
+        return self._store.quantity[self._handle]
+
+    @property
+    def price(self):
+        return self._store.price[self._handle]
+
+    @property
+    def side(self):
+        return OrderSide(self._store.side[self._handle])
@@ -0,0 +1,143 @@
+"""
+Order ids are native ints within the exchange: the LOB, its hash table and the binary format only handle ints.
+Their text form, either a sequential int or a random hexadecimal string, only exists at the I/O edge:
+it is decoded when a message is parsed and encoded when a result is sent, by the allocator of the LOB.
+
+0 is never allocated, so that it stands for an order id which can not be decoded.
+"""
+import random
+from abc import ABC, abstractmethod
+from typing import Optional
+
+UNKNOWN_ORDER_ID = 0
+
+_MASK_64 = (1 << 64) - 1
+_GOLDEN_RATIO_64 = 0x9e3779b97f4a7c15
+_HEX_DIGITS = frozenset('0123456789abcdef')
+
+
+class OrderIdAllocator(ABC):
+    """
+    Allocates the unique order ids of a LOB and converts them from and to their text form.
+    """
+
+    __slots__ = ()
+
+    @abstractmethod
+    def next(self) -> int:
+        """
+        :return: a new order id, never 0
+        """
+
+    @property
+    @abstractmethod
+    def last(self) -> int:
+        """
+        :return: last order id allocated, UNKNOWN_ORDER_ID if none
+        """
+
+    @abstractmethod
+    def encode(self, order_id: int) -> str:
+        pass
+
+    @abstractmethod
+    def decode(self, order_id_str: str) -> int:
+        """
+        :return: UNKNOWN_ORDER_ID if the text is not the form of an order id
+        """
+
+
+class SequentialOrderIdAllocator(OrderIdAllocator):
+    """
+    Incremented int: '2', '3', ...
+    """
+
+    __slots__ = ('_last',)
+
+    def __init__(self, last: int = 0):
+        """
+        :param last: the first order id allocated is last + 1
+        """
+        self._last: int = last
+
+    @property
+    def last(self) -> int:
+        """
+        :return: last order id allocated
+        """
+        return self._last
+
+    def next(self) -> int:
+        # TODO - Complexity: In O(1)
+        self._last += 1
+        return self._last
+
+    def encode(self, order_id: int) -> str:
+        return str(order_id)
+
+    def decode(self, order_id_str: str) -> int:
+        if order_id_str.isascii() and order_id_str.isdigit():
+            return int(order_id_str)
+        return UNKNOWN_ORDER_ID
+
+
+class RandomOrderIdAllocator(OrderIdAllocator):
+    """
+    Unique ids spread over the 64 bits, written as 16 hexadecimal digits: '9e3779b97f4a7c15'.
+
+    Instead of drawing a uuid per order, a counter is multiplied by an odd constant (the 64 bits golden ratio) and
+    xored with a random key. Both are bijections of the 64 bits integers, hence the ids are unique until 2 ** 64 orders.
+    """
+
+    __slots__ = ('_count', '_key')
+
+    def __init__(self, seed: Optional[int] = None, key: Optional[int] = None, count: int = 0):
+        """
+        :param seed: of the random key
+        :param key: the key itself, and the count of the ids already allocated, to resume an allocator
+        """
+        self._count: int = count
+        self._key: int = key if key is not None else random.Random(seed).getrandbits(64)
+
+    @property
+    def count(self) -> int:
+        """
+        :return: number of order ids allocated
+        """
+        return self._count
+
+    @property
+    def key(self) -> int:
+        return self._key
+
+    @property
+    def last(self) -> int:
+        if not self._count:
+            return UNKNOWN_ORDER_ID
+        # A skipped id 0 incremented the count once more, so that the count always gives the last id
+        return ((self._count * _GOLDEN_RATIO_64) & _MASK_64) ^ self._key
+
+    def next(self) -> int:
+        # TODO - Complexity: In O(1)
+        self._count += 1
+        order_id = ((self._count * _GOLDEN_RATIO_64) & _MASK_64) ^ self._key
+        if order_id == UNKNOWN_ORDER_ID:
+            return self.next()
+        return order_id
+
+    def encode(self, order_id: int) -> str:
+        return f'{order_id:016x}'
+
+    def decode(self, order_id_str: str) -> int:
+        if len(order_id_str) == 16 and _HEX_DIGITS.issuperset(order_id_str):
+            return int(order_id_str, 16)
+        return UNKNOWN_ORDER_ID
+
+
+def make_order_id_allocator(order_id_count: Optional[int]) -> OrderIdAllocator:
+    """
+    :param order_id_count: last sequential order id, None for random order ids
+    """
+    if order_id_count is None:
+        return RandomOrderIdAllocator()
+    return SequentialOrderIdAllocator(order_id_count)
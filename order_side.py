@@ -1,6 +1,6 @@
-from enum import Enum
-
-
-class OrderSide(Enum):
-    BUY = 0
-    SELL = 1
+from enum import Enum
+
+
+class OrderSide(Enum):
+    BUY = 0
+    SELL = 1
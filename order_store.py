@@ -0,0 +1,122 @@
+from array import array
+
+# Handle of no order: end of a queue or of the free-list
+NIL = -1
+
+# Range of the quantity and price columns, int64
+MIN_VALUE = -(1 << 63)
+MAX_VALUE = (1 << 63) - 1
+
+
+class OrderStore:
+    """
+    Struct-of-arrays storage of the orders standing in the LOB.
+
+    An order is an integer handle indexing one slot of each column: order id, side, quantity, price and the links
+    prev / next of the FIFO queue of its price level (see PriceLevel). The columns are typed arrays,
+    i.e. 8 bytes per field instead of a Python object per order and per field.
+    The columns grow geometrically, and the slots of the deleted orders are reused through a free-list
+    chained by the next column.
+    """
+
+    __slots__ = ('order_id', 'side', 'quantity', 'price', 'prev', 'next', '_capacity', '_size', '_free', '_length')
+
+    def __init__(self, capacity: int = 64):
+        self.order_id: array = array('Q')
+        self.side: array = array('b')
+        self.quantity: array = array('q')
+        self.price: array = array('q')
+        self.prev: array = array('q')
+        self.next: array = array('q')
+        self._capacity: int = 0
+        # Number of slots ever used, slots beyond are never allocated yet
+        self._size: int = 0
+        self._free: int = NIL
+        self._length: int = 0
+        self._grow(capacity)
+
+    @classmethod
+    def from_columns(cls, order_id: bytes, side: bytes, quantity: bytes, price: bytes, prev: bytes, next_: bytes):
+        """
+        Bulk load of n orders in the slots 0 to n - 1, e.g. from a snapshot (see snapshot).
+        :param order_id: raw bytes of each column, in the machine layout of its typed array
+        :return: the store, without free slot
+        """
+        # TODO - Complexity: In O(n), copies of the buffers without a Python object per order
+        store = cls(capacity=0)
+        for column, buffer in zip(
+                (store.order_id, store.side, store.quantity, store.price, store.prev, store.next),
+                (order_id, side, quantity, price, prev, next_),
+        ):
+            column.frombytes(buffer)
+        store._capacity = store._size = store._length = len(store.order_id)
+        if store._capacity < 64:
+            store._grow(64)
+        return store
+
+    def __len__(self) -> int:
+        """
+        :return: number of orders stored
+        """
+        return self._length
+
+    def _grow(self, capacity: int):
+        extra = capacity - self._capacity
+        for column in (self.order_id, self.side, self.quantity, self.price, self.prev, self.next):
+            column.frombytes(bytes(column.itemsize * extra))
+        self._capacity = capacity
+
+    def allocate(self, order_id: int, side: int, quantity: int, price: int) -> int:
+        """
+        :param order_id:
+        :param side: OrderSide value
+        :param quantity:
+        :param price:
+        :return: handle of the new order, not linked to any queue yet
+        """
+        # TODO - Complexity: In O(1) amortized
+        handle = self._free
+        if handle != NIL:
+            self._free = self.next[handle]
+        else:
+            handle = self._size
+            if handle == self._capacity:
+                self._grow(2 * self._capacity)
+            self._size += 1
+
+        self.order_id[handle] = order_id
+        self.side[handle] = side
+        self.quantity[handle] = quantity
+        self.price[handle] = price
+        self.prev[handle] = NIL
+        self.next[handle] = NIL
+        self._length += 1
+        return handle
+
+    def free(self, handle: int):
+        """
+        Release the slot of an order already unlinked from its queue, for reuse.
+        """
+        self.order_id[handle] = 0
+        self.next[handle] = self._free
+        self._free = handle
+        self._length -= 1
+
+    def free_chain(self, head: int, tail: int, length: int):
+        """
+        Release at once the slots of a whole queue of orders, linked by the next column from head to tail:
+        the queue is spliced into the free-list.
+        """
+        # TODO - Complexity: In O(1)
+        self.next[tail] = self._free
+        self._free = head
+        self._length -= length
+
+    def nbytes(self) -> int:
+        """
+        :return: memory held by the columns
+        """
+        return sum(
+            column.itemsize * len(column)
+            for column in (self.order_id, self.side, self.quantity, self.price, self.prev, self.next)
+        )
@@ -0,0 +1,14 @@
+from enum import Enum
+
+
+class OrderType(Enum):
+    """
+    * LIMIT: matched up to its price, its residual rests in the LOB
+    * MARKET: matched at any price, its residual is cancelled
+    * IOC: Immediate Or Cancel, matched up to its price, its residual is cancelled
+    * FOK: Fill Or Kill, matched up to its price if it is fully filled, else cancelled without any fill
+    """
+    LIMIT = 0
+    MARKET = 1
+    IOC = 2
+    FOK = 3
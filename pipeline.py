@@ -0,0 +1,121 @@
+"""
+Stages of a generator pipeline: a producer, e.g. reading and decoding a fleet file, runs concurrently with its
+consumer, e.g. the matching loop, and hands its items over through a bounded queue.
+
+The consumer iterates the stage as a plain generator and gets the items in the order they were produced.
+The queue holds at most max_pending items: a producer ahead of the consumer blocks, so that the memory stays bounded.
+An exception of the producer is raised in the consumer once the items produced before it are consumed, and a consumer
+which stops early stops the producer.
+
+* threaded: the producer runs on a thread. Only the I/O and the NumPy calls of the producer release the GIL.
+* in_process: the producer runs in a child process, its items are pickled through a multiprocessing queue.
+"""
+import multiprocessing as mp
+import queue
+import threading
+from typing import Callable, Iterable, Iterator, Optional, TypeVar
+
+T = TypeVar('T')
+
+# Number of items a producer can be ahead of its consumer
+MAX_PENDING = 4
+
+# Period at which a blocked stage checks whether the other end went away, in seconds
+_POLL_INTERVAL = 0.1
+
+
+class _Done:
+    """
+    Last item of a stage, with the exception which ended the producer if any.
+    """
+
+    def __init__(self, error: Optional[BaseException] = None):
+        self.error: Optional[BaseException] = error
+
+
+def threaded(items: Iterable[T], max_pending: int = MAX_PENDING) -> Iterator[T]:
+    """
+    :param items: iterated on a thread
+    :param max_pending: size of the queue
+    :return: the items, in order
+    """
+    pending = queue.Queue(max_pending)
+    stopped = threading.Event()
+
+    def put(item) -> bool:
+        # Gives up once the consumer stopped, instead of blocking on a queue no one drains
+        while not stopped.is_set():
+            try:
+                pending.put(item, timeout=_POLL_INTERVAL)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in items:
+                if not put(item):
+                    return
+        except BaseException as error:
+            put(_Done(error))
+        else:
+            put(_Done())
+
+    thread = threading.Thread(target=produce, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = pending.get()
+            if isinstance(item, _Done):
+                if item.error is not None:
+                    raise item.error
+                return
+            yield item
+    finally:
+        stopped.set()
+        thread.join()
+
+
+def _produce_in_process(func: Callable[..., Iterable], args: tuple, pending):
+    try:
+        for item in func(*args):
+            pending.put(item)
+    except BaseException as error:
+        pending.put(_Done(error))
+    else:
+        pending.put(_Done())
+
+
+def in_process(func: Callable[..., Iterable[T]], args: tuple = (), max_pending: int = MAX_PENDING) -> Iterator[T]:
+    """
+    :param func: called with args in a child process, e.g. a generator function. It must be picklable, as well as
+        args and the items.
+    :param max_pending: size of the queue
+    :return: the items, in order
+    """
+    ctx = mp.get_context()
+    pending = ctx.Queue(max_pending)
+    process = ctx.Process(target=_produce_in_process, args=(func, args, pending), daemon=True)
+    process.start()
+    try:
+        is_alive = True
+        while True:
+            try:
+                item = pending.get(timeout=_POLL_INTERVAL)
+            except queue.Empty:
+                # The items put before the exit of the producer are flushed to the pipe: one more poll gets them
+                if not is_alive:
+                    raise RuntimeError(f'Producer process exited with code {process.exitcode}')
+                is_alive = process.is_alive()
+                continue
+            if isinstance(item, _Done):
+                if item.error is not None:
+                    raise item.error
+                return
+            yield item
+    finally:
+        # The producer is still running if the consumer stopped early
+        if process.is_alive():
+            process.terminate()
+        process.join()
@@ -0,0 +1,309 @@
+from typing import Iterator, List, Optional, Tuple
+
+from price_level import PriceLevel
+
+# Number of levels above which the 64 ticks of a word of the bitmap are scanned rather than its bits
+_DENSE_WORD = 8
+
+
+class PriceLadder:
+    """
+    Dense replacement of the SortedDict of one side of the LOB when the price range is bounded.
+
+    The price levels are stored in a list preallocated with one slot per tick of [min_price ; max_price],
+    indexed by (price - min_price) // price_increment. Getting, adding and deleting a level is done in O(1).
+    The best and worst prices are tracked with cursors, moved when the level under them is deleted.
+
+    The non-empty ticks are also marked in an occupancy bitmap of three levels: one bit per tick in words of 64 bits,
+    one bit per non-empty word in groups of 64 words, and one bit per non-empty group in a top int. The next non-empty
+    tick is found from any tick with a few int operations, whatever the number of empty ticks in between, so that
+    neither the cursors nor the iteration of the levels walk the empty ticks of a sparse book.
+
+    It exposes the subset of the SortedDict interface used by the LOB, so that both backends are interchangeable.
+    Items are sorted from the best price to the worst, i.e. descending prices on the bid side like
+    SortedDict(lambda n: -n) and ascending prices on the ask side.
+    """
+
+    __slots__ = (
+        '_min_price', '_price_increment', '_levels', '_words', '_groups', '_top', '_step', '_count', '_best', '_worst',
+    )
+
+    def __init__(self, min_price: int, max_price: int, price_increment: int = 1, reverse: bool = False):
+        # Align the origin of the ladder on the tick grid
+        self._min_price: int = -(-min_price // price_increment) * price_increment
+        self._price_increment: int = price_increment
+        self._levels: List[Optional[PriceLevel]] = [None] * ((max_price - self._min_price) // price_increment + 1)
+        # Occupancy bitmap of the levels: bit i of words[w] for the tick 64 * w + i, bit i of groups[g] if
+        # words[64 * g + i] is not 0, bit g of top if groups[g] is not 0
+        self._words: List[int] = [0] * -(-len(self._levels) // 64)
+        self._groups: List[int] = [0] * -(-len(self._words) // 64)
+        self._top: int = 0
+        # Direction in which the index moves from the best price toward the worst one
+        self._step: int = -1 if reverse else 1
+        self._count: int = 0
+        self._best: int = -1
+        self._worst: int = -1
+
+    @staticmethod
+    def n_ticks(min_price: int, max_price: int, price_increment: int = 1) -> int:
+        return (max_price - -(-min_price // price_increment) * price_increment) // price_increment + 1
+
+    def _index(self, price: int) -> int:
+        index, off_tick = divmod(price - self._min_price, self._price_increment)
+        if off_tick or not 0 <= index < len(self._levels):
+            raise KeyError(price)
+        return index
+
+    def _price(self, index: int) -> int:
+        return self._min_price + index * self._price_increment
+
+    def _mark(self, index: int):
+        word = index >> 6
+        if not self._words[word]:
+            group = word >> 6
+            if not self._groups[group]:
+                self._top |= 1 << group
+            self._groups[group] |= 1 << (word & 63)
+        self._words[word] |= 1 << (index & 63)
+
+    def _unmark(self, index: int):
+        word = index >> 6
+        self._words[word] &= ~(1 << (index & 63))
+        if not self._words[word]:
+            group = word >> 6
+            self._groups[group] &= ~(1 << (word & 63))
+            if not self._groups[group]:
+                self._top &= ~(1 << group)
+
+    def _next_index(self, index: int) -> int:
+        """
+        :return: lowest index of a level at or above index, -1 if none
+        """
+        # TODO - Complexity: In O(1), one word per level of the bitmap
+        if index >= len(self._levels):
+            return -1
+        word = index >> 6
+        bits = self._words[word] >> (index & 63)
+        if bits:
+            return index + (bits & -bits).bit_length() - 1
+        group = word >> 6
+        bits = self._groups[group] >> (word & 63) >> 1
+        if bits:
+            word += (bits & -bits).bit_length()
+        else:
+            bits = self._top >> group >> 1
+            if not bits:
+                return -1
+            group += (bits & -bits).bit_length()
+            bits = self._groups[group]
+            word = (group << 6) + (bits & -bits).bit_length() - 1
+        bits = self._words[word]
+        return (word << 6) + (bits & -bits).bit_length() - 1
+
+    def _prev_index(self, index: int) -> int:
+        """
+        :return: highest index of a level at or below index, -1 if none
+        """
+        # TODO - Complexity: In O(1), one word per level of the bitmap
+        if index < 0:
+            return -1
+        word = index >> 6
+        bits = self._words[word] & ((2 << (index & 63)) - 1)
+        if bits:
+            return (word << 6) + bits.bit_length() - 1
+        group = word >> 6
+        bits = self._groups[group] & ((1 << (word & 63)) - 1)
+        if bits:
+            word = (group << 6) + bits.bit_length() - 1
+        else:
+            bits = self._top & ((1 << group) - 1)
+            if not bits:
+                return -1
+            group = bits.bit_length() - 1
+            word = (group << 6) + self._groups[group].bit_length() - 1
+        return (word << 6) + self._words[word].bit_length() - 1
+
+    def _indices(self, first: int, last: int, step: int) -> Iterator[int]:
+        """
+        :return: indices of the levels from first to last included, in the direction of step
+        """
+        # TODO - Complexity: In O(#levels + #non-empty words), the empty words are skipped by the bitmap
+        words, groups, levels = self._words, self._groups, self._levels
+        if step > 0:
+            index = self._next_index(first)
+            if index == -1:
+                return
+            word = index >> 6
+            # The bits of the first word from index on
+            bits = words[word] >> (index & 63) << (index & 63)
+            while True:
+                base = word << 6
+                # The ticks of a dense word are scanned, faster than its bits one by one
+                if bits.bit_count() > _DENSE_WORD:
+                    for index in range(base + (bits & -bits).bit_length() - 1, min(base + 64, last + 1)):
+                        if levels[index] is not None:
+                            yield index
+                    bits = 0
+                    if base + 63 >= last:
+                        return
+                while bits:
+                    low = bits & -bits
+                    index = base + low.bit_length() - 1
+                    if index > last:
+                        return
+                    yield index
+                    bits ^= low
+                # The next non-empty word of the group, else of the next groups
+                group_bits = groups[word >> 6] >> (word & 63) >> 1
+                if group_bits:
+                    word += (group_bits & -group_bits).bit_length()
+                else:
+                    index = self._next_index((word | 63) + 1 << 6)
+                    if index == -1:
+                        return
+                    word = index >> 6
+                bits = words[word]
+        else:
+            index = self._prev_index(first)
+            if index == -1:
+                return
+            word = index >> 6
+            # The bits of the first word up to index
+            bits = words[word] & ((2 << (index & 63)) - 1)
+            while True:
+                base = word << 6
+                if bits.bit_count() > _DENSE_WORD:
+                    for index in range(base + bits.bit_length() - 1, max(base, last) - 1, -1):
+                        if levels[index] is not None:
+                            yield index
+                    bits = 0
+                    if base <= last:
+                        return
+                while bits:
+                    index = base + bits.bit_length() - 1
+                    if index < last:
+                        return
+                    yield index
+                    bits ^= 1 << (index - base)
+                # The previous non-empty word of the group, else of the previous groups
+                group_bits = groups[word >> 6] & ((1 << (word & 63)) - 1)
+                if group_bits:
+                    word = (word & ~63) + group_bits.bit_length() - 1
+                else:
+                    index = self._prev_index(((word & ~63) << 6) - 1)
+                    if index == -1:
+                        return
+                    word = index >> 6
+                bits = words[word]
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __contains__(self, price: int) -> bool:
+        try:
+            return self._levels[self._index(price)] is not None
+        except KeyError:
+            return False
+
+    def get(self, price: int, default: Optional[PriceLevel] = None) -> Optional[PriceLevel]:
+        index, off_tick = divmod(price - self._min_price, self._price_increment)
+        if off_tick or not 0 <= index < len(self._levels):
+            return default
+        price_level = self._levels[index]
+        return default if price_level is None else price_level
+
+    def __getitem__(self, price: int) -> PriceLevel:
+        price_level = self._levels[self._index(price)]
+        if price_level is None:
+            raise KeyError(price)
+        return price_level
+
+    def __setitem__(self, price: int, price_level: PriceLevel):
+        index = self._index(price)
+        if self._levels[index] is None:
+            self._mark(index)
+            self._count += 1
+            if self._count == 1:
+                self._best = self._worst = index
+            elif (index - self._best) * self._step < 0:
+                self._best = index
+            elif (index - self._worst) * self._step > 0:
+                self._worst = index
+        self._levels[index] = price_level
+
+    def __delitem__(self, price: int):
+        index = self._index(price)
+        if self._levels[index] is None:
+            raise KeyError(price)
+        self._delete_index(index)
+
+    def _delete_index(self, index: int):
+        self._levels[index] = None
+        self._unmark(index)
+        self._count -= 1
+        if not self._count:
+            self._best = self._worst = -1
+            return
+        # TODO - Complexity: In O(1), the next level is found by the bitmap without scanning the empty ticks
+        if index == self._best:
+            self._best = self._next_index(index) if self._step > 0 else self._prev_index(index)
+        elif index == self._worst:
+            self._worst = self._prev_index(index) if self._step > 0 else self._next_index(index)
+
+    def __iter__(self) -> Iterator[int]:
+        for price, _ in self.items():
+            yield price
+
+    def peekitem(self, index: int = -1) -> Tuple[int, PriceLevel]:
+        """
+        Only the best (index=0) and the worst (index=-1) items are reachable in O(1).
+        """
+        if not self._count:
+            raise IndexError('peekitem on an empty PriceLadder')
+        if index == 0:
+            return self._price(self._best), self._levels[self._best]
+        if index == -1:
+            return self._price(self._worst), self._levels[self._worst]
+        raise IndexError(f'PriceLadder only supports index 0 or -1, got {index}')
+
+    def popitem(self, index: int = -1) -> Tuple[int, PriceLevel]:
+        price, price_level = self.peekitem(index)
+        self._delete_index((price - self._min_price) // self._price_increment)
+        return price, price_level
+
+    def irange(self, minimum: int = None, maximum: int = None, reverse: bool = False) -> Iterator[int]:
+        """
+        Prices of the levels between minimum and maximum (inclusive) following the sort order, like SortedDict.irange
+        with the key of the side: minimum bounds the better prices and maximum the worse ones, e.g. on the bid side
+        irange(minimum=105, maximum=100) yields from 105 down to 100.
+        """
+        if not self._count:
+            return iter(())
+        step = self._step
+        first, last = self._best, self._worst
+        if minimum is not None:
+            index = (minimum - self._min_price) // self._price_increment
+            if (index - first) * step > 0:
+                first = index
+        if maximum is not None:
+            index = (maximum - self._min_price) // self._price_increment
+            if (index - last) * step < 0:
+                last = index
+        if (last - first) * step < 0:
+            return iter(())
+        indices = self._indices(last, first, -step) if reverse else self._indices(first, last, step)
+        min_price, price_increment = self._min_price, self._price_increment
+        return (min_price + index * price_increment for index in indices)
+
+    def items(self) -> List[Tuple[int, PriceLevel]]:
+        """
+        :return: list of (price, PriceLevel) from the best price to the worst.
+        """
+        if not self._count:
+            return []
+        levels = self._levels
+        min_price, price_increment = self._min_price, self._price_increment
+        return [
+            (min_price + index * price_increment, levels[index])
+            for index in self._indices(self._best, self._worst, self._step)
+        ]
@@ -0,0 +1,147 @@
+from typing import Iterator
+
+from order_store import NIL, OrderStore
+
+
+class PriceLevel:
+    """
+    FIFO queue of the orders standing at one price level of the LOB.
+
+    Implemented as an intrusive doubly-linked list: the orders are handles of the OrderStore, whose prev and next
+    columns hold the links. As the LOB reaches the handle of an order from its order id in O(1), an order is unlinked
+    in O(1) without searching the queue.
+
+    The total quantity and the number of orders of the level are maintained on each update, so that they are read
+    in O(1). The quantity of a standing order must therefore be changed through ``set_quantity``.
+    """
+
+    __slots__ = ('_store', '_head', '_tail', '_length', '_quantity')
+
+    def __init__(self, store: OrderStore):
+        self._store: OrderStore = store
+        self._head: int = NIL
+        self._tail: int = NIL
+        self._length: int = 0
+        self._quantity: int = 0
+
+    @classmethod
+    def from_queue(cls, store: OrderStore, head: int, tail: int, length: int, quantity: int) -> 'PriceLevel':
+        """
+        Level over a queue already linked in the store from head to tail, e.g. bulk loaded (see snapshot).
+        """
+        price_level = cls(store)
+        price_level._head, price_level._tail = head, tail
+        price_level._length, price_level._quantity = length, quantity
+        return price_level
+
+    def __len__(self) -> int:
+        """
+        :return: number of orders standing at this level.
+        """
+        return self._length
+
+    def __iter__(self) -> Iterator[int]:
+        """
+        :return: handles of the orders, by priority.
+        """
+        next_ = self._store.next
+        handle = self._head
+        while handle != NIL:
+            yield handle
+            handle = next_[handle]
+
+    @property
+    def quantity(self) -> int:
+        """
+        :return: total quantity standing at this level.
+        """
+        return self._quantity
+
+    @property
+    def head(self) -> int:
+        return self._head
+
+    def append(self, handle: int):
+        # TODO - Complexity: In O(1)
+        store = self._store
+        store.prev[handle] = self._tail
+        store.next[handle] = NIL
+        if self._tail == NIL:
+            self._head = handle
+        else:
+            store.next[self._tail] = handle
+        self._tail = handle
+        self._length += 1
+        self._quantity += store.quantity[handle]
+
+    def appendleft(self, handle: int):
+        # TODO - Complexity: In O(1)
+        store = self._store
+        store.prev[handle] = NIL
+        store.next[handle] = self._head
+        if self._head == NIL:
+            self._tail = handle
+        else:
+            store.prev[self._head] = handle
+        self._head = handle
+        self._length += 1
+        self._quantity += store.quantity[handle]
+
+    def popleft(self) -> int:
+        # TODO - Complexity: In O(1)
+        handle = self._head
+        if handle == NIL:
+            raise IndexError('pop from an empty PriceLevel')
+        store = self._store
+        self._head = store.next[handle]
+        if self._head == NIL:
+            self._tail = NIL
+        else:
+            store.prev[self._head] = NIL
+        store.next[handle] = NIL
+        self._length -= 1
+        self._quantity -= store.quantity[handle]
+        return handle
+
+    def remove(self, handle: int):
+        """
+        Unlink an order known to stand in this level.
+        :param handle:
+        :return:
+        """
+        # TODO - Complexity: In O(1), no search as the store holds the links of the order
+        store = self._store
+        prev_, next_ = store.prev[handle], store.next[handle]
+        if prev_ == NIL:
+            self._head = next_
+        else:
+            store.next[prev_] = next_
+        if next_ == NIL:
+            self._tail = prev_
+        else:
+            store.prev[next_] = prev_
+        store.prev[handle] = NIL
+        store.next[handle] = NIL
+        self._length -= 1
+        self._quantity -= store.quantity[handle]
+
+    def release(self):
+        """
+        Free the slots of all the orders of the level in the OrderStore at once, e.g. when the level is fully consumed.
+        The level is left empty.
+        """
+        # TODO - Complexity: In O(1)
+        if self._head != NIL:
+            self._store.free_chain(self._head, self._tail, self._length)
+        self._head = self._tail = NIL
+        self._length = self._quantity = 0
+
+    def set_quantity(self, handle: int, quantity: int):
+        """
+        Change in place the quantity of an order standing in this level, keeping its priority.
+        :param handle:
+        :param quantity:
+        :return:
+        """
+        self._quantity += quantity - self._store.quantity[handle]
+        self._store.quantity[handle] = quantity
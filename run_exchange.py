@@ -1,99 +1,265 @@
-"""
-Exchange simulator:
-Captures participant messages via console or file.
-We assume prices and quantities are int.
-"""
-import sys
-import argparse
-from market import Market
-
-
-def main():
-
-    parser = argparse.ArgumentParser()
-    parser.add_argument('--fleet_file', type=str, required=False, help='The path to an input file')
-    parser.add_argument('--price_increment', type=int, required=False, default=1, help='Tick Size')
-    parser.add_argument('--quantity_increment', type=int, required=False, default=1, help='Minimum change of Order quantity')
-    parser.add_argument('--min_price', type=int, required=False, help='Minimum Price')
-    parser.add_argument('--max_price', type=int, required=False, help='Maximum Price')
-    parser.add_argument('--min_quantity', type=int, required=False, help='Minimum Order quantity')
-    parser.add_argument('--max_quantity', type=int, required=False, help='Maximum Order quantity')
-    parser.add_argument('--sanity_checks', required=False, default=False, action='store_true', help='Sanity Checks')
-    parser.add_argument(
-        '--random_order_id', required=False, default=False, action='store_true',
-        help=(
-            'Order IDs can be generated using uuid strings or just an incremented int starting at 1. '
-            'If this flag is added, it will yield he former solution. If not, the latter.'
-        )
-    )
-    parser.add_argument(
-        '--interactive', required=False, default=False, action='store_true',
-        help=(
-            'Input messages via console or not. Even if a fleet file is input, '
-            'the interactive console will run after by default.'
-        )
-    )
-
-    args = parser.parse_args()
-
-    print('Opening Exchange')
-
-    if args.fleet_file:
-        run_file_exchange(args)
-
-    if args.interactive:
-        run_interactive_exchange(args)
-
-    print('Closing Exchange')
-
-def run_file_exchange(args):
-    fleet_file = args.fleet_file
-
-    market = Market(
-        interactive=False,
-        price_increment=args.price_increment,
-        quantity_increment=args.quantity_increment,
-        min_price=args.min_price,
-        max_price=args.max_price,
-        min_quantity=args.min_quantity,
-        max_quantity=args.max_quantity,
-        run_sanity_checks=args.sanity_checks,
-        is_random_order_id=args.random_order_id,
-    )
-
-    with open(fleet_file, 'r') as f:
-        for msg_str in f:
-            run_exchange(False, market, msg_str)
-
-    print(f'EP: {market.get_lob_eq_mid()}')
-
-def run_interactive_exchange(args):
-    market = Market(
-        interactive=True,
-        price_increment=args.price_increment,
-        quantity_increment=args.quantity_increment,
-        min_price=args.min_price,
-        max_price=args.max_price,
-        min_quantity=args.min_quantity,
-        max_quantity=args.max_quantity,
-        run_sanity_checks=args.sanity_checks,
-        is_random_order_id=args.random_order_id,
-    )
-    while True:
-        msg_str = input()
-        run_exchange(True, market, msg_str)
-
-
-def run_exchange(is_interactive, market, msg_str):
-    if msg_str:
-        msg = market.decode(msg_str=msg_str)
-        if msg and msg.is_init:
-            market.execute(msg)
-        else:
-            if is_interactive:
-                print('Something wrong with message input.')
-
-
-if __name__ == '__main__':
-    ret = main()
-    sys.exit(ret)
+"""
+Exchange simulator:
+Captures participant messages via console or file, either in text or binary format (see binary_message).
+We assume prices and quantities are int.
+
+NumPy and the optional components are imported once needed, so that the exchange starts without them: see
+benchmarks/bench_import.
+"""
+from __future__ import annotations
+
+import mmap
+import os
+import sys
+import argparse
+import json
+from typing import TYPE_CHECKING, Iterator
+
+import binary_message
+from market import Market
+
+if TYPE_CHECKING:
+    import numpy as np
+
+    from message_batch import MessageBatch
+
+# Number of messages decoded at once from a fleet file
+BATCH_SIZE = 1 << 14
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """
+    Arguments shared by the exchange runners: the fleet files and the parametrization of the market.
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--fleet_file', type=str, required=False, help='The path to an input file')
+    parser.add_argument(
+        '--binary_fleet_file', type=str, required=False,
+        help='The path to an input file in binary format. See binary_message to convert a text file.'
+    )
+    parser.add_argument('--price_increment', type=int, required=False, default=1, help='Tick Size')
+    parser.add_argument('--quantity_increment', type=int, required=False, default=1, help='Minimum change of Order quantity')
+    parser.add_argument('--min_price', type=int, required=False, help='Minimum Price')
+    parser.add_argument('--max_price', type=int, required=False, help='Maximum Price')
+    parser.add_argument('--min_quantity', type=int, required=False, help='Minimum Order quantity')
+    parser.add_argument('--max_quantity', type=int, required=False, help='Maximum Order quantity')
+    parser.add_argument('--sanity_checks', required=False, default=False, action='store_true', help='Sanity Checks')
+    parser.add_argument(
+        '--random_order_id', required=False, default=False, action='store_true',
+        help=(
+            'Order IDs can be generated using random hexadecimal strings or just an incremented int starting at 1. '
+            'If this flag is added, it will yield he former solution. If not, the latter.'
+        )
+    )
+    parser.add_argument(
+        '--symbols', type=str, required=False, default='',
+        help=(
+            'Comma separated symbols of the instruments, each with its own LOB. '
+            'Messages are prefixed by their symbol, e.g. AAPL:A-B-12-240, and default to an unnamed instrument.'
+        )
+    )
+    return parser
+
+
+def market_kwargs(args) -> dict:
+    """
+    :param args: parsed by build_parser
+    :return: keyword arguments of Market, but interactive
+    """
+    return dict(
+        price_increment=args.price_increment,
+        quantity_increment=args.quantity_increment,
+        min_price=args.min_price,
+        max_price=args.max_price,
+        min_quantity=args.min_quantity,
+        max_quantity=args.max_quantity,
+        run_sanity_checks=args.sanity_checks,
+        is_random_order_id=args.random_order_id,
+        symbols=[symbol for symbol in args.symbols.split(',') if symbol],
+    )
+
+
+def main():
+
+    parser = build_parser()
+    parser.add_argument(
+        '--interactive', required=False, default=False, action='store_true',
+        help=(
+            'Input messages via console or not. Even if a fleet file is input, '
+            'the interactive console will run after by default.'
+        )
+    )
+    parser.add_argument(
+        '--load_snapshot', type=str, required=False,
+        help='Restore the LOBs from a binary snapshot before the fleet files are replayed. See snapshot.'
+    )
+    parser.add_argument(
+        '--save_snapshot', type=str, required=False,
+        help='Write the LOBs in a binary snapshot once the fleet files are replayed. See snapshot.'
+    )
+    parser.add_argument(
+        '--journal', type=str, required=False,
+        help=(
+            'Append the accepted messages to this journal. On start, the journal is replayed on top of the LOBs, '
+            'from the --load_snapshot if given. See journal.'
+        )
+    )
+    parser.add_argument(
+        '--journal_group_size', type=int, required=False, default=256, help='Journal records per fsync'
+    )
+    parser.add_argument(
+        '--journal_group_interval', type=float, required=False,
+        help='Seconds after which the journal records are fsynced, whatever their number'
+    )
+    parser.add_argument(
+        '--journal_no_fsync', required=False, default=False, action='store_true',
+        help='The journal records are only written to the OS on commit, without fsync'
+    )
+    parser.add_argument(
+        '--pipeline', type=str, required=False, choices=('thread', 'process'),
+        help=(
+            'Read and decode the fleet file on a thread or in a child process, while the messages decoded so far '
+            'are matched. See pipeline.'
+        )
+    )
+    parser.add_argument(
+        '--latency_stats', type=str, required=False, nargs='?', const='-',
+        help=(
+            'Time every message and dump the latency histograms at exit, by message type and outcome. '
+            'Printed to the console, or written in JSON to the given path. See instrumentation.'
+        )
+    )
+
+    args = parser.parse_args()
+
+    print('Opening Exchange')
+
+    # The same market, i.e. the same books, is run through the fleet files and then the interactive console
+    instrumentation = None
+    if args.latency_stats:
+        from instrumentation import Instrumentation
+
+        instrumentation = Instrumentation()
+    market = Market(interactive=False, instrumentation=instrumentation, **market_kwargs(args))
+
+    journal_sequence = 0
+    if args.load_snapshot:
+        journal_sequence = market.load_snapshot(args.load_snapshot)
+
+    if args.journal:
+        from journal import Journal, replay_journal
+
+        n_records = replay_journal(market, args.journal, journal_sequence)
+        print(f'{n_records} journal records replayed')
+        market.journal = Journal(
+            args.journal, args.journal_group_size, args.journal_group_interval, not args.journal_no_fsync,
+        )
+
+    try:
+        if args.fleet_file:
+            run_file_exchange(args, market)
+
+        if args.binary_fleet_file:
+            run_binary_file_exchange(args, market)
+
+        if args.save_snapshot:
+            market.save_snapshot(args.save_snapshot)
+
+        if args.interactive:
+            run_interactive_exchange(market)
+    finally:
+        if market.journal is not None:
+            market.journal.close()
+        if instrumentation is not None:
+            dump_latency_stats(instrumentation, args.latency_stats)
+
+    print('Closing Exchange')
+
+def dump_latency_stats(instrumentation, path):
+    if path == '-':
+        print(instrumentation.to_str())
+    else:
+        with open(path, 'w') as f:
+            json.dump(instrumentation.snapshot(), f, indent=2)
+
+def print_eq_mids(market):
+    for symbol, instrument in market.instruments.items():
+        print(f'EP{" " + symbol if symbol else ""}: {market.get_lob_eq_mid(instrument)}')
+
+def iter_text_batches(fleet_file: str, market: Market) -> Iterator[MessageBatch]:
+    """
+    :return: the messages of a fleet file decoded by batches, see Market.decode_many
+    """
+    with open(fleet_file, 'r') as f:
+        while True:
+            msg_strs = f.readlines(BATCH_SIZE * 16)
+            if not msg_strs:
+                break
+            yield market.decode_many(''.join(msg_strs))
+
+
+def iter_text_records(fleet_file: str, kwargs: dict) -> Iterator[np.ndarray]:
+    """
+    Same as iter_text_batches as binary records, e.g. to be sent to another process.
+    :param kwargs: keyword arguments of the decoding Market, with the same instruments as the one processing them
+    """
+    for batch in iter_text_batches(fleet_file, Market(interactive=False, **kwargs)):
+        yield batch.to_records()
+
+
+def run_file_exchange(args, market):
+    fleet_file = args.fleet_file
+
+    # Messages are decoded and processed by batches, see Market.decode_many
+    from message_batch import MessageBatch
+    from pipeline import in_process, threaded
+
+    pipeline = getattr(args, 'pipeline', None)
+    if pipeline == 'thread':
+        batches = threaded(iter_text_batches(fleet_file, market))
+    elif pipeline == 'process':
+        # The instruments restored from a snapshot are registered in the decoding market as well
+        kwargs = dict(market_kwargs(args), symbols=[symbol for symbol in market.instruments if symbol])
+        batches = (
+            MessageBatch.from_binary(records) for records in in_process(iter_text_records, (fleet_file, kwargs))
+        )
+    else:
+        batches = iter_text_batches(fleet_file, market)
+
+    for batch in batches:
+        market.execute_batch(batch)
+
+    print_eq_mids(market)
+
+def run_binary_file_exchange(args, market):
+    with open(args.binary_fleet_file, 'rb') as f:
+        if os.fstat(f.fileno()).st_size:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer, memoryview(buffer) as records:
+                # The batches are views on the mapped file
+                step = BATCH_SIZE * binary_message.RECORD.size
+                for start in range(0, len(records), step):
+                    market.execute_batch(market.decode_many(records[start:start + step]))
+
+    print_eq_mids(market)
+
+def run_interactive_exchange(market):
+    market.interactive = True
+    print(market.get_limit_order_book().to_str())
+    while True:
+        msg_str = input()
+        run_exchange(True, market, msg_str)
+
+
+def run_exchange(is_interactive, market, msg_str):
+    if msg_str:
+        msg = market.decode(msg_str=msg_str)
+        if msg and msg.is_init:
+            market.execute(msg)
+        else:
+            if is_interactive:
+                print('Something wrong with message input.')
+
+
+if __name__ == '__main__':
+    ret = main()
+    sys.exit(ret)
@@ -0,0 +1,257 @@
+"""
+Synthetic order flow generator: an initial book followed by random flow, sampled by vectorized batches and streamed to
+a fleet file in text or binary format (see binary_message).
+
+* The initial book has --levels price levels on each side of the mid, --level_gap ticks apart, with a number of
+  orders per level drawn from --orders_per_level_distribution: bids below the mid, asks at and above it.
+* The flow mixes adds, deletes and modifies by --mix. An add is passive with a price drawn --price_distribution ticks
+  away from the mid on its side of the book, or aggressive (--aggressive_ratio) on the other side.
+* The order ids assigned by the exchange are sequential, from --first_order_id, so the generator keeps track of the
+  ids of the standing passive orders: the deletes and modifies of a batch target distinct orders standing before it,
+  and the deleted ones are dropped. A fraction --unknown_ratio targets ids never assigned. The orders filled by the
+  aggressive ones are not simulated, their deletes and modifies are rejected by the exchange.
+
+$ python -m scripts.gen_order_flow --output test_data/flow.txt --messages 1000000 --seed 0
+$ python -m scripts.gen_order_flow --output flow.bin --format binary --messages 50000000 --levels 100 \
+    --orders_per_level 2000
+"""
+import argparse
+import sys
+import time
+from itertools import chain
+from typing import Iterator, Tuple
+
+import numpy as np
+
+from binary_message import ADD, DELETE, MODIFY
+from message_batch import MessageBatch
+
+BUY = 0
+SELL = 1
+
+# Ids above it are never assigned by the exchange
+UNKNOWN_ORDER_ID_BASE = 1 << 40
+
+BATCH_SIZE = 1 << 16
+
+# ASCII digits of 0000 to 9999, and the powers of 10 of the digits of a uint64 and of its groups of 4 digits
+# The 4 digits of a group are read as one uint32
+_DIGITS_BY_GROUP = (
+    (np.arange(10000)[:, None] // np.array([1000, 100, 10, 1]) % 10 + ord('0')).astype(np.uint8).view(np.uint32).ravel()
+)
+_DIGIT_POWERS = np.uint64(10) ** np.arange(19, -1, -1, dtype=np.uint64)
+_GROUP_POWERS = np.uint64(10000) ** np.arange(4, -1, -1, dtype=np.uint64)
+
+
+def sample_quantities(rng: np.random.Generator, args, size: int) -> np.ndarray:
+    quantities = np.rint(args.quantity_mean / 2 + np.abs(rng.normal(0, args.quantity_std, size))).astype(np.int64)
+    quantities -= quantities % args.quantity_increment
+    return np.maximum(quantities, args.quantity_increment)
+
+
+def sample_distances(rng: np.random.Generator, args, size: int) -> np.ndarray:
+    """
+    :return: distance of the prices to the mid, in ticks
+    """
+    if args.price_distribution == 'geometric':
+        return rng.geometric(1. / args.price_scale, size) - 1
+    if args.price_distribution == 'uniform':
+        return rng.integers(0, args.price_scale, size)
+    # normal
+    return np.abs(np.rint(rng.normal(0, args.price_scale, size))).astype(np.int64)
+
+
+def sample_orders_per_level(rng: np.random.Generator, args, size: int) -> np.ndarray:
+    if args.orders_per_level_distribution == 'constant':
+        return np.full(size, args.orders_per_level, dtype=np.int64)
+    if args.orders_per_level_distribution == 'poisson':
+        return rng.poisson(args.orders_per_level, size)
+    # geometric
+    return rng.geometric(1. / args.orders_per_level, size)
+
+
+def prices_of(args, sides: np.ndarray, distances: np.ndarray) -> np.ndarray:
+    """
+    :return: bids distance + 1 ticks below the mid, asks distance ticks above it, at least one tick
+    """
+    ticks = np.where(sides == BUY, -1 - distances, distances)
+    return np.maximum(args.mid + ticks * args.price_increment, args.price_increment)
+
+
+def initial_book(rng: np.random.Generator, args) -> MessageBatch:
+    """
+    :return: the adds of the initial book, bids from the worst level to the best one, then asks from the best level
+    """
+    level_ticks = np.arange(args.levels, dtype=np.int64) * args.level_gap
+    sides = np.repeat([BUY, SELL], args.levels)
+    distances = np.concatenate((level_ticks[::-1], level_ticks))
+    counts = sample_orders_per_level(rng, args, 2 * args.levels)
+    sides = np.repeat(sides, counts)
+    prices = np.repeat(prices_of(args, np.repeat([BUY, SELL], args.levels), distances), counts)
+    n_orders = len(prices)
+    return MessageBatch(
+        np.full(n_orders, ADD, dtype=np.uint8),
+        sides.astype(np.uint8),
+        np.zeros(n_orders, dtype=np.uint32),
+        sample_quantities(rng, args, n_orders),
+        prices.astype(np.int64),
+        np.zeros(n_orders, dtype=np.uint64),
+    )
+
+
+def order_flow(rng: np.random.Generator, args, live: np.ndarray, next_order_id: int) -> Iterator[MessageBatch]:
+    """
+    :param live: ids of the standing orders
+    :param next_order_id: id the exchange assigns to the next add
+    :return: batches of at most BATCH_SIZE messages, --messages in total
+    """
+    mix = np.array(args.mix, dtype=np.float64)
+    done = 0
+    while done < args.messages:
+        size = min(BATCH_SIZE, args.messages - done)
+        done += size
+
+        msg_types = rng.choice(np.array([ADD, DELETE, MODIFY], dtype=np.uint8), size, p=mix / mix.sum())
+        # The deletes and modifies beyond the standing orders become adds
+        targeting = np.flatnonzero(msg_types != ADD)
+        msg_types[targeting[len(live):]] = ADD
+        targeting = targeting[:len(live)]
+        is_add = msg_types == ADD
+
+        sides = np.where(is_add, rng.integers(0, 2, size), 0)
+        is_aggressive = is_add & (rng.random(size) < args.aggressive_ratio)
+        # An aggressive order is priced on the other side of the book
+        price_sides = np.where(is_aggressive, 1 - sides, sides)
+        prices = np.where(is_add, prices_of(args, price_sides, sample_distances(rng, args, size)), 0)
+        quantities = np.where(msg_types == DELETE, 0, sample_quantities(rng, args, size))
+
+        order_ids = np.zeros(size, dtype=np.uint64)
+        picked = rng.choice(len(live), len(targeting), replace=False) if len(targeting) else np.empty(0, np.int64)
+        is_unknown = rng.random(len(targeting)) < args.unknown_ratio
+        order_ids[targeting] = np.where(
+            is_unknown, UNKNOWN_ORDER_ID_BASE + rng.integers(0, UNKNOWN_ORDER_ID_BASE, len(targeting)), live[picked],
+        )
+
+        # The ids assigned to the adds, in arrival order. Only the passive ones are expected to stand.
+        add_ids = next_order_id + np.cumsum(is_add)[is_add] - 1
+        next_order_id += len(add_ids)
+        is_deleted = np.zeros(len(live), dtype=bool)
+        is_deleted[picked[(msg_types[targeting] == DELETE) & ~is_unknown]] = True
+        live = np.concatenate((live[~is_deleted], add_ids[~is_aggressive[is_add]].astype(np.uint64)))
+
+        yield MessageBatch(
+            msg_types, sides.astype(np.uint8), np.zeros(size, dtype=np.uint32), quantities.astype(np.int64),
+            prices.astype(np.int64), order_ids,
+        )
+
+
+def _digits(values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    :param values: non-negative ints
+    :return: ASCII decimal digits of each value, right-aligned on the longest one, and the mask of its digits
+    """
+    values = values.astype(np.uint64)
+    n_groups = -(-len(str(int(values.max()))) // 4)
+    # The digits are looked up by groups of 4, a division per group instead of one per digit
+    groups = values[:, None] // _GROUP_POWERS[-n_groups:] % np.uint64(10000)
+    digits = _DIGITS_BY_GROUP.take(groups).view(np.uint8)
+    # The leading zeros are masked out, the units kept
+    mask = values[:, None] >= _DIGIT_POWERS[-4 * n_groups:]
+    mask[:, -1] = True
+    return digits, mask
+
+
+def to_text(batch: MessageBatch) -> bytes:
+    """
+    The lines are laid out in a matrix of ASCII bytes, one row per message and a block of columns per field, each
+    field formatted as a whole column. The bytes of a row outside its fields, or before the first digit of a number,
+    are masked out, so that the lines are read at once from the matrix, without formatting any message on its own.
+    :return: the messages in text format, one per line, with sequential order ids, as ASCII bytes
+    """
+    if not len(batch):
+        return b''
+    is_add = batch.msg_type == ADD
+    is_delete = batch.msg_type == DELETE
+    is_modify = ~(is_add | is_delete)
+    order_ids, order_id_mask = _digits(batch.order_id)
+    quantities, quantity_mask = _digits(batch.quantity)
+    prices, price_mask = _digits(batch.price)
+
+    # A-B-quantity-price, D-order_id or M-order_id-quantity: the msg type is the ASCII code of its letter
+    widths = (2, 2, order_ids.shape[1], 1, quantities.shape[1], 1, prices.shape[1], 1)
+    chars = np.empty((len(batch), sum(widths)), dtype=np.uint8)
+    mask = np.empty(chars.shape, dtype=bool)
+    msg_type, side, order_id, modify_dash, quantity, add_dash, price, newline = (
+        slice(stop - width, stop) for width, stop in zip(widths, np.cumsum(widths).tolist())
+    )
+    chars[:, msg_type.start] = batch.msg_type
+    chars[:, side.start] = np.where(batch.side == BUY, ord('B'), ord('S'))
+    chars[:, [msg_type.start + 1, side.start + 1, modify_dash.start, add_dash.start]] = ord('-')
+    chars[:, order_id] = order_ids
+    chars[:, quantity] = quantities
+    chars[:, price] = prices
+    chars[:, newline] = ord('\n')
+    mask[:, msg_type] = True
+    mask[:, side] = is_add[:, None]
+    mask[:, order_id] = order_id_mask & ~is_add[:, None]
+    mask[:, modify_dash] = is_modify[:, None]
+    mask[:, quantity] = quantity_mask & ~is_delete[:, None]
+    mask[:, add_dash] = is_add[:, None]
+    mask[:, price] = price_mask & is_add[:, None]
+    mask[:, newline] = True
+    return np.compress(mask.ravel(), chars.ravel()).tobytes()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--output', type=str, required=True, help='Fleet file, overwritten')
+    parser.add_argument('--format', type=str, required=False, default='text', choices=('text', 'binary'))
+    parser.add_argument('--messages', type=int, required=False, default=1000000, help='Messages after the book')
+    parser.add_argument('--seed', type=int, required=False)
+    parser.add_argument('--mid', type=int, required=False, default=1000)
+    parser.add_argument('--price_increment', type=int, required=False, default=1, help='Tick Size')
+    parser.add_argument('--quantity_increment', type=int, required=False, default=1)
+    parser.add_argument('--quantity_mean', type=float, required=False, default=50.)
+    parser.add_argument('--quantity_std', type=float, required=False, default=10.)
+    parser.add_argument('--levels', type=int, required=False, default=100, help='Levels of each side of the book')
+    parser.add_argument('--level_gap', type=int, required=False, default=1, help='Ticks between two book levels')
+    parser.add_argument('--orders_per_level', type=float, required=False, default=100, help='Mean orders per level')
+    parser.add_argument(
+        '--orders_per_level_distribution', type=str, required=False, default='constant',
+        choices=('constant', 'poisson', 'geometric'),
+    )
+    parser.add_argument(
+        '--price_distribution', type=str, required=False, default='geometric',
+        choices=('geometric', 'uniform', 'normal'), help='Distance of the flow prices to the mid',
+    )
+    parser.add_argument(
+        '--price_scale', type=float, required=False, default=10.,
+        help='Ticks: mean of the geometric distance, bound of the uniform one, std of the normal one',
+    )
+    parser.add_argument(
+        '--mix', type=float, nargs=3, required=False, default=(0.5, 0.3, 0.2), metavar=('ADD', 'DELETE', 'MODIFY'),
+        help='Weights of the message types of the flow',
+    )
+    parser.add_argument('--aggressive_ratio', type=float, required=False, default=0.05)
+    parser.add_argument('--unknown_ratio', type=float, required=False, default=0.01)
+    parser.add_argument(
+        '--first_order_id', type=int, required=False, default=2,
+        help='Id assigned to the first add, 2 for a Market with sequential order ids',
+    )
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    start = time.perf_counter()
+    n_msgs = 0
+    book = initial_book(rng, args)
+    live = np.arange(args.first_order_id, args.first_order_id + len(book), dtype=np.uint64)
+    with open(args.output, 'wb') as f:
+        for batch in chain([book], order_flow(rng, args, live, args.first_order_id + len(book))):
+            f.write(to_text(batch) if args.format == 'text' else batch.to_records().tobytes())
+            n_msgs += len(batch)
+    elapsed = time.perf_counter() - start
+    print(f'{n_msgs} messages written to {args.output} in {elapsed:.2f}s -> {n_msgs / elapsed:.0f} msgs/s')
+
+
+if __name__ == '__main__':
+    sys.exit(main())
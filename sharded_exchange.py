@@ -0,0 +1,210 @@
+"""
+Sharded exchange simulator:
+The books of different instruments never interact, so the instruments are spread over a pool of worker processes,
+each one running a Market with the LOBs of its instruments.
+
+The front-end process reads the fleet file by chunks and turns them into binary records (see binary_message).
+The records of each worker are forwarded in batches through shared memory: every worker owns a SharedMemory block
+of N_SLOTS slots of BATCH_SIZE records. The front-end copies a batch into a free slot of the worker and sends the
+slot index on its task queue; the worker hands the slot back on its free queue once the batch is processed.
+Only slot indices go through the pipes of the queues, and the front-end waits for a free slot when a worker lags.
+A worker which dies makes the front-end raise instead of waiting for it forever.
+
+An instrument is always routed to the same worker (instrument id modulo the number of workers), and each worker
+processes its slots in arrival order, hence the order of the messages of an instrument is preserved.
+
+$ python ./sharded_exchange.py --fleet_file test_data/test_1.txt --workers 4
+"""
+import multiprocessing as mp
+import os
+import queue
+import sys
+import time
+from itertools import islice
+from multiprocessing import shared_memory
+from typing import Dict, Iterator, List, Tuple
+
+import numpy as np
+
+import binary_message
+from market import Market
+from message_batch import RECORD_DTYPE
+from run_exchange import BATCH_SIZE, build_parser, market_kwargs
+
+# Number of batches a worker can be behind the front-end
+N_SLOTS = 4
+SLOT_SIZE = BATCH_SIZE * binary_message.RECORD.size
+
+# Period at which the front-end checks whether the workers it waits for are still alive, in seconds
+_POLL_INTERVAL = 0.1
+
+
+def shard_of(instruments: np.ndarray, n_workers: int) -> np.ndarray:
+    """
+    :param instruments: instrument ids
+    :return: index of the worker of each instrument
+    """
+    return instruments % n_workers
+
+
+def run_worker(worker: int, n_workers: int, kwargs: dict, shm_name: str, tasks, free_slots, results):
+    """
+    Processes the batches of its instruments until it gets None, then sends its statistics on the results queue:
+    (worker, number of messages, busy time, EP by symbol of its instruments)
+    """
+    shm = shared_memory.SharedMemory(name=shm_name)
+    market = Market(interactive=False, **kwargs)
+    n_msgs = 0
+    busy = 0.
+    try:
+        while True:
+            task = tasks.get()
+            if task is None:
+                break
+            start = time.perf_counter()
+            slot, n_records = task
+            offset = slot * SLOT_SIZE
+            # The batch is decoded in place from the slot, the LOBs copy the fields they keep
+            market.execute_batch(market.decode_many(shm.buf[offset:offset + n_records * binary_message.RECORD.size]))
+            free_slots.put(slot)
+            n_msgs += n_records
+            busy += time.perf_counter() - start
+
+        eq_mids = {
+            symbol: market.get_lob_eq_mid(instrument)
+            for symbol, instrument in market.instruments.items() if instrument % n_workers == worker
+        }
+        results.put((worker, n_msgs, busy, eq_mids))
+    finally:
+        shm.close()
+
+
+def _get(items, processes: List):
+    """
+    items.get, which raises a RuntimeError once one of the processes died instead of blocking forever
+    """
+    failed = None
+    while True:
+        try:
+            return items.get(timeout=_POLL_INTERVAL)
+        except queue.Empty:
+            # The items put before the exit of a worker are flushed to the pipe: one more poll gets them
+            if failed is not None:
+                raise RuntimeError(f'Worker process {failed.name} exited with code {failed.exitcode}')
+            failed = next((process for process in processes if process.exitcode not in (None, 0)), None)
+
+
+def iter_text_records(fleet_file: str, kwargs: dict) -> Iterator[np.ndarray]:
+    # The front-end market only decodes, with the same registry of instruments as the workers
+    market = Market(interactive=False, **kwargs)
+    with open(fleet_file, 'r') as f:
+        while True:
+            msg_strs = list(islice(f, BATCH_SIZE))
+            if not msg_strs:
+                break
+            yield market.decode_many(''.join(msg_strs)).to_records()
+
+
+def iter_binary_records(binary_fleet_file: str) -> Iterator[np.ndarray]:
+    with open(binary_fleet_file, 'rb') as f:
+        while True:
+            chunk = f.read(SLOT_SIZE)
+            if not chunk:
+                break
+            yield np.frombuffer(chunk, dtype=RECORD_DTYPE)
+
+
+def run_sharded_exchange(chunks: Iterator[np.ndarray], n_workers: int, kwargs: dict) -> Tuple[int, float, List]:
+    """
+    :param chunks: binary records of at most BATCH_SIZE messages, in arrival order
+    :param n_workers:
+    :param kwargs: keyword arguments of Market, see run_exchange.market_kwargs
+    :return: number of messages, elapsed wall time and statistics of each worker, see run_worker
+    """
+    ctx = mp.get_context()
+    shms = [shared_memory.SharedMemory(create=True, size=N_SLOTS * SLOT_SIZE) for _ in range(n_workers)]
+    tasks = [ctx.Queue() for _ in range(n_workers)]
+    free_slots = [ctx.Queue() for _ in range(n_workers)]
+    results = ctx.Queue()
+    workers = [
+        ctx.Process(
+            target=run_worker, args=(worker, n_workers, kwargs, shms[worker].name, tasks[worker],
+                                     free_slots[worker], results),
+            name=f'worker-{worker}', daemon=True,
+        )
+        for worker in range(n_workers)
+    ]
+    try:
+        for queue in free_slots:
+            for slot in range(N_SLOTS):
+                queue.put(slot)
+        for process in workers:
+            process.start()
+
+        start = time.perf_counter()
+        n_msgs = 0
+        for records in chunks:
+            n_msgs += len(records)
+            shards = shard_of(records['instrument'], n_workers)
+            for worker in range(n_workers):
+                batch = records[shards == worker] if n_workers > 1 else records
+                if not len(batch):
+                    continue
+                # Blocks while the worker has no free slot
+                slot = _get(free_slots[worker], [workers[worker]])
+                slot_records = np.ndarray(
+                    (len(batch),), dtype=RECORD_DTYPE, buffer=shms[worker].buf, offset=slot * SLOT_SIZE,
+                )
+                slot_records[:] = batch
+                del slot_records
+                tasks[worker].put((slot, len(batch)))
+
+        for queue in tasks:
+            queue.put(None)
+        stats = sorted(_get(results, workers) for _ in workers)
+        elapsed = time.perf_counter() - start
+
+        for process in workers:
+            process.join()
+        return n_msgs, elapsed, stats
+    finally:
+        # The workers are still running if the front-end failed
+        for process in workers:
+            if process.is_alive():
+                process.terminate()
+                process.join()
+        for shm in shms:
+            shm.close()
+            shm.unlink()
+
+
+def main():
+    parser = build_parser()
+    parser.add_argument(
+        '--workers', type=int, required=False, default=os.cpu_count(), help='Number of worker processes'
+    )
+    args = parser.parse_args()
+    kwargs = market_kwargs(args)
+
+    print('Opening Exchange')
+
+    if args.fleet_file:
+        report(*run_sharded_exchange(iter_text_records(args.fleet_file, kwargs), args.workers, kwargs))
+
+    if args.binary_fleet_file:
+        report(*run_sharded_exchange(iter_binary_records(args.binary_fleet_file), args.workers, kwargs))
+
+    print('Closing Exchange')
+
+
+def report(n_msgs: int, elapsed: float, stats: List[Tuple[int, int, float, Dict]]):
+    print(f'{n_msgs} messages in {elapsed:.3f}s -> {n_msgs / elapsed:.0f} msgs/s over {len(stats)} workers')
+    for worker, worker_n_msgs, busy, eq_mids in stats:
+        print(f'Worker {worker}: {worker_n_msgs} messages, {busy:.3f}s busy')
+        for symbol, eq_mid in eq_mids.items():
+            print(f'EP{" " + symbol if symbol else ""}: {eq_mid}')
+
+
+if __name__ == '__main__':
+    ret = main()
+    sys.exit(ret)
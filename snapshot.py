@@ -0,0 +1,222 @@
+"""
+Binary snapshot of the LOBs of a Market, restored in bulk instead of replaying the fleet file.
+
+The file starts with a header, little-endian:
+| magic: 8 bytes | version: uint32 | number of books: uint32 | journal sequence: uint64 |
+then a section per book:
+| book header, see BOOK_HEADER | symbol, padded to 8 bytes |
+| price levels: (price: int64, number of orders: int64, quantity: int64), bids then asks, best price first |
+| orders: (order id: uint64, quantity: int64), level by level, by priority within a level |
+
+The side and price of an order are those of its level. The book header holds the parametrization of the LOB,
+its top of the book and the state of its order id allocator, so that the restored LOB allocates the same ids.
+The fills already recorded are not part of the snapshot. The journal sequence is the sequence number of the next
+record of the journal when the snapshot was taken, from which the journal is replayed on top of it (see journal).
+
+The file is memory-mapped on restore: the columns of the OrderStore and the links of the level queues are computed
+by NumPy from the mapped arrays, so that no Python object is created per order but its entry in the hash table.
+"""
+import mmap
+import struct
+from typing import BinaryIO, Callable, List, Optional, Tuple
+
+import numpy as np
+from sortedcontainers import SortedDict
+
+from fill_report import FillReport
+from limit_order_book import BUY, SELL, LimitOrderBook
+from order_id import RandomOrderIdAllocator
+from order_store import NIL, OrderStore
+from price_level import PriceLevel
+
+MAGIC = b'LOBSNAP\x00'
+VERSION = 2
+FILE_HEADER = struct.Struct('<8sIIQ')
+
+# symbol length, flags, price increment, quantity increment, min price, max price, high bid, low ask,
+# order id counter, order id key, number of bid levels, number of ask levels, number of orders
+BOOK_HEADER = struct.Struct('<IIqqqqqqQQQQQ')
+
+# Flags of the book header
+UNBOUNDED = 1  # max_price is infinite
+NO_LOW_ASK = 2  # low_ask is infinite
+RANDOM_ORDER_IDS = 4
+DENSE_LADDER = 8
+
+LEVEL_DTYPE = np.dtype([('price', '<i8'), ('n_orders', '<i8'), ('quantity', '<i8')])
+ORDER_DTYPE = np.dtype([('order_id', '<u8'), ('quantity', '<i8')])
+
+
+def _padded(size: int) -> int:
+    return (size + 7) & ~7
+
+
+def _read_symbol(buffer, offset: int) -> str:
+    symbol_length = BOOK_HEADER.unpack_from(buffer, offset)[0]
+    offset += BOOK_HEADER.size
+    return bytes(buffer[offset:offset + symbol_length]).decode()
+
+
+def _levels(orderbook_side) -> List[Tuple[int, PriceLevel]]:
+    # The items of both the SortedDict and the PriceLadder are sorted from the best price
+    return list(orderbook_side.items())
+
+
+def write_book(f: BinaryIO, symbol: str, lob: LimitOrderBook):
+    """
+    Write the section of one LOB.
+    """
+    # TODO - Complexity: In O(m), each queue is walked once
+    store = lob._orders
+    order_id_column, quantity_column, next_column = store.order_id, store.quantity, store.next
+
+    sides = (_levels(lob._orders_by_bids), _levels(lob._orders_by_asks))
+    levels = np.array(
+        [(price, len(price_level), price_level.quantity) for side in sides for price, price_level in side],
+        dtype=LEVEL_DTYPE,
+    )
+    orders = np.empty(len(lob._order_by_ids), dtype=ORDER_DTYPE)
+    order_ids, quantities = orders['order_id'], orders['quantity']
+    idx = 0
+    for side in sides:
+        for _, price_level in side:
+            handle = price_level.head
+            while handle != NIL:
+                order_ids[idx] = order_id_column[handle]
+                quantities[idx] = quantity_column[handle]
+                idx += 1
+                handle = next_column[handle]
+
+    flags = 0
+    if np.isinf(lob._max_price):
+        flags |= UNBOUNDED
+    if np.isinf(lob._low_ask):
+        flags |= NO_LOW_ASK
+    if lob._is_dense_ladder:
+        flags |= DENSE_LADDER
+    allocator = lob.order_ids
+    if isinstance(allocator, RandomOrderIdAllocator):
+        flags |= RANDOM_ORDER_IDS
+        counter, key = allocator.count, allocator.key
+    else:
+        counter, key = allocator.last, 0
+
+    symbol_bytes = symbol.encode()
+    f.write(BOOK_HEADER.pack(
+        len(symbol_bytes), flags, lob._price_increment, lob._quantity_increment, lob._min_price,
+        0 if flags & UNBOUNDED else lob._max_price, lob._high_bid, 0 if flags & NO_LOW_ASK else lob._low_ask,
+        counter, key, len(sides[0]), len(sides[1]), len(orders),
+    ))
+    f.write(symbol_bytes.ljust(_padded(len(symbol_bytes)), b'\x00'))
+    f.write(levels.tobytes())
+    f.write(orders.tobytes())
+
+
+def read_book(
+        buffer, offset: int, instrument: int = 0, fills: Optional[FillReport] = None,
+) -> Tuple[str, LimitOrderBook, int]:
+    """
+    Restore the LOB of the section at offset.
+    :param buffer: the snapshot file, e.g. memory-mapped
+    :param instrument: id of the instrument of the restored LOB
+    :param fills: FillReport of the restored LOB, a new one if None
+    :return: symbol, LOB and offset of the next section
+    """
+    # TODO - Complexity: In O(m) vectorized, plus the hash table of the order ids
+    (
+        symbol_length, flags, price_increment, quantity_increment, min_price, max_price, high_bid, low_ask,
+        counter, key, n_bid_levels, n_ask_levels, n_orders,
+    ) = BOOK_HEADER.unpack_from(buffer, offset)
+    offset += BOOK_HEADER.size
+    symbol = bytes(buffer[offset:offset + symbol_length]).decode()
+    offset += _padded(symbol_length)
+    n_levels = n_bid_levels + n_ask_levels
+    levels = np.frombuffer(buffer, dtype=LEVEL_DTYPE, count=n_levels, offset=offset)
+    offset += levels.nbytes
+    orders = np.frombuffer(buffer, dtype=ORDER_DTYPE, count=n_orders, offset=offset)
+    offset += orders.nbytes
+
+    lob = LimitOrderBook(
+        price_increment=price_increment,
+        quantity_increment=quantity_increment,
+        min_price=min_price,
+        max_price=np.inf if flags & UNBOUNDED else max_price,
+        order_id_count=counter,
+        dense_ladder=bool(flags & DENSE_LADDER),
+        instrument=instrument,
+        fills=fills,
+    )
+    if flags & RANDOM_ORDER_IDS:
+        lob._order_ids = RandomOrderIdAllocator(key=key, count=counter)
+    lob._high_bid = high_bid
+    lob._low_ask = np.inf if flags & NO_LOW_ASK else low_ask
+
+    # The orders take the slots 0 to n - 1, in the order of the file: each level is a run of consecutive handles
+    n_orders_by_level = levels['n_orders']
+    stops = np.cumsum(n_orders_by_level)
+    starts = stops - n_orders_by_level
+    handles = np.arange(n_orders, dtype=np.int64)
+    next_ = handles + 1
+    next_[stops[n_orders_by_level > 0] - 1] = NIL
+    prev = handles - 1
+    prev[starts[n_orders_by_level > 0]] = NIL
+    sides = np.repeat(np.array([BUY] * n_bid_levels + [SELL] * n_ask_levels, dtype=np.int8), n_orders_by_level)
+    prices = np.repeat(levels['price'], n_orders_by_level)
+
+    # The columns are converted to the native byte order of the typed arrays
+    store = OrderStore.from_columns(
+        orders['order_id'].astype(np.uint64).tobytes(), sides.tobytes(), orders['quantity'].astype(np.int64).tobytes(),
+        prices.astype(np.int64).tobytes(), prev.tobytes(), next_.tobytes(),
+    )
+    lob._orders = store
+    lob._order_by_ids = dict(zip(orders['order_id'].tolist(), range(n_orders)))
+
+    price_levels = [
+        (price, PriceLevel.from_queue(store, start, stop - 1, n_orders_, quantity))
+        for (price, n_orders_, quantity), start, stop in zip(levels.tolist(), starts.tolist(), stops.tolist())
+    ]
+    for orderbook_side, side_levels in (
+            (lob._orders_by_bids, price_levels[:n_bid_levels]), (lob._orders_by_asks, price_levels[n_bid_levels:]),
+    ):
+        if isinstance(orderbook_side, SortedDict):
+            orderbook_side.update(side_levels)
+        else:  # PriceLadder
+            for price, price_level in side_levels:
+                orderbook_side[price] = price_level
+    del levels, orders
+    return symbol, lob, offset
+
+
+def save_snapshot(path: str, books: List[Tuple[str, LimitOrderBook]], journal_sequence: int = 0):
+    """
+    :param path:
+    :param books: (symbol, LOB) of each instrument, by instrument id
+    :param journal_sequence: sequence number of the first record of the journal not applied to the books
+    """
+    with open(path, 'wb') as f:
+        f.write(FILE_HEADER.pack(MAGIC, VERSION, len(books), journal_sequence))
+        for symbol, lob in books:
+            write_book(f, symbol, lob)
+
+
+def load_snapshot(
+        path: str, fills: Optional[FillReport] = None, instrument_of: Optional[Callable[[str], int]] = None,
+) -> Tuple[List[Tuple[str, LimitOrderBook]], int]:
+    """
+    :param path:
+    :param fills: FillReport shared by the restored LOBs, one per LOB if None
+    :param instrument_of: id of the instrument of a symbol, given to its restored LOB. Its rank in the snapshot if None.
+    :return: (symbol, LOB) of each instrument, in the order of the snapshot, and the journal sequence
+    """
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+        magic, version, n_books, journal_sequence = FILE_HEADER.unpack_from(buffer, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f'{path} is not a LOB snapshot of version {VERSION}')
+        offset = FILE_HEADER.size
+        books = []
+        for instrument in range(n_books):
+            if instrument_of is not None:
+                instrument = instrument_of(_read_symbol(buffer, offset))
+            symbol, lob, offset = read_book(buffer, offset, instrument, fills)
+            books.append((symbol, lob))
+        return books, journal_sequence
@@ -0,0 +1,177 @@
+"""
+Stop and stop-limit orders of a LOB, pending in a trigger book until a trade reaches their stop price:
+* a buy stop is triggered by a trade at or above its stop price, a sell stop by a trade at or below it
+* once triggered, a stop order is sent to the LOB as a market order, a stop-limit order as a limit order at its limit
+  price (see OrderType)
+
+The pending stops of each side are kept in a SortedDict by stop price, the buy stops lowest stop price first and
+the sell stops highest stop price first, so that the stops crossed by the trades of a message are a prefix of each
+side: they are found by bisection and released at once, without scanning the stops left pending.
+
+The matching of a LOB sweeps the levels best price first, so the trades of one message span the prices between its
+first and last fill: the buy stops up to the highest of both and the sell stops down to the lowest one are released.
+The released stops are processed in a deterministic order: the buy stops first, lowest stop price first, then the
+sell stops, highest stop price first, the stops of a same stop price in arrival order. The trades of a triggered
+order may release more stops in turn, processed after the ones already released.
+
+A stop is only triggered by the trades of the messages processed through the trigger book after it was added.
+The trigger book is neither journaled nor part of the snapshots: the orders it releases are processed by the LOB as
+any other add.
+"""
+import math
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+from sortedcontainers import SortedDict
+
+from limit_order_book import LimitOrderBook
+from message import Message, AddMessage
+from order_side import OrderSide
+from order_type import OrderType
+
+# Quantity and limit price of a pending stop by stop id, in arrival order, at one stop price
+StopLevel = Dict[int, Tuple[int, Optional[int]]]
+
+
+class TriggerBook:
+    """
+    Pending stops of one LOB, which triggers them on the trades of the messages it processes.
+    """
+
+    def __init__(self, limit_order_book: LimitOrderBook):
+        self._limit_order_book: LimitOrderBook = limit_order_book
+        # TODO - Complexity:
+        #  A SortedDict of the stop levels by stop price on each side, the crossed stop prices being a prefix of it:
+        #  found by bisection in O(log(n)) and released in O(#triggered), n being the number of stop prices.
+        #  Hash Table of the side and stop price by stop id, to cancel a stop in O(1) plus the deletion of its emptied
+        #  stop level in O(log(n)).
+        self._buy_stops: SortedDict[int, StopLevel] = SortedDict()
+        self._sell_stops: SortedDict[int, StopLevel] = SortedDict(lambda n: -n)  # Reversed order
+        self._stop_by_ids: Dict[int, Tuple[OrderSide, int]] = {}
+        # Lowest buy stop price and highest sell stop price: a trade between them triggers nothing, checked in O(1)
+        self._low_buy_stop: int = math.inf
+        self._high_sell_stop: int = -math.inf
+        self._next_stop_id: int = 1
+        # Stop id and result of each triggered stop, until drained
+        self._triggered: List[Tuple[int, Optional[int]]] = []
+
+    def __len__(self) -> int:
+        """
+        :return: number of pending stops
+        """
+        return len(self._stop_by_ids)
+
+    @property
+    def limit_order_book(self) -> LimitOrderBook:
+        return self._limit_order_book
+
+    def add_stop(self, side: OrderSide, quantity: int, stop_price: int, limit_price: Optional[int] = None) -> int:
+        """
+        :param limit_price: price of the limit order sent once triggered, a market order is sent if None
+        :return: id of the stop, only known by the trigger book: the triggered order is assigned an order id by the
+            LOB
+        """
+        # TODO - Complexity: In O(log(n)) for a new stop price, else in O(1)
+        stops = self._buy_stops if side == OrderSide.BUY else self._sell_stops
+        stop_level = stops.get(stop_price)
+        if stop_level is None:
+            stop_level = stops[stop_price] = {}
+        stop_id = self._next_stop_id
+        self._next_stop_id += 1
+        stop_level[stop_id] = (quantity, limit_price)
+        self._stop_by_ids[stop_id] = (side, stop_price)
+        if side == OrderSide.BUY:
+            self._low_buy_stop = min(self._low_buy_stop, stop_price)
+        else:  # side == OrderSide.SELL
+            self._high_sell_stop = max(self._high_sell_stop, stop_price)
+        return stop_id
+
+    def cancel_stop(self, stop_id: int) -> Optional[int]:
+        """
+        :return: stop_id if the stop was pending, else None
+        """
+        if stop_id not in self._stop_by_ids:
+            return None
+        side, stop_price = self._stop_by_ids.pop(stop_id)
+        stops = self._buy_stops if side == OrderSide.BUY else self._sell_stops
+        stop_level = stops[stop_price]
+        del stop_level[stop_id]
+        if not stop_level:
+            del stops[stop_price]
+            self._reset_boundaries()
+        return stop_id
+
+    def _reset_boundaries(self):
+        self._low_buy_stop = self._buy_stops.peekitem(0)[0] if self._buy_stops else math.inf
+        self._high_sell_stop = self._sell_stops.peekitem(0)[0] if self._sell_stops else -math.inf
+
+    def process(self, msg: Message) -> Optional[int]:
+        """
+        LimitOrderBook.process, then the stops triggered by its trades, and by the trades of the triggered orders,
+        are processed by the LOB in turn, see drain_triggered.
+        :return: result of the message, as returned by LimitOrderBook.process
+        """
+        limit_order_book = self._limit_order_book
+        fills = limit_order_book.fills
+        sequence = fills.sequence
+        ret = limit_order_book.process(msg)
+        if fills.sequence == sequence or not self._is_crossed():
+            return ret
+
+        pending: Deque[Tuple[int, OrderSide, int, Optional[int]]] = deque()
+        self._release(pending)
+        while pending:
+            stop_id, side, quantity, limit_price = pending.popleft()
+            if limit_price is None:
+                order = AddMessage.from_fields(side, quantity, 0, OrderType.MARKET)
+            else:
+                order = AddMessage.from_fields(side, quantity, limit_price)
+            sequence = fills.sequence
+            self._triggered.append((stop_id, limit_order_book.process(order)))
+            if fills.sequence != sequence and self._is_crossed():
+                self._release(pending)
+        return ret
+
+    def _trade_prices(self) -> Tuple[int, int]:
+        """
+        :return: lowest and highest price of the fills of the last message which traded, its first and last ones
+        """
+        first_price, last_price = self._limit_order_book.last_trade_prices
+        return (first_price, last_price) if first_price <= last_price else (last_price, first_price)
+
+    def _is_crossed(self) -> bool:
+        """
+        :return: True if the fills of the last message which traded trigger any stop
+        """
+        # TODO - Complexity: In O(1)
+        low_price, high_price = self._trade_prices()
+        return high_price >= self._low_buy_stop or low_price <= self._high_sell_stop
+
+    def _release(self, pending: Deque[Tuple[int, OrderSide, int, Optional[int]]]):
+        """
+        Move the stops crossed by the fills of the last message which traded to pending, in trigger order.
+        """
+        # TODO - Complexity: In O(log(n) + #triggered)
+        low_price, high_price = self._trade_prices()
+        # The buy stops up to the highest trade price, then the sell stops down to the lowest one
+        for side, stops, trade_price in (
+                (OrderSide.BUY, self._buy_stops, high_price),
+                (OrderSide.SELL, self._sell_stops, low_price),
+        ):
+            n_crossed = stops.bisect_right(trade_price)
+            if not n_crossed:
+                continue
+            for stop_level in stops.values()[:n_crossed]:
+                for stop_id, (quantity, limit_price) in stop_level.items():
+                    del self._stop_by_ids[stop_id]
+                    pending.append((stop_id, side, quantity, limit_price))
+            del stops.keys()[:n_crossed]
+        self._reset_boundaries()
+
+    def drain_triggered(self) -> List[Tuple[int, Optional[int]]]:
+        """
+        :return: stop id of each stop triggered since the last drain, in trigger order, with the result of its order
+            as returned by LimitOrderBook.process: its order id if it rests in the LOB
+        """
+        triggered, self._triggered = self._triggered, []
+        return triggered